@@ -1,7 +1,7 @@
 ﻿from fastapi import APIRouter
 from app.api.v1.endpoints import auth
 from app.api.v1.endpoints.user_management import users, roles
-from app.api.v1.endpoints import convert_tool
+from app.api.v1.endpoints import convert_tool, conversions, transactions
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
@@ -10,3 +10,5 @@ api_router.include_router(roles.router, prefix="/roles_permissions", tags=["Role
 
 
 api_router.include_router(convert_tool.router, prefix="/convert_tools", tags=["Convert Tools"])
+api_router.include_router(conversions.router, prefix="/conversions", tags=["Conversion History"])
+api_router.include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
\ No newline at end of file
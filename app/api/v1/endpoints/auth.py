@@ -15,18 +15,16 @@ logger = logging.getLogger(__name__)
 
 @router.post("/token", response_model=Token)
 def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    logger.debug(f"Login attempt for user {form_data.username}")
+    logger.debug("Login attempt for user %s", form_data.username)
     user = get_user_by_username(db, form_data.username)
+    # bcrypt is deliberately slow, so verify once
+    authenticated = user is not None and verify_password(form_data.password, user.password)
     if not user:
         logger.warning("User not found")
-    elif not verify_password(form_data.password, user.password):
+    elif not authenticated:
         logger.warning("Password mismatch")
-    
-    # Additional debug information
-    logger.debug(f"User from DB: {user}")
-    logger.debug(f"Form data: {form_data.username}")
-    
-    if not user or not verify_password(form_data.password, user.password):
+
+    if not authenticated:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
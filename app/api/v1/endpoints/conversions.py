@@ -0,0 +1,74 @@
+import base64
+import binascii
+import os
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from app.crud.conversion import get_conversion_by_uid, get_conversions_for_user
+from app.models.user import User
+from app.schemas.conversion import ConversionPage, ConversionResponse
+from app.utils.dependencies import get_db, get_current_user
+from app.utils.downloads import file_response
+
+router = APIRouter()
+
+
+def encode_cursor(created_at: datetime, conversion_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{conversion_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, conversion_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(conversion_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/", response_model=ConversionPage)
+def list_conversions(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> ConversionPage:
+    before = decode_cursor(cursor) if cursor else None
+    conversions = get_conversions_for_user(db, current_user.id, limit + 1, before, created_from, created_to)
+    next_cursor = None
+    if len(conversions) > limit:
+        conversions = conversions[:limit]
+        next_cursor = encode_cursor(conversions[-1].created_at, conversions[-1].id)
+    return ConversionPage(
+        items=[ConversionResponse.from_orm(conversion) for conversion in conversions],
+        next_cursor=next_cursor,
+    )
+
+
+# Media types of stored results, keyed by Conversion.export_type
+RESULT_MEDIA_TYPES = {
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
+
+@router.get("/{uid}/result")
+def download_result(
+    uid: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Download a stored result; supports ETag revalidation, Range resume and gzip/br for CSV."""
+    conversion = get_conversion_by_uid(db, uid)
+    if conversion is None or conversion.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Conversion not found")
+    if not conversion.result_path or not os.path.exists(conversion.result_path):
+        raise HTTPException(status_code=404, detail="Result is not available")
+    filename = f"{conversion.bank.upper()}_e-statement_transactions_{conversion.uid}{os.path.splitext(conversion.result_path)[1]}"
+    return file_response(
+        request, conversion.result_path, RESULT_MEDIA_TYPES.get(conversion.export_type, "application/octet-stream"),
+        filename, digest=conversion.result_sha256,
+    )
@@ -1,15 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from enum import Enum
+import asyncio
+import json
 import logging
-import PyPDF2
 from io import BytesIO
 import os
 import app.utils.csv_convert as csv
 import app.utils.excel_convert as convert_to_excel
 import secrets
 from datetime import datetime
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from contextlib import nullcontext
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from app.utils.dependencies import permission_required, profiling_requested, conversion_rate_limited, get_current_user
+from app.utils.rate_limit import get_scheduler
+from app.models.user import User
+from app.services.conversion_history import recorder, result_path
+from app.utils.profiling import ProfileMode, profile_path
+from app.utils.conversion_workers import run_conversion
+from app.utils.metrics import stage_timer, record_value, current_request, CONVERSION_BYTES, CONVERSION_PAGES
+from app.utils.pdf_input import PdfSource
+from app.utils.downloads import bytes_response, content_hash
+from app.utils.progress import (
+    ProgressReporter, TERMINAL_EVENTS, current_progress, hub as progress_hub, reporting_progress, stage_started,
+)
+from app.utils.admission import get_limiter
+from app.utils.llm_budget import get_budget, request_budget_errors
+from app.utils.config import settings
+import time
 
 router = APIRouter()
 
@@ -29,6 +49,11 @@ class ExportType(str, Enum):
     csv = "csv"
 
 
+class ExcelLayout(str, Enum):
+    basic = "basic"      # a single Transactions sheet
+    summary = "summary"  # adds Summary, Daily, Monthly and per-page sheets
+
+
 def get_unique_filename(bank_type: str,export_type: str):
     timestamp = datetime.now().strftime("%m-%Y_%H%M%S")
     random_part = secrets.token_hex(3)
@@ -40,14 +65,75 @@ def get_unique_filename(bank_type: str,export_type: str):
 
 @router.post("/convert-pdf")
 async def convert_file(
+    request: Request,
     file: UploadFile = File(...),
     bank_type: BankType = Form(...),
     export_type: ExportType = Form(...),
+    excel_layout: ExcelLayout = Form(ExcelLayout.basic),
+    only_new: bool = Form(False),
+    store_transactions: bool = Form(False),
+    progress_id: Optional[str] = Form(None),
+    dry_run: bool = Form(False),
+    profile_mode: Optional[ProfileMode] = Depends(profiling_requested),
+    current_user: User = Depends(conversion_rate_limited),
 ):
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    # With a progress_id, subscribers of GET /convert-pdf/progress/{progress_id} see the conversion advance
+    progress = ProgressReporter(progress_hub, (current_user.id, progress_id)) if progress_id else None
+    with reporting_progress(progress):
+        try:
+            response = await _convert_file(
+                request, file, bank_type, export_type, excel_layout, only_new, store_transactions,
+                dry_run, profile_mode, current_user,
+            )
+        except HTTPException as e:
+            if progress is not None:
+                progress.emit("failed", status=e.status_code, detail=e.detail)
+            raise
+        except Exception:
+            if progress is not None:
+                progress.emit("failed", status=500, detail="Conversion failed")
+            raise
+    if progress is not None and "X-Conversion-Id" not in response.headers:
+        # A dry run answers with its estimate and stores no result
+        progress.emit("done")
+    return response
+
+
+@router.get("/convert-pdf/progress/{progress_id}")
+async def conversion_progress(progress_id: str, current_user: User = Depends(get_current_user)):
+    """Server-Sent Events for the conversion posted with the same ``progress_id``.
+
+    Open it before posting the file: the first ``: subscribed`` comment
+    means events will be delivered. The stream ends with a ``done`` event,
+    sent once the result is stored and carrying its ``result_url`` (null when
+    it could not be stored), or a ``failed`` event.
+    """
+    key = (current_user.id, progress_id)
 
+    async def events():
+        with progress_hub.subscribe(key) as queue:
+            yield ": subscribed\n\n"
+            idle_since = time.monotonic()
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - idle_since > settings.PROGRESS_IDLE_SECONDS:
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                idle_since = time.monotonic()
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def _convert_file(request: Request, file: UploadFile, bank_type: BankType, export_type: ExportType,
+                        excel_layout: ExcelLayout, only_new: bool, store_transactions: bool, dry_run: bool,
+                        profile_mode: Optional[ProfileMode], current_user: User):
     # Explicit validation (optional because Form(...) already requires input)
     if not bank_type:
         raise HTTPException(
@@ -58,6 +144,23 @@ async def convert_file(
             status_code=400, detail="export_type is required and cannot be empty"
         )
 
+    if dry_run and export_type != ExportType.csv:
+        raise HTTPException(
+            status_code=400, detail="dry_run estimates LLM usage and is only available for csv export"
+        )
+
+    if store_transactions and export_type != ExportType.excel:
+        # Only the excel extractor yields structured rows; the csv export is free text from the LLM
+        raise HTTPException(
+            status_code=400, detail="store_transactions is only available for excel export"
+        )
+
+    if profile_mode is not None and export_type == ExportType.csv:
+        # The csv pipeline mostly awaits the LLM provider on the event loop, which a profiler cannot attribute
+        raise HTTPException(
+            status_code=400, detail="X-Profile is only available for excel export"
+        )
+
     if file.content_type != "application/pdf" and not file.filename.lower().endswith(
         ".pdf"
     ):
@@ -66,43 +169,147 @@ async def convert_file(
             detail="Only PDF files are allowed",
         )
 
-    # Read PDF content into memory
+    # Spool the upload to a single file shared by the page count and the extractors
+    with stage_timer("upload_read"):
+        source = await PdfSource.from_upload(file)
+    with source:
+        if not source.size:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
 
-    pdf_stream = BytesIO(contents)
+        with stage_timer("page_count"):
+            total_pages = source.page_count
 
-    # Get total page count using PyPDF2
-    reader = PyPDF2.PdfReader(pdf_stream)
-    total_pages = len(reader.pages)
+        CONVERSION_BYTES.observe(source.size, bank=bank_type.value, export=export_type.value)
+        CONVERSION_PAGES.observe(total_pages, bank=bank_type.value, export=export_type.value)
+        record_value("bank", bank_type.value)
+        record_value("export", export_type.value)
+        if export_type == "excel":
+            record_value("excel_layout", excel_layout.value)
+        record_value("pages", total_pages)
+        record_value("upload_bytes", source.size)
 
-    existing_token = int(os.getenv("EXISTING_TOKEN", "0"))
+        existing_token = int(os.getenv("EXISTING_TOKEN", "0"))
 
-    if total_pages > existing_token:
-        raise HTTPException(
-            status_code=400,
-            detail="Your tokens are not sufficient to perform the conversion.",
-        )
-    pdf_stream.seek(0)
+        if total_pages > existing_token:
+            raise HTTPException(
+                status_code=400,
+                detail="Your tokens are not sufficient to perform the conversion.",
+            )
 
-    if export_type == "excel":
-        # result = await excel.excel_convert(pdf_stream, bank_type,export_type)
-        if bank_type == "bca":
-            try:
-                output = convert_to_excel.extract_bca_transactions(pdf_stream, bank_type, export_type)
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
-
-            filename = get_unique_filename(bank_type,export_type)
-         
-
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
-    elif export_type == "csv":
-        result = await csv.csv_convert(pdf_stream, bank_type)
-    else:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid export type",
+        profile = None
+        transactions = None
+        stage_started("queued")
+        # Round-robin across users so one tenant cannot monopolise the conversion slots
+        async with get_scheduler().slot(current_user.id):
+            # Page credits are taken once a slot is free, so requests waiting for a slot do not hold them
+            with get_limiter().admit(total_pages) if settings.ADMISSION_CONTROL else nullcontext() as ticket:
+                start = time.perf_counter()
+                if export_type == "excel":
+                    # result = await excel.excel_convert(pdf_stream, bank_type,export_type)
+                    if bank_type == "bca":
+                        try:
+                            result, profile = await run_conversion(
+                                convert_to_excel.extract_bca_transactions, source, bank_type, export_type, excel_layout.value,
+                                only_new, current_user.id, store_transactions,
+                                profile_mode=profile_mode,
+                            )
+                        except Exception as e:
+                            _record_conversion(current_user, source, bank_type, export_type, excel_layout,
+                                               total_pages, time.perf_counter() - start, status="failed")
+                            raise HTTPException(status_code=500, detail=str(e))
+
+                        # Rows kept for /transactions/search when store_transactions is set
+                        output, transactions = result if store_transactions else (result, None)
+                        filename = get_unique_filename(bank_type,export_type)
+                elif export_type == "csv":
+                    result = await csv.csv_convert(source.path, bank_type, user_id=current_user.id, dry_run=dry_run)
+                    if dry_run:
+                        # The token estimate and budget standing, without calling the LLM provider
+                        return JSONResponse({
+                            "estimate": result.to_dict(),
+                            "request_budget_errors": request_budget_errors(result),
+                            "budget": await run_in_threadpool(get_budget().status, current_user.id, result),
+                        })
+                    output = BytesIO((result or "").encode("utf-8"))
+                    filename = get_unique_filename(bank_type,export_type)
+                else:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Invalid export type",
+                    )
+                request_metrics = current_request()
+                values = request_metrics.values if request_metrics else {}
+                # Only uncached excel runs measure what parsing a page costs; LLM calls and cache hits do not
+                if ticket is not None and export_type == ExportType.excel and not values.get("pages_cached"):
+                    ticket.completed(time.perf_counter() - start, values.get("rss_growth_mb"))
+
+        data = output.getvalue()
+        digest = content_hash(data)
+        progress = current_progress()
+        conversion_uid, persisted = _record_conversion(
+            current_user, source, bank_type, export_type, excel_layout, total_pages,
+            time.perf_counter() - start, result=data, transactions=transactions, result_sha256=digest,
+            flush=progress is not None,
         )
+
+    if progress is not None:
+        # result_url must not be handed out before the history row and result file exist
+        try:
+            stored = await asyncio.wait_for(asyncio.wrap_future(persisted), timeout=PERSIST_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            stored = False
+        progress.emit("done", conversion_id=conversion_uid,
+                      result_url=str(request.url_for("download_result", uid=conversion_uid)) if stored else None)
+
+    headers = {"X-Conversion-Id": conversion_uid}
+    if profile is not None:
+        headers["X-Profile-Id"] = profile.profile_id
+
+    # The same result can be fetched again, resumed or compressed via GET /conversions/{uid}/result
+    return bytes_response(request, data, MEDIA_TYPES[export_type], filename, digest=digest, headers=headers)
+
+
+MEDIA_TYPES = {
+    ExportType.excel: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ExportType.csv: "text/csv",
+}
+EXTENSIONS = {ExportType.excel: "xlsx", ExportType.csv: "csv"}
+
+
+# How long a conversion followed over progress events waits for its history row before reporting done
+PERSIST_WAIT_SECONDS = 30
+
+
+def _record_conversion(current_user, source, bank_type, export_type, excel_layout, pages, seconds,
+                       result=None, transactions=None, status="completed", result_sha256=None, flush=False):
+    # Queued for the history writer thread; nothing here touches the database.
+    # Returns the uid and a future that becomes True once the row is stored.
+    request_metrics = current_request()
+    values = request_metrics.values if request_metrics else {}
+    uid = secrets.token_hex(16)
+    persisted = recorder.record({
+        "uid": uid,
+        "user_id": current_user.id,
+        "file_hash": source.sha256,
+        "bank": bank_type.value,
+        "export_type": export_type.value,
+        "layout": excel_layout.value if export_type == ExportType.excel else None,
+        "status": status,
+        "pages": pages,
+        "rows": values.get("rows"),
+        "duration_seconds": round(seconds, 6),
+        "stages": {stage: round(elapsed, 6) for stage, elapsed in request_metrics.stages.items()} if request_metrics else {},
+        "cache_hit": bool(values.get("pages_cached")),
+        "result_path": result_path(uid, EXTENSIONS[export_type]) if result is not None else None,
+        "result_sha256": result_sha256,
+        "created_at": datetime.now(),
+    }, result, transactions, flush=flush)
+    return uid, persisted
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(permission_required("profile_conversion"))])
+def download_profile(profile_id: str):
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
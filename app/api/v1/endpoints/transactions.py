@@ -0,0 +1,40 @@
+from datetime import date
+from enum import Enum
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.crud.transaction import search_transactions
+from app.models.user import User
+from app.schemas.transaction import TransactionResponse
+from app.utils.dependencies import get_db, get_current_user
+
+router = APIRouter()
+
+
+class Direction(str, Enum):
+    CR = "CR"
+    DB = "DB"
+
+
+@router.get("/search", response_model=List[TransactionResponse])
+def search(
+    q: Optional[str] = Query(None, max_length=200, description="Text contained in the transaction description"),
+    amount_min: Optional[float] = None,
+    amount_max: Optional[float] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    direction: Optional[Direction] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> List[TransactionResponse]:
+    """Transactions kept by excel conversions posted with ``store_transactions=true``."""
+    if amount_min is not None and amount_max is not None and amount_min > amount_max:
+        raise HTTPException(status_code=400, detail="amount_min must not be greater than amount_max")
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    transactions = search_transactions(
+        db, current_user.id, q.strip() if q else None, amount_min, amount_max, date_from, date_to,
+        direction.value if direction else None, limit,
+    )
+    return [TransactionResponse.from_orm(transaction) for transaction in transactions]
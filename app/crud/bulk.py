@@ -0,0 +1,11 @@
+from sqlalchemy import Table
+from sqlalchemy.orm import Session
+
+
+def insert_ignore(db: Session, table: Table):
+    """``INSERT ... ON CONFLICT DO NOTHING`` for the session's dialect (PostgreSQL or SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing()
@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import delete, insert, or_, and_, select
+from sqlalchemy.orm import Session
+from app.models.conversion import Conversion
+from app.models.transaction import ExtractedTransaction
+
+DELETE_BATCH_SIZE = 500
+
+
+def bulk_create_conversions(db: Session, records: List[dict], commit: bool = True):
+    if not records:
+        return
+    db.execute(insert(Conversion), records)
+    if commit:
+        db.commit()
+
+
+def get_conversion_by_uid(db: Session, uid: str) -> Conversion:
+    return db.query(Conversion).filter(Conversion.uid == uid).first()
+
+
+def get_conversions_for_user(
+    db: Session,
+    user_id: int,
+    limit: int,
+    before: Optional[Tuple[datetime, int]] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> List[Conversion]:
+    # Keyset pagination on (created_at, id) so every page is an index range scan
+    # on ix_conversions_user_id_created_at, however deep the history goes.
+    query = db.query(Conversion).filter(Conversion.user_id == user_id)
+    if created_from is not None:
+        query = query.filter(Conversion.created_at >= created_from)
+    if created_to is not None:
+        query = query.filter(Conversion.created_at < created_to)
+    if before is not None:
+        created_at, conversion_id = before
+        query = query.filter(or_(
+            Conversion.created_at < created_at,
+            and_(Conversion.created_at == created_at, Conversion.id < conversion_id),
+        ))
+    return query.order_by(Conversion.created_at.desc(), Conversion.id.desc()).limit(limit).all()
+
+
+def get_conversion_uids_created_before(db: Session, before: datetime) -> List[str]:
+    return list(db.scalars(select(Conversion.uid).where(Conversion.created_at < before)))
+
+
+def get_conversion_uids_for_user(db: Session, user_id: int) -> List[str]:
+    return list(db.scalars(select(Conversion.uid).where(Conversion.user_id == user_id)))
+
+
+def delete_conversions(db: Session, uids: List[str]) -> List[str]:
+    """Delete the conversions and their stored transactions and return their result paths.
+
+    The caller commits, then removes the result files.
+    """
+    paths = []
+    for start in range(0, len(uids), DELETE_BATCH_SIZE):
+        batch = uids[start:start + DELETE_BATCH_SIZE]
+        paths.extend(db.scalars(
+            select(Conversion.result_path).where(Conversion.uid.in_(batch), Conversion.result_path.is_not(None))
+        ))
+        # SQLite does not enforce the ON DELETE CASCADE unless foreign keys are switched on
+        db.execute(delete(ExtractedTransaction).where(ExtractedTransaction.conversion_uid.in_(batch)))
+        db.execute(delete(Conversion).where(Conversion.uid.in_(batch)))
+    return paths
@@ -0,0 +1,85 @@
+from typing import List, Optional, Union
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+from app.models.user import Permission, role_permissions, user_effective_permissions, user_roles
+
+# Keeps each IN (...) list well under SQLite's bound parameter limit
+_ID_CHUNK = 500
+
+
+def has_permission(db: Session, user_id: int, permission: str) -> bool:
+    return db.execute(
+        select(user_effective_permissions.c.user_id).where(
+            user_effective_permissions.c.user_id == user_id,
+            user_effective_permissions.c.permission_name == permission,
+        )
+    ).first() is not None
+
+
+def get_effective_permissions(db: Session, user_id: int) -> List[str]:
+    return list(db.scalars(
+        select(user_effective_permissions.c.permission_name).where(user_effective_permissions.c.user_id == user_id)
+    ))
+
+
+def users_with_role(role_id: int) -> Select:
+    return select(user_roles.c.user_id).where(user_roles.c.role_id == role_id)
+
+
+def users_with_permission(permission_id: int) -> Select:
+    return (
+        select(user_roles.c.user_id)
+        .join(role_permissions, role_permissions.c.role_id == user_roles.c.role_id)
+        .where(role_permissions.c.permission_id == permission_id)
+    )
+
+
+def refresh_effective_permissions(db: Session, user_ids: Optional[Union[List[int], Select]] = None):
+    """Rebuild ``user_effective_permissions`` for ``user_ids`` (all users when ``None``).
+
+    ``user_ids`` is a list or a select of user ids. Runs in the caller's
+    transaction after flushing pending ORM changes; does not commit.
+    """
+    db.flush()
+    if isinstance(user_ids, list):
+        for start in range(0, len(user_ids), _ID_CHUNK):
+            _rebuild(db, user_ids[start:start + _ID_CHUNK])
+    else:
+        _rebuild(db, user_ids)
+
+
+def backfill_effective_permissions(db: Session) -> bool:
+    """Build ``user_effective_permissions`` for every user when it is empty but roles grant permissions.
+
+    A database created before the table existed has it empty after the
+    upgrade, which would deny every permission check. Commits when it
+    rebuilds; returns whether it did.
+    """
+    if db.execute(select(user_effective_permissions.c.user_id).limit(1)).first() is not None:
+        return False
+    grants = (
+        select(user_roles.c.user_id)
+        .join(role_permissions, role_permissions.c.role_id == user_roles.c.role_id)
+        .limit(1)
+    )
+    if db.execute(grants).first() is None:
+        return False
+    refresh_effective_permissions(db)
+    db.commit()
+    return True
+
+
+def _rebuild(db: Session, user_ids):
+    delete = user_effective_permissions.delete()
+    grants = (
+        select(user_roles.c.user_id, Permission.name)
+        .select_from(user_roles)
+        .join(role_permissions, role_permissions.c.role_id == user_roles.c.role_id)
+        .join(Permission, Permission.id == role_permissions.c.permission_id)
+        .distinct()
+    )
+    if user_ids is not None:
+        delete = delete.where(user_effective_permissions.c.user_id.in_(user_ids))
+        grants = grants.where(user_roles.c.user_id.in_(user_ids))
+    db.execute(delete)
+    db.execute(user_effective_permissions.insert().from_select(["user_id", "permission_name"], grants))
@@ -1,7 +1,12 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.models.user import Role, Permission
+from app.crud.bulk import insert_ignore
+from app.crud.effective_permissions import (
+    refresh_effective_permissions, users_with_permission, users_with_role
+)
+from app.models.user import Role, Permission, role_permissions, user_roles
 from app.schemas.user import RoleCreate, RoleUpdate, PermissionCreate, PermissionUpdate
-from typing import List
+from typing import Dict, List
 
 def create_role(db: Session, role: RoleCreate) -> Role:
     db_role = Role(name=role.name)
@@ -31,7 +36,9 @@ def delete_role(db: Session, role_id: int) -> bool:
     db_role = get_role(db, role_id)
     if not db_role:
         return False
+    affected = list(db.scalars(users_with_role(role_id)))
     db.delete(db_role)
+    refresh_effective_permissions(db, affected)
     db.commit()
     return True
 
@@ -55,6 +62,8 @@ def update_permission(db: Session, permission_id: int, permission_update: Permis
     update_data = permission_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_permission, key, value)
+    if 'name' in update_data:
+        refresh_effective_permissions(db, users_with_permission(permission_id))
     db.commit()
     db.refresh(db_permission)
     return db_permission
@@ -63,7 +72,9 @@ def delete_permission(db: Session, permission_id: int) -> bool:
     db_permission = get_permission(db, permission_id)
     if not db_permission:
         return False
+    affected = list(db.scalars(users_with_permission(permission_id)))
     db.delete(db_permission)
+    refresh_effective_permissions(db, affected)
     db.commit()
     return True
 
@@ -73,12 +84,43 @@ def get_all_permissions(db: Session, skip: int, limit: int) -> List[Permission]:
 def add_permission_to_role(db: Session, role: Role, permission: Permission) -> Role:
     if permission not in role.permissions:
         role.permissions.append(permission)
+        refresh_effective_permissions(db, users_with_role(role.id))
         db.commit()
         db.refresh(role)
     return role
 
 def remove_permission_from_role(db: Session, role: Role, permission: Permission) -> Role:
     role.permissions.remove(permission)
+    refresh_effective_permissions(db, users_with_role(role.id))
     db.commit()
     db.refresh(role)
-    return role
\ No newline at end of file
+    return role
+
+def ensure_roles(db: Session, names: List[str]) -> Dict[str, int]:
+    """Create any missing roles and return ``{name: id}``; does not commit."""
+    if names:
+        db.execute(insert_ignore(db, Role.__table__), [{"name": name} for name in names])
+    return dict(db.execute(select(Role.name, Role.id).where(Role.name.in_(names))).all())
+
+
+def seed_roles_and_permissions(db: Session, grants: Dict[str, List[str]]):
+    """Idempotently create roles, permissions and their grants in one transaction.
+
+    ``grants`` maps a role name to its permission names. Existing rows are
+    left untouched, so the seed can run on every deploy.
+    """
+    permission_names = sorted({name for names in grants.values() for name in names})
+    role_ids = ensure_roles(db, list(grants))
+    if permission_names:
+        db.execute(insert_ignore(db, Permission.__table__), [{"name": name} for name in permission_names])
+    permission_ids = dict(db.execute(select(Permission.name, Permission.id).where(Permission.name.in_(permission_names))).all())
+    links = [
+        {"role_id": role_ids[role], "permission_id": permission_ids[permission]}
+        for role, names in grants.items()
+        for permission in names
+    ]
+    if links:
+        db.execute(insert_ignore(db, role_permissions), links)
+        refresh_effective_permissions(db, select(user_roles.c.user_id).where(user_roles.c.role_id.in_(role_ids.values())))
+    db.commit()
+    return role_ids, permission_ids
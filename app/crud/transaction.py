@@ -0,0 +1,51 @@
+from datetime import date
+from typing import List, Optional
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import Session
+from app.models.transaction import ExtractedTransaction, FTS_TABLE
+
+INSERT_BATCH_SIZE = 5000
+
+
+def bulk_create_transactions(db: Session, records: List[dict]):
+    # executemany in fixed-size batches; the caller commits together with the conversion rows
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        db.execute(insert(ExtractedTransaction), records[start:start + INSERT_BATCH_SIZE])
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_transactions(
+    db: Session,
+    user_id: int,
+    q: Optional[str] = None,
+    amount_min: Optional[float] = None,
+    amount_max: Optional[float] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    direction: Optional[str] = None,
+    limit: int = 50,
+) -> List[ExtractedTransaction]:
+    query = db.query(ExtractedTransaction).filter(ExtractedTransaction.user_id == user_id)
+    if q:
+        if db.get_bind().dialect.name == "sqlite" and len(q) >= 3:
+            # The trigram tokenizer matches substrings case-insensitively, like ILIKE '%q%'
+            phrase = '"' + q.replace('"', '""') + '"'
+            matches = select(text("rowid")).select_from(text(FTS_TABLE)).where(text(f"{FTS_TABLE} MATCH :phrase"))
+            query = query.filter(ExtractedTransaction.id.in_(matches)).params(phrase=phrase)
+        else:
+            # Served by the pg_trgm GIN index on PostgreSQL
+            query = query.filter(ExtractedTransaction.description.ilike(f"%{_escape_like(q)}%", escape="\\"))
+    if amount_min is not None:
+        query = query.filter(ExtractedTransaction.amount >= amount_min)
+    if amount_max is not None:
+        query = query.filter(ExtractedTransaction.amount <= amount_max)
+    if date_from is not None:
+        query = query.filter(ExtractedTransaction.posted_on >= date_from)
+    if date_to is not None:
+        query = query.filter(ExtractedTransaction.posted_on <= date_to)
+    if direction is not None:
+        query = query.filter(ExtractedTransaction.direction == direction)
+    return query.order_by(ExtractedTransaction.posted_on.desc(), ExtractedTransaction.id.desc()).limit(limit).all()
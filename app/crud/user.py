@@ -1,8 +1,14 @@
+from sqlalchemy import select, or_
 from sqlalchemy.orm import Session
-from app.models.user import User, Role, Permission
+from app.crud.bulk import insert_ignore
+from app.crud.conversion import delete_conversions, get_conversion_uids_for_user
+from app.crud.effective_permissions import refresh_effective_permissions
+from app.crud.role import ensure_roles
+from app.models.user import User, Role, Permission, user_roles
 from app.schemas.user import UserCreate, UserUpdate, RoleCreate, PermissionCreate
+from app.services.conversion_history import remove_result_files
 from passlib.context import CryptContext
-from typing import List
+from typing import Dict, List, Tuple
 from fastapi import HTTPException
 
 from fastapi.security import OAuth2PasswordBearer
@@ -10,11 +16,6 @@ from app.utils.config import settings
 
 import logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
@@ -25,9 +26,8 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def create_user(db: Session, user: UserCreate) -> User:
-    logger.debug(f"Creating user {user.username}")
+    logger.debug("Creating user %s", user.username)
     password = get_password_hash(user.password)
-    logger.debug(f"Password for {user.username} hashed as {password}")
     db_user = User(
         username=user.username,
         email=user.email,
@@ -70,12 +70,18 @@ def delete_user(db: Session, user_id: int):
     db_user = get_user(db, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
+    # The user's conversion history, stored transactions and result files go with the account
+    result_paths = delete_conversions(db, get_conversion_uids_for_user(db, user_id))
     db.delete(db_user)
+    # SQLite does not enforce the ON DELETE CASCADE unless foreign keys are switched on
+    refresh_effective_permissions(db, [user_id])
     db.commit()
+    remove_result_files(result_paths)
 
 def assign_role_to_user(db: Session, user: User, role: Role):
     if role not in user.roles:
         user.roles.append(role)
+        refresh_effective_permissions(db, [user.id])
         db.commit()
         db.refresh(user)
     return user
@@ -83,6 +89,38 @@ def assign_role_to_user(db: Session, user: User, role: Role):
 def remove_role_from_user(db: Session, user: User, role: Role):
     if role in user.roles:
         user.roles.remove(role)
+        refresh_effective_permissions(db, [user.id])
         db.commit()
         db.refresh(user)
-    return user
\ No newline at end of file
+    return user
+
+def bulk_create_users(db: Session, records: List[dict], roles: Dict[str, List[str]]) -> List[str]:
+    """Insert users whose username and email are both new, then grant their roles.
+
+    ``records`` carry already hashed passwords; ``roles`` maps a username to
+    role names. Returns the usernames actually inserted. Commits once.
+    """
+    inserted = []
+    if records:
+        inserted_ids = dict(db.execute(
+            insert_ignore(db, User.__table__).returning(User.username, User.id), records
+        ).all())
+        inserted = list(inserted_ids)
+        role_ids = ensure_roles(db, sorted({role for username in inserted for role in roles.get(username, [])}))
+        links = [
+            {"user_id": inserted_ids[username], "role_id": role_ids[role]}
+            for username in inserted
+            for role in roles.get(username, [])
+        ]
+        if links:
+            db.execute(insert_ignore(db, user_roles), links)
+            refresh_effective_permissions(db, list(inserted_ids.values()))
+    db.commit()
+    return inserted
+
+
+def get_existing_usernames_and_emails(db: Session, usernames: List[str], emails: List[str]) -> Tuple[set, set]:
+    existing = db.execute(
+        select(User.username, User.email).where(or_(User.username.in_(usernames), User.email.in_(emails)))
+    ).all()
+    return {username for username, _ in existing}, {email for _, email in existing}
@@ -1,6 +1,58 @@
-from sqlalchemy import create_engine
+import logging
+import random
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.utils.config import settings
+from app.utils.metrics import current_request
 
-engine = create_engine(settings.DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+engine = create_engine(settings.DATABASE_URL, echo=settings.SQL_ECHO)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class RepeatedQueryError(RuntimeError):
+    """Raised in strict mode when one request runs the same statement too often (an N+1)."""
+
+
+def install_query_instrumentation(engine, threshold_ms: float, sample_rate: float = 1.0,
+                                  repeat_threshold: int = 0, strict: bool = False):
+    """Time every statement, count it against the current request and log slow ones.
+
+    Statements slower than ``threshold_ms`` are logged, ``sample_rate`` of
+    them under a flood. With ``strict`` set, the ``repeat_threshold``-th
+    execution of an identical statement within one request raises
+    ``RepeatedQueryError`` so tests fail on N+1 patterns.
+    """
+
+    # The start time lives on the statement's execution context, so a statement that
+    # raises (and never reaches after_cursor_execute) leaves nothing behind on the connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _record_query(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if threshold_ms > 0 and elapsed * 1000 >= threshold_ms and random.random() < sample_rate:
+            # Parameters are left out: they can carry credentials and user data
+            logger.warning("Slow query took %.1f ms: %s", elapsed * 1000, statement, extra={
+                "duration_ms": round(elapsed * 1000, 3), "executemany": executemany, "sample_rate": sample_rate,
+            })
+        request_metrics = current_request()
+        if request_metrics is None:
+            return
+        count = request_metrics.add_query(statement, elapsed)
+        if strict and repeat_threshold > 0 and count >= repeat_threshold:
+            raise RepeatedQueryError(f"Statement ran {count} times in one request: {statement}")
+
+
+install_query_instrumentation(
+    engine, settings.SQL_SLOW_QUERY_MS, settings.SQL_SLOW_QUERY_SAMPLE_RATE,
+    settings.SQL_N_PLUS_ONE_THRESHOLD, settings.SQL_N_PLUS_ONE_STRICT,
+)
@@ -1,14 +1,60 @@
 ﻿import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api.v1.api import api_router
+from app.utils.metrics import RequestMetricsMiddleware, render_prometheus
+from app.utils.config import settings
+from app.utils.logging_config import configure_logging, stop_logging
+from app.utils import conversion_workers
+from app.services.conversion_history import recorder
+from starlette.concurrency import run_in_threadpool
+import logging
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+def _backfill_permissions():
+    # Permission checks read user_effective_permissions; after an upgrade it starts out empty
+    from app.db.session import SessionLocal
+    from app.crud.effective_permissions import backfill_effective_permissions
+
+    db = SessionLocal()
+    try:
+        if backfill_effective_permissions(db):
+            logger.info("Built user_effective_permissions for existing users")
+    except Exception as e:
+        db.rollback()
+        logger.error("Could not backfill user_effective_permissions: %s", e)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Conversion libraries are imported lazily; optionally pay that cost before serving traffic
+    if settings.WARMUP_ON_STARTUP:
+        elapsed = await run_in_threadpool(conversion_workers.preload_modules, True)
+        logger.info("Pre-loaded conversion modules in %.2fs", elapsed)
+    if settings.CONVERSION_WORKERS > 0:
+        await run_in_threadpool(conversion_workers.start_workers, settings.CONVERSION_WORKERS)
+    await run_in_threadpool(_backfill_permissions)
+    recorder.start()
+    yield
+    conversion_workers.shutdown_workers()
+    await run_in_threadpool(recorder.stop)
+    stop_logging()
+
 
 app = FastAPI(
     title=os.getenv("APP_NAME", "FastAPI RBAC Boilerplate"),
     version="1.0.0",
     docs_url="/docs",              # Swagger UI
     redoc_url="/redoc",            # ReDoc UI
-    openapi_url="/openapi.json"    # OpenAPI JSON
+    openapi_url="/openapi.json",   # OpenAPI JSON
+    lifespan=lifespan,
 )
 
 
@@ -16,6 +62,11 @@ app = FastAPI(
 def read_root():
     return {"message": "Welcome to FastAPI RBAC Boilerplate"}
 
+
+@app.get("/metrics", tags=["Root"], include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # You can restrict this in production
@@ -23,5 +74,6 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
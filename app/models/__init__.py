@@ -1 +1,3 @@
-from .user import User, Role
\ No newline at end of file
+from .user import User, Role
+from .conversion import Conversion
+from .transaction import ExtractedTransaction
\ No newline at end of file
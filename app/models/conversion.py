@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Boolean, JSON, Index
+from datetime import datetime
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+
+class Conversion(Base):
+    __tablename__ = "conversions"
+    id = Column(Integer, primary_key=True, index=True)
+    uid = Column(String(32), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    file_hash = Column(String(64), index=True)
+    bank = Column(String(16))
+    export_type = Column(String(16))
+    layout = Column(String(16), nullable=True)
+    status = Column(String(16), default="completed")
+    pages = Column(Integer)
+    rows = Column(Integer, nullable=True)
+    duration_seconds = Column(Float)
+    stages = Column(JSON, default=dict)
+    cache_hit = Column(Boolean, default=False)
+    result_path = Column(String, nullable=True)
+    result_sha256 = Column(String(64), nullable=True)  # strong ETag of the stored result
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    user = relationship("User")
+
+    # History is always read per user, newest first
+    __table_args__ = (
+        Index('ix_conversions_user_id_created_at', 'user_id', 'created_at'),
+    )
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, BigInteger, Integer, SmallInteger, String, Text, Date, Numeric, ForeignKey, Index, DDL, event
+from app.db.base import Base
+
+class ExtractedTransaction(Base):
+    __tablename__ = "extracted_transactions"
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    conversion_uid = Column(String(32), ForeignKey('conversions.uid', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    posted_on = Column(Date, nullable=True)
+    description = Column(Text, nullable=False, default='')
+    branch = Column(String(8), nullable=True)
+    amount = Column(Numeric(15, 2), nullable=True)
+    direction = Column(String(2), nullable=True)  # CR or DB
+    balance = Column(Numeric(15, 2), nullable=True)
+    page = Column(SmallInteger, nullable=True)
+
+    # Searches are always scoped to one user; description text is matched
+    # through a pg_trgm GIN index on PostgreSQL and an FTS5 table on SQLite
+    __table_args__ = (
+        Index('ix_extracted_transactions_user_id_posted_on', 'user_id', 'posted_on'),
+        Index('ix_extracted_transactions_user_id_amount', 'user_id', 'amount'),
+        Index(
+            'ix_extracted_transactions_description_trgm', 'description',
+            postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+    )
+
+
+FTS_TABLE = "extracted_transactions_fts"
+
+event.listen(
+    ExtractedTransaction.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+for statement in (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "description, content='extracted_transactions', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON extracted_transactions BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON extracted_transactions BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); END",
+):
+    event.listen(ExtractedTransaction.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(
+    ExtractedTransaction.__table__, "after_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"),
+)
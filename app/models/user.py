@@ -13,6 +13,13 @@ role_permissions = Table('role_permissions', Base.metadata,
     Column('permission_id', Integer, ForeignKey('permissions.id'), primary_key=True)
 )
 
+# Projection of user_roles -> role_permissions -> permissions, rebuilt by the RBAC mutators in
+# app/crud so a permission check is one primary-key lookup
+user_effective_permissions = Table('user_effective_permissions', Base.metadata,
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('permission_name', String, primary_key=True)
+)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
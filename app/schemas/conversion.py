@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Optional, List, Dict
+from datetime import datetime
+
+class ConversionResponse(BaseModel):
+    uid: str
+    file_hash: Optional[str] = None
+    bank: str
+    export_type: str
+    layout: Optional[str] = None
+    status: str
+    pages: int
+    rows: Optional[int] = None
+    duration_seconds: float
+    stages: Dict[str, float] = {}
+    cache_hit: bool = False
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ConversionPage(BaseModel):
+    items: List[ConversionResponse]
+    next_cursor: Optional[str] = None
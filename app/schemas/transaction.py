@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import date
+
+class TransactionResponse(BaseModel):
+    id: int
+    conversion_uid: str
+    posted_on: Optional[date] = None
+    description: str
+    branch: Optional[str] = None
+    amount: Optional[float] = None
+    direction: Optional[str] = None
+    balance: Optional[float] = None
+    page: Optional[int] = None
+
+    class Config:
+        from_attributes = True
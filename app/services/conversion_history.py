@@ -0,0 +1,216 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from app.db.session import SessionLocal
+from app.crud.conversion import bulk_create_conversions, delete_conversions, get_conversion_uids_created_before
+from app.crud.transaction import bulk_create_transactions
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ConversionRecorder:
+    """Persists conversion history off the response path.
+
+    ``record`` only puts the row on a queue; a daemon thread writes result
+    files and inserts rows in batches of up to ``batch_size``, at least every
+    ``flush_interval`` seconds, or at once for a record queued with
+    ``flush=True``. Extracted transactions stored for search go in the same
+    transaction as their conversion row. With ``prune`` set the same thread
+    applies the result retention limits after writing.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int = 10000, prune: bool = False):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prune = prune
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="conversion-history", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush whatever is queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def record(self, row: dict, result: Optional[bytes] = None, transactions: Optional[list] = None,
+               flush: bool = False) -> Future:
+        """Queue the row; the returned future becomes True once the row (and its result file) is stored.
+
+        It becomes False when the record is dropped or could not be stored.
+        """
+        persisted = Future()
+        self.start()
+        try:
+            self._queue.put_nowait((row, result, transactions, persisted, flush))
+        except queue.Full:
+            logger.warning("Conversion history queue is full, dropping record %s", row.get("uid"))
+            persisted.set_result(False)
+        return persisted
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(batch)
+                return
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if item[4]:
+                    # Someone is waiting for this row, e.g. to hand out its result URL
+                    deadline = time.monotonic()
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        rows = []
+        transactions = []
+        stored = []
+        for row, result, extracted, persisted, _ in batch:
+            complete = True
+            if result is not None and row.get("result_path"):
+                try:
+                    os.makedirs(os.path.dirname(row["result_path"]), exist_ok=True)
+                    with open(row["result_path"], "wb") as file:
+                        file.write(result)
+                except OSError as e:
+                    logger.error("Could not store result of conversion %s: %s", row["uid"], e)
+                    row = {**row, "result_path": None}
+                    complete = False
+            rows.append(row)
+            stored.append((persisted, complete))
+            if extracted:
+                transactions.extend(
+                    {**record, "conversion_uid": row["uid"], "user_id": row["user_id"]} for record in extracted
+                )
+        db = SessionLocal()
+        committed = False
+        try:
+            bulk_create_conversions(db, rows, commit=False)
+            bulk_create_transactions(db, transactions)
+            db.commit()
+            committed = True
+        except Exception as e:
+            db.rollback()
+            logger.error("Could not persist %d conversion records: %s", len(rows), e)
+        finally:
+            db.close()
+            for persisted, complete in stored:
+                persisted.set_result(committed and complete)
+        if self.prune:
+            maybe_prune_results()
+
+
+def result_path(uid: str, extension: str) -> str:
+    return os.path.join(settings.RESULT_DIR, uid[:2], f"{uid}.{extension}")
+
+
+def remove_result_files(paths: Iterable[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not remove result file %s: %s", path, e)
+
+
+_prune_lock = threading.Lock()
+_last_prune: Optional[float] = None
+
+
+def prune_results(max_age_days: Optional[float] = None, max_mb: Optional[float] = None) -> int:
+    """Delete conversions older than ``RESULT_RETENTION_DAYS``, then those with
+    the oldest result files until ``RESULT_DIR`` fits in ``RESULT_MAX_MB``.
+
+    History rows, stored transactions and result files go together. A limit
+    of 0 is not enforced. Returns the number of conversions removed.
+    """
+    max_age_days = settings.RESULT_RETENTION_DAYS if max_age_days is None else max_age_days
+    max_mb = settings.RESULT_MAX_MB if max_mb is None else max_mb
+    files = []
+    for root, _, names in os.walk(settings.RESULT_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    total = sum(size for _, size, _ in files)
+    limit = max_mb * 1024 * 1024 if max_mb else None
+    # Files are named after their conversion; an expired file without a row is removed all the same
+    doomed = []
+    for mtime, size, path in files:
+        expired = cutoff is not None and mtime < cutoff
+        if not expired and (limit is None or total <= limit):
+            break
+        doomed.append(path)
+        total -= size
+    uids = {os.path.splitext(os.path.basename(path))[0] for path in doomed}
+
+    db = SessionLocal()
+    try:
+        if max_age_days:
+            uids.update(get_conversion_uids_created_before(db, datetime.now() - timedelta(days=max_age_days)))
+        doomed.extend(delete_conversions(db, sorted(uids)))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Could not prune conversion history: %s", e)
+        return 0
+    finally:
+        db.close()
+    remove_result_files(set(doomed))
+    return len(uids)
+
+
+def maybe_prune_results():
+    """Run ``prune_results`` at most once per ``CACHE_PRUNE_INTERVAL_SECONDS`` in this process."""
+    global _last_prune
+    if settings.CACHE_PRUNE_INTERVAL_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    with _prune_lock:
+        if _last_prune is not None and now - _last_prune < settings.CACHE_PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune = now
+    start = time.perf_counter()
+    removed = prune_results()
+    if removed:
+        logger.info("Pruned %d stored conversions in %.2fs", removed, time.perf_counter() - start)
+
+
+recorder = ConversionRecorder(settings.HISTORY_BATCH_SIZE, settings.HISTORY_FLUSH_SECONDS, prune=True)
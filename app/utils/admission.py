@@ -0,0 +1,156 @@
+import logging
+import math
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from app.utils.config import settings
+from app.utils.metrics import record_value
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.2
+MAX_RETRY_AFTER_SECONDS = 300
+
+
+class AdmissionTicket:
+    def __init__(self, pages: int, lane: str):
+        self.pages = pages
+        self.lane = lane
+        self.seconds: Optional[float] = None
+        self.rss_growth_mb: Optional[float] = None
+
+    def completed(self, seconds: float, rss_growth_mb: Optional[float] = None):
+        self.seconds = seconds
+        self.rss_growth_mb = rss_growth_mb
+
+
+class PageCreditLimiter:
+    """Page-weighted admission control for conversions.
+
+    Each conversion worker gets a budget of page credits, and a statement
+    holds as many credits as it has pages while it converts. Statements of
+    up to ``fast_lane_pages`` pages use a separate pool of slots first, so a
+    burst of 200-page uploads cannot starve 1-page ones. A statement larger
+    than the whole budget is only admitted when nothing else is running.
+
+    The budget adapts to what conversions actually cost: credits per worker
+    are sized so a full worker drains within ``target_seconds`` at the
+    seconds per page observed in uncached excel conversions (the only
+    tickets marked ``completed``), and are capped by the pages that still fit in
+    available memory at the RSS growth per page observed in the worker
+    processes (conversions run in threads are not measured).
+
+    All bookkeeping happens on the event loop without awaiting, so no lock
+    is needed.
+    """
+
+    def __init__(self, workers: int, credits_per_worker: int, min_credits: int, max_credits: int,
+                 target_seconds: float, fast_lane_pages: int, fast_lane_slots: int,
+                 memory_reserve_mb: float, mb_per_page: float):
+        self.workers = max(workers, 1)
+        self.credits_per_worker = float(credits_per_worker)
+        self.min_credits = min_credits
+        self.max_credits = max_credits
+        self.target_seconds = target_seconds
+        self.fast_lane_pages = fast_lane_pages
+        self.fast_lane_slots = fast_lane_slots
+        self.memory_reserve_mb = memory_reserve_mb
+        self.mb_per_page = mb_per_page
+        self.seconds_per_page: Optional[float] = None
+        self.pages_in_flight = 0
+        self.fast_lane_in_flight = 0
+
+    def _memory_capacity(self) -> Optional[float]:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        available_mb = psutil.virtual_memory().available / (1024 * 1024)
+        return self.pages_in_flight + max(available_mb - self.memory_reserve_mb, 0) / self.mb_per_page
+
+    def capacity(self) -> int:
+        pages = self.workers * self.credits_per_worker
+        memory_pages = self._memory_capacity()
+        if memory_pages is not None:
+            pages = min(pages, memory_pages)
+        return int(pages)
+
+    def retry_after(self, pages: int) -> int:
+        # Time for enough of the in-flight pages to finish to make room for this statement
+        seconds_per_page = self.seconds_per_page or self.target_seconds / self.credits_per_worker
+        backlog = min(max(self.pages_in_flight + pages - self.capacity(), 1), self.pages_in_flight)
+        seconds = backlog * seconds_per_page / self.workers
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(seconds)))
+
+    def try_acquire(self, pages: int) -> Optional[AdmissionTicket]:
+        if pages <= self.fast_lane_pages and self.fast_lane_in_flight < self.fast_lane_slots:
+            self.fast_lane_in_flight += 1
+            return AdmissionTicket(pages, "fast")
+
+        if self.pages_in_flight == 0 or self.pages_in_flight + pages <= self.capacity():
+            self.pages_in_flight += pages
+            return AdmissionTicket(pages, "pages")
+        return None
+
+    def release(self, ticket: AdmissionTicket):
+        if ticket.lane == "fast":
+            self.fast_lane_in_flight -= 1
+        else:
+            self.pages_in_flight -= ticket.pages
+
+        if ticket.seconds is None or ticket.pages <= 0:
+            return
+        seconds_per_page = ticket.seconds / ticket.pages
+        if self.seconds_per_page is None:
+            self.seconds_per_page = seconds_per_page
+        else:
+            self.seconds_per_page += EWMA_ALPHA * (seconds_per_page - self.seconds_per_page)
+        if self.seconds_per_page > 0:
+            credits = self.target_seconds / self.seconds_per_page
+            self.credits_per_worker = min(max(credits, self.min_credits), self.max_credits)
+        if ticket.rss_growth_mb is not None and ticket.rss_growth_mb > 0:
+            self.mb_per_page += EWMA_ALPHA * (ticket.rss_growth_mb / ticket.pages - self.mb_per_page)
+
+    @contextmanager
+    def admit(self, pages: int):
+        """Hold page credits for the block, or raise 503 with ``Retry-After`` when none are left."""
+        ticket = self.try_acquire(pages)
+        if ticket is None:
+            retry_after = self.retry_after(pages)
+            logger.warning(
+                "Rejected %d-page conversion: %d pages in flight, capacity %d, retry after %ds",
+                pages, self.pages_in_flight, self.capacity(), retry_after,
+            )
+            record_value("admission", "rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The conversion service is busy, please retry later",
+                headers={"Retry-After": str(retry_after)},
+            )
+        record_value("admission", ticket.lane)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+
+_limiter: Optional[PageCreditLimiter] = None
+
+
+def get_limiter() -> PageCreditLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = PageCreditLimiter(
+            workers=settings.CONVERSION_WORKERS,
+            credits_per_worker=settings.ADMISSION_PAGE_CREDITS,
+            min_credits=settings.ADMISSION_MIN_PAGE_CREDITS,
+            max_credits=settings.ADMISSION_MAX_PAGE_CREDITS,
+            target_seconds=settings.ADMISSION_TARGET_SECONDS,
+            fast_lane_pages=settings.ADMISSION_FAST_LANE_PAGES,
+            fast_lane_slots=settings.ADMISSION_FAST_LANE_SLOTS,
+            memory_reserve_mb=settings.ADMISSION_MEMORY_RESERVE_MB,
+            mb_per_page=settings.ADMISSION_MB_PER_PAGE,
+        )
+    return _limiter
@@ -0,0 +1,184 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.utils import metrics
+from app.utils.config import settings
+from app.utils.progress import ProgressReporter, current_progress, reporting_progress
+
+logger = logging.getLogger(__name__)
+
+# Heavy modules kept off the import path of app.main and loaded here instead
+CONVERSION_MODULES = ("pandas", "camelot", "pdfplumber", "PyPDF2", "openpyxl", "xlsxwriter")
+LLM_MODULES = ("openai", "google.generativeai")
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Hands out the queues that carry progress events from a worker back to this process
+_manager = None
+
+
+def preload_modules(include_llm: bool = False) -> float:
+    start = time.perf_counter()
+    for name in CONVERSION_MODULES + (LLM_MODULES if include_llm else ()):
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Warm-up could not import %s: %s", name, e)
+    return time.perf_counter() - start
+
+
+def _init_worker():
+    # Spawned workers start with unconfigured logging and no conversion libraries
+    from app.utils.logging_config import configure_logging
+    configure_logging()
+    preload_modules()
+
+
+def start_workers(count: int) -> ProcessPoolExecutor:
+    """Pre-fork ``count`` conversion processes and load the conversion libraries in each."""
+    global _pool, _manager
+    context = multiprocessing.get_context(settings.CONVERSION_WORKER_START_METHOD)
+    _manager = context.Manager()
+    _pool = ProcessPoolExecutor(max_workers=count, mp_context=context, initializer=_init_worker)
+    # Submitting one task per worker forces the processes to be spawned now rather than on first use
+    pids = {future.result() for future in [_pool.submit(os.getpid) for _ in range(count)]}
+    logger.info("Started %d conversion worker processes", len(pids))
+    return _pool
+
+
+def shutdown_workers():
+    global _pool, _manager
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
+
+
+class _QueueHub:
+    """Stands in for the ProgressHub inside a worker: events are queued for the parent to publish.
+
+    The parent only passes a queue while someone is subscribed, so
+    ``page_batches`` splits the pages exactly as it would in a thread.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def has_subscribers(self, key) -> bool:
+        return True
+
+    def publish(self, key, event: dict):
+        self.queue.put(event)
+
+
+def _relay_progress(queue, progress: ProgressReporter):
+    # Runs in a parent thread until the None queued after the worker returned
+    for event in iter(queue.get, None):
+        progress.hub.publish(progress.key, event)
+
+
+# How often a worker samples its resident memory while a conversion runs
+RSS_SAMPLE_SECONDS = 0.05
+
+
+class _RssSampler(threading.Thread):
+    """Highest current RSS of this process seen while the sampler runs.
+
+    ``ru_maxrss`` is a high-water mark for the whole life of the process, so
+    it only moves when a job needs more than every job before it; sampling
+    the current RSS measures each job on its own.
+    """
+
+    def __init__(self, process):
+        super().__init__(daemon=True)
+        self._process = process
+        self._finished = threading.Event()
+        self.before = self.peak = process.memory_info().rss
+
+    def run(self):
+        while not self._finished.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, self._process.memory_info().rss)
+
+    def stop(self) -> float:
+        """Stop sampling and return the growth over the starting RSS in MiB."""
+        self._finished.set()
+        self.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+        return (self.peak - self.before) / (1024 * 1024)
+
+
+def _measured_call(func, args):
+    # RSS growth of this worker during the job, used by admission control to size memory per page.
+    # Only pool workers measure it: they run one conversion at a time, threads share the process.
+    try:
+        import psutil
+    except ImportError:
+        return func(*args)
+    sampler = _RssSampler(psutil.Process())
+    sampler.start()
+    try:
+        return func(*args)
+    finally:
+        metrics.record_value("rss_growth_mb", round(sampler.stop(), 2))
+
+
+def _call_in_worker(func, args, progress_queue=None):
+    before = metrics.snapshot()
+    reporter = ProgressReporter(_QueueHub(progress_queue), None) if progress_queue is not None else None
+    with metrics.capture_request_metrics() as request_metrics, reporting_progress(reporter):
+        result = _measured_call(func, args)
+    return result, request_metrics, metrics.diff(before, metrics.snapshot())
+
+
+def _profiled_call(profile_mode, func, args):
+    from app.utils.profiling import profiled
+
+    with profiled(profile_mode) as profile:
+        result = func(*args)
+    return result, profile
+
+
+async def run_conversion(func, *args, profile_mode=None):
+    """Run a blocking conversion off the event loop and return ``(result, profile)``.
+
+    Uses the pre-forked process pool when one was started, otherwise a thread.
+    Profiled runs always use a thread so the profiler sees the conversion.
+    Progress events a worker emits are relayed to this process's subscribers.
+    """
+    if profile_mode is not None:
+        return await run_in_threadpool(_profiled_call, profile_mode, func, args)
+    if _pool is None:
+        return await run_in_threadpool(func, *args), None
+
+    loop = asyncio.get_running_loop()
+    progress = current_progress()
+    progress_queue = relay = None
+    if progress is not None and progress.hub.has_subscribers(progress.key):
+        progress_queue = _manager.Queue()
+        relay = loop.run_in_executor(None, _relay_progress, progress_queue, progress)
+    try:
+        result, worker_metrics, delta = await loop.run_in_executor(
+            _pool, _call_in_worker, func, args, progress_queue
+        )
+    finally:
+        if relay is not None:
+            progress_queue.put(None)
+            await relay
+    # Fold the worker's stage timings and histogram observations back into this process
+    metrics.merge(delta)
+    request_metrics = metrics.current_request()
+    if request_metrics is not None:
+        for stage, seconds in worker_metrics.stages.items():
+            request_metrics.add_stage(stage, seconds)
+        request_metrics.values.update(worker_metrics.values)
+    return result, None
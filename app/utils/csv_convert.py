@@ -1,27 +1,61 @@
-import io
-import re
-import openai
-import time
-import os
-import pdfplumber
-from openpyxl import Workbook
-import google.generativeai as genai
-
-async def csv_convert(pdf_stream: io.BytesIO, type_bank: str) -> io.BytesIO:
-    text = extract_text_from_pdf(pdf_stream)
-    if os.getenv("CURRENT_AI") == "openai":
-        # Use OpenAI API
-        result = await convert_to_openai(text)  
-    else:
-        # Use Gemini API
-        result = await convert_to_gemini(text)
-
-    return result
+import asyncio
+import logging
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+from starlette.concurrency import run_in_threadpool
+from app.utils.config import settings
+from app.utils.metrics import stage_timer, observe_stage, record_value, LLM_TOKENS, LLM_COST, LLM_ESTIMATE_RATIO
+from app.utils.progress import current_progress, stage_started
+from app.utils.ocr import ocr_available, ocr_pages
+from app.utils.llm_providers import LLMProvider, LLMResponse, get_provider, join_documents, split_documents
+from app.utils.llm_budget import LLMEstimate, check_request_budget, get_budget
+
+logger = logging.getLogger(__name__)
+
+async def csv_convert(pdf_stream, type_bank: str, user_id=None, dry_run: bool = False) -> Union[str, LLMEstimate]:
+    """Convert a statement to CSV through the configured LLM provider and return the CSV text.
+
+    The prompt is sized with the provider's tokenizer before anything is
+    sent: past the per-request limits answers 413, past the user's daily
+    budget 429. With ``dry_run`` the ``LLMEstimate`` is returned instead of
+    the text and the provider is not called.
+    """
+    with stage_timer("text_extraction"):
+        # Off the event loop: pdfplumber and the OCR subprocesses can take tens of seconds
+        text = await run_in_threadpool(extract_text_from_pdf, pdf_stream)
+
+    provider = get_provider()
+    with stage_timer("token_estimate"):
+        estimate = estimate_conversion(provider, text)
+    record_value("llm_estimated_prompt_tokens", estimate.prompt_tokens)
+    record_value("llm_estimated_max_cost_usd", round(estimate.cost, 6))
+    if dry_run:
+        return estimate
+    check_request_budget(estimate)
+    # The budget store may be Redis; its round trips stay off the event loop
+    reservation = await run_in_threadpool(get_budget().reserve, user_id, estimate)
+
+    # observe_stage records llm_call once the call returns; announce it to progress subscribers now
+    stage_started("llm_call")
+    try:
+        response, batch_size = await get_batcher().convert(text, user_id)
+    except BaseException:
+        await run_in_threadpool(reservation.release)
+        raise
+    await run_in_threadpool(reservation.settle, response.total_tokens, response.cost)
+    _record_llm_usage(provider.name, response, batch_size, estimate)
+    return response.text
 
 
 def extract_text_from_pdf(pdf_stream):
-     full_text = ""
+     import pdfplumber
+
+     page_texts = {}
+     scanned_pages = []
+     progress = current_progress()
      with pdfplumber.open(pdf_stream) as pdf:
+        if progress is not None:
+            progress.set_total(len(pdf.pages))
+            progress.start_parsing()
         for i, page in enumerate(pdf.pages):
             text = ""
             page_text = page.extract_text()
@@ -36,85 +70,191 @@ def extract_text_from_pdf(pdf_stream):
                             text += "\n" + ",".join([cell.strip() if cell else "" for cell in row])
 
             if text.strip():
-                full_text += f"\n\n--- Page {i+1} ---\n{text}"
+                page_texts[i + 1] = text
             else:
-                print(f"⚠️  Warning: No extractable text/tables found on page {i+1}")
-
+                scanned_pages.append(i + 1)
+            if progress is not None:
+                progress.pages_parsed([i + 1], 0)
 
-     return full_text
+     # Pages without a text layer are scans; OCR them all at once so they run in parallel
+     if scanned_pages and isinstance(pdf_stream, str) and ocr_available():
+        with stage_timer("ocr"):
+            for page, result in ocr_pages(pdf_stream, scanned_pages).items():
+                if result is not None and result.text.strip():
+                    page_texts[page] = result.text
+        record_value("pages_ocr", len(scanned_pages))
+     for page in scanned_pages:
+        if page not in page_texts:
+            logger.warning("No extractable text/tables found on page %d", page)
 
+     return "".join(f"\n\n--- Page {page} ---\n{page_texts[page]}" for page in sorted(page_texts))
 
-def truncate_input(text, limit=12000):
-    return text[:limit]
 
-def convert_to_openai(text):
-    # Use OpenAI API
-    system_prompt = (
-        "You are a financial assistant. Extract all bank transactions from the input text and format them as a table. "
-        "Columns: Tanggal Transaksi, Keterangan Utama, Keterangan Tambahan, Uang Masuk IDR, Uang Keluar IDR, Saldo. "
-        "Return only CSV format without explanation."
+def _record_llm_usage(provider, response: LLMResponse, batch_size: int = 1, estimate: Optional[LLMEstimate] = None):
+    observe_stage("llm_call", response.elapsed)
+    if estimate is not None and estimate.prompt_tokens:
+        # Actual over estimated prompt tokens; drifting away from 1 means LLM_INPUT_CHARS needs retuning
+        ratio = response.prompt_tokens / estimate.prompt_tokens
+        LLM_ESTIMATE_RATIO.observe(ratio, provider=provider)
+        record_value("llm_prompt_estimate_ratio", round(ratio, 4))
+    LLM_TOKENS.observe(response.prompt_tokens, provider=provider, kind="prompt")
+    LLM_TOKENS.observe(response.completion_tokens, provider=provider, kind="completion")
+    LLM_COST.observe(response.cost, provider=provider)
+    record_value("llm_provider", provider)
+    record_value("llm_batch_size", batch_size)
+    record_value("llm_prompt_tokens", response.prompt_tokens)
+    record_value("llm_completion_tokens", response.completion_tokens)
+    record_value("llm_total_tokens", response.total_tokens)
+    record_value("llm_cost_usd", round(response.cost, 6))
+    logger.info(
+        "LLM call via %s took %.2fs (batch of %d): prompt=%d completion=%d total=%d tokens, estimated cost $%.4f",
+        provider, response.elapsed, batch_size, response.prompt_tokens, response.completion_tokens,
+        response.total_tokens, response.cost,
     )
-    user_prompt = f"Here is the text from the bank statement PDF:\n\n{truncate_input(text)}\n\nExtract and format as CSV table."
-
-    start_time = time.time()
-    
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.2,
-        max_tokens=1000,
-        top_p=1,
-        frequency_penalty=0,
-        presence_penalty=0,
-        stop=["\n\n"]
+
+
+SYSTEM_PROMPT = (
+    "You are a financial assistant. Extract all bank transactions from the input text and format them as a table. "
+    "Columns: Tanggal Transaksi, Keterangan Utama, Keterangan Tambahan, Uang Masuk IDR, Uang Keluar IDR, Saldo. "
+    "Return only CSV format without explanation."
+)
+BATCH_INSTRUCTIONS = (
+    " The input holds several bank statements, each starting with a '### DOCUMENT <n>' line. "
+    "Answer each statement with its own CSV table, introduced by the same '### DOCUMENT <n>' line."
+)
+
+
+def truncate_input(text, limit=None):
+    return text[:limit or settings.LLM_INPUT_CHARS]
+
+
+def _user_prompt(text: str) -> str:
+    return f"Here is the text from the bank statement PDF:\n\n{truncate_input(text)}\n\nExtract and format as CSV table."
+
+
+def convert_text(provider: LLMProvider, text: str) -> LLMResponse:
+    return provider.complete(SYSTEM_PROMPT, _user_prompt(text), stop=["\n\n"])
+
+
+def estimate_conversion(provider: LLMProvider, text: str) -> LLMEstimate:
+    """Tokens and worst-case cost of converting ``text`` on its own, counted on the prompt ``convert_text`` sends."""
+    prompt_tokens = provider.count_prompt_tokens(SYSTEM_PROMPT, _user_prompt(text))
+    completion_tokens = settings.LLM_MAX_OUTPUT_TOKENS
+    return LLMEstimate(
+        provider.name, prompt_tokens, completion_tokens, provider.cost(prompt_tokens, completion_tokens),
+        input_chars=len(text), truncated=len(text) > settings.LLM_INPUT_CHARS,
     )
-    
-    elapsed = time.time() - start_time
-    usage = response.get("usage", {})
-    prompt_tokens = usage.get("prompt_tokens", 0)
-    completion_tokens = usage.get("completion_tokens", 0)
-    total_tokens = usage.get("total_tokens", 0)
-    cost = (prompt_tokens / 1000 * 0.01) + (completion_tokens / 1000 * 0.03)
-    
-    print(f"🕒 GPT processing time: {elapsed:.2f} seconds")
-    print(f"📊 Token usage: prompt={prompt_tokens}, completion={completion_tokens}, total={total_tokens}")
-    print(f"💵 Estimated cost: ${cost:.4f}")
-    
-    return response['choices'][0]['message']['content']
-
-
-def convert_to_gemini(text):
-    # Use Gemini API
-    geminiApiKey = os.getenv("GEMINI_API_KEY")
-    genai.configure(api_key=geminiApiKey)    
-    
-    start_time = time.time()
-    
-    response = genai.generate(
-        model="gpt-4",
-        prompt=f"Here is the text from the bank statement PDF:\n\n{truncate_input(text)}\n\nExtract and format as CSV table.",
-        max_tokens=1000,
-        temperature=0.2,
-        top_p=1,
-        frequency_penalty=0,
-        presence_penalty=0,
-        stop=["\n\n"]
+
+
+def convert_batch(provider: LLMProvider, texts: List[str]) -> List[LLMResponse]:
+    """Convert several statements with one request and split the answer per statement.
+
+    Usage is shared out by each statement's share of the prompt and of the
+    answer. A statement missing from the answer is converted on its own.
+    """
+    if len(texts) == 1:
+        return [convert_text(provider, texts[0])]
+    texts = [truncate_input(text) for text in texts]
+    user_prompt = (
+        f"Here are the texts of {len(texts)} bank statement PDFs:\n\n{join_documents(texts)}\n\n"
+        "Extract and format each as a CSV table."
     )
-    
-    elapsed = time.time() - start_time
-    usage = response.get("usage", {})
-    prompt_tokens = usage.get("prompt_tokens", 0)
-    completion_tokens = usage.get("completion_tokens", 0)
-    total_tokens = usage.get("total_tokens", 0)
-    cost = (prompt_tokens / 1000 * 0.01) + (completion_tokens / 1000 * 0.03)
-    
-    print(f"🕒 GPT processing time: {elapsed:.2f} seconds")
-    print(f"📊 Token usage: prompt={prompt_tokens}, completion={completion_tokens}, total={total_tokens}")
-    print(f"💵 Estimated cost: ${cost:.4f}")    
-    
-    return response['generated_text']
\ No newline at end of file
+    # No stop sequence here: the tables are separated by blank lines
+    response = provider.complete(SYSTEM_PROMPT + BATCH_INSTRUCTIONS, user_prompt,
+                                 max_tokens=settings.LLM_MAX_OUTPUT_TOKENS * len(texts))
+    sections = split_documents(response.text)
+    prompt_chars = sum(len(text) for text in texts) or 1
+    answer_chars = sum(len(section) for section in sections.values()) or 1
+
+    results = []
+    for index, text in enumerate(texts, start=1):
+        section = sections.get(index)
+        if section is None:
+            logger.warning("Batched LLM answer has no table for statement %d of %d; converting it alone",
+                           index, len(texts))
+            results.append(convert_text(provider, text))
+            continue
+        prompt_tokens = round(response.prompt_tokens * len(text) / prompt_chars)
+        completion_tokens = round(response.completion_tokens * len(section) / answer_chars)
+        results.append(LLMResponse(section, prompt_tokens, completion_tokens,
+                                   provider.cost(prompt_tokens, completion_tokens), response.elapsed))
+    return results
+
+
+class StatementBatcher:
+    """Coalesces small statements converted at about the same time into one provider request.
+
+    Only statements with the same key (the user id) share a request, so an
+    answer whose documents get mixed up cannot hand one user's transactions
+    to another. A statement waits at most ``window`` seconds for others; the
+    batch goes out early once it holds ``max_documents`` statements or would
+    exceed ``max_chars`` characters. Statements of ``max_chars`` or more, and
+    every statement when the window is 0, are sent on their own straight away.
+    """
+
+    def __init__(self, window: float, max_chars: int, max_documents: int):
+        self.window = window
+        self.max_chars = max_chars
+        self.max_documents = max_documents
+        self._pending: Dict[Hashable, List[Tuple[str, asyncio.Future]]] = {}
+        self._pending_chars: Dict[Hashable, int] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    async def convert(self, text: str, key: Hashable = None) -> Tuple[LLMResponse, int]:
+        """``(response, batch size)`` for one statement's text, batched only with others of ``key``."""
+        text = truncate_input(text)
+        if self.window <= 0 or self.max_documents <= 1 or len(text) >= self.max_chars:
+            return await run_in_threadpool(convert_text, get_provider(), text), 1
+
+        if key in self._pending and self._pending_chars[key] + len(text) > self.max_chars:
+            self._flush(key)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((text, future))
+        self._pending_chars[key] = self._pending_chars.get(key, 0) + len(text)
+        if len(pending) >= self.max_documents:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        self._pending_chars.pop(key, None)
+        if batch:
+            # Keep a reference so the task is not collected while it runs
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            responses = await run_in_threadpool(convert_batch, get_provider(), [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            # A waiter whose request went away has a cancelled future
+            if not future.done():
+                future.set_result((response, len(batch)))
+
+
+_batcher: Optional[StatementBatcher] = None
+
+
+def get_batcher() -> StatementBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = StatementBatcher(
+            window=settings.LLM_BATCH_WINDOW_MS / 1000,
+            max_chars=settings.LLM_BATCH_MAX_CHARS,
+            max_documents=settings.LLM_BATCH_MAX_DOCUMENTS,
+        )
+    return _batcher
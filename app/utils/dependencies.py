@@ -1,5 +1,6 @@
-from typing import List
-from fastapi import Depends, HTTPException, status
+import math
+from typing import List, Optional
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.utils.security import create_access_token
@@ -7,9 +8,13 @@ from app.schemas.user import TokenData
 from app.db.session import SessionLocal
 from app.utils.config import settings
 from app.models.user import User
+from app.crud.effective_permissions import has_permission
+from app.utils.profiling import ProfileMode
+from app.utils.rate_limit import get_bucket_store, rate_for_user
 import jwt
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token", auto_error=False)
 
 def get_db() -> Session:
     db = SessionLocal()
@@ -51,9 +56,38 @@ def role_required(roles: List[str]):
     return role_checker
 
 def permission_required(permission: str):
-    def permission_checker(current_user: User = Depends(get_current_user)):
-        permissions = [perm.name for role in current_user.roles for perm in role.permissions]
-        if permission not in permissions:
+    def permission_checker(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+        # One primary-key lookup instead of walking roles -> permissions
+        if not has_permission(db, current_user.id, permission):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operation not permitted")
         return current_user
-    return permission_checker
\ No newline at end of file
+    return permission_checker
+
+def profiling_requested(
+    x_profile: Optional[ProfileMode] = Header(None),
+    db: Session = Depends(get_db),
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+) -> Optional[ProfileMode]:
+    # Requests without the header skip authentication entirely
+    if x_profile is None:
+        return None
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    current_user = get_current_user(db=db, token=token)
+    permission_required("profile_conversion")(current_user=current_user, db=db)
+    return x_profile
+
+def conversion_rate_limited(current_user: User = Depends(get_current_user)) -> User:
+    capacity, period = rate_for_user(current_user)
+    retry_after = get_bucket_store().take(f"convert:{current_user.id}", capacity, period)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many conversion requests, please retry later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    return current_user
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# XLSX is already a zip archive; only text formats are worth compressing
+COMPRESSIBLE_TYPES = ("text/csv", "text/plain", "application/json")
+MIN_COMPRESS_BYTES = 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate_encoding(request: Request, media_type: str, size: int) -> Optional[str]:
+    """Pick ``br`` or ``gzip`` from Accept-Encoding for compressible responses, else ``None``."""
+    if size < MIN_COMPRESS_BYTES or not media_type.startswith(COMPRESSIBLE_TYPES):
+        return None
+    accepted: Dict[str, float] = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    candidates = ["br", "gzip"] if _brotli_available() else ["gzip"]
+    best = max(candidates, key=lambda coding: accepted.get(coding, accepted.get("*", 0.0)))
+    return best if accepted.get(best, accepted.get("*", 0.0)) > 0 else None
+
+
+class _Compressor:
+    """Incremental gzip or brotli encoder, so large files are compressed while they stream."""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            import brotli
+            self._brotli = brotli.Compressor(quality=5)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive ``(start, end)``.
+
+    Returns ``None`` when the header is absent or not a single byte range
+    (the full body is sent then); raises ``ValueError`` when it cannot be
+    satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise ValueError
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError("Invalid range")
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _etag(digest: str, encoding: Optional[str]) -> str:
+    # Each encoding is a different representation and needs its own strong validator
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    tags = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    return etag in tags or "*" in tags
+
+
+def _requested_range(request: Request, etag: str, size: int):
+    # If-Range with a stale validator means "send the whole new body"
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != etag:
+        return None
+    return parse_range(request.headers.get("range"), size)
+
+
+def _base_headers(filename: str, etag: str, encoding: Optional[str], headers: Optional[dict]) -> dict:
+    result = {
+        **(headers or {}),
+        "Content-Disposition": f"attachment; filename={filename}",
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    if encoding:
+        result["Content-Encoding"] = encoding
+    return result
+
+
+def _range_not_satisfiable(size: int, etag: str) -> Response:
+    return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", "ETag": etag})
+
+
+def bytes_response(request: Request, data: bytes, media_type: str, filename: str,
+                   digest: Optional[str] = None, headers: Optional[dict] = None) -> Response:
+    """Send an in-memory result with ETag, conditional GET, single-range and gzip/br support.
+
+    Range requests are answered from the uncompressed body so a resumed
+    download lines up with the bytes the client already has.
+    """
+    digest = digest or content_hash(data)
+    wants_range = "range" in request.headers
+    encoding = None if wants_range else negotiate_encoding(request, media_type, len(data))
+    etag = _etag(digest, encoding)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+    try:
+        byte_range = _requested_range(request, etag, len(data)) if wants_range else None
+    except ValueError:
+        return _range_not_satisfiable(len(data), etag)
+    response_headers = _base_headers(filename, etag, encoding, headers)
+    if byte_range is not None:
+        start, end = byte_range
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(data[start:end + 1], status_code=206, media_type=media_type, headers=response_headers)
+    if encoding:
+        compressor = _Compressor(encoding)
+        data = compressor.compress(data) + compressor.flush()
+    return Response(data, media_type=media_type, headers=response_headers)
+
+
+def _read_file(path: str, start: int, end: int, encoding: Optional[str] = None) -> Iterator[bytes]:
+    compressor = _Compressor(encoding) if encoding else None
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield compressor.compress(chunk) if compressor else chunk
+    if compressor:
+        yield compressor.flush()
+
+
+def file_response(request: Request, path: str, media_type: str, filename: str,
+                  digest: Optional[str] = None, headers: Optional[dict] = None) -> Response:
+    """Serve a stored result with the same validators and range handling as ``bytes_response``.
+
+    Uncompressed full downloads go through ``FileResponse``, which hands the
+    path to the server (``http.response.pathsend``) for a zero-copy send
+    where supported. Ranges and compressed bodies are streamed in chunks.
+    """
+    size = os.path.getsize(path)
+    digest = digest or file_hash(path)
+    wants_range = "range" in request.headers
+    encoding = None if wants_range else negotiate_encoding(request, media_type, size)
+    etag = _etag(digest, encoding)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+    try:
+        byte_range = _requested_range(request, etag, size) if wants_range else None
+    except ValueError:
+        return _range_not_satisfiable(size, etag)
+    response_headers = _base_headers(filename, etag, encoding, headers)
+    if byte_range is not None:
+        start, end = byte_range
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response_headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_read_file(path, start, end), status_code=206, media_type=media_type,
+                                 headers=response_headers)
+    if encoding:
+        return StreamingResponse(_read_file(path, 0, size - 1, encoding), media_type=media_type,
+                                 headers=response_headers)
+    del response_headers["Content-Disposition"]
+    return FileResponse(path, media_type=media_type, filename=filename, headers=response_headers)
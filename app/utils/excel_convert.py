@@ -1,135 +1,724 @@
-import pdfplumber
-import io
-from fastapi.responses import StreamingResponse
-import camelot
+import logging
 import re
-import pandas as pd
+import time
+from collections import Counter
 from io import BytesIO
-from PyPDF2 import PdfReader
-from datetime import datetime
+from typing import List, Optional
+from app.utils.config import settings
+from app.utils.pdf_input import PdfSource
+from app.utils.page_cache import (
+    page_fingerprint, statement_key, statement_period, load_page_tables, store_page_tables,
+    row_fingerprints, load_statement_rows, store_statement_rows,
+)
+from app.utils.metrics import stage_timer, record_value, CONVERSION_ROWS, CONVERSION_PAGES_SKIPPED
+from app.utils.progress import current_progress, page_batches
+from app.utils.ocr import ocr_available, ocr_pages
+from app.utils.layout_templates import (
+    layout_signature, template_key, load_template, store_template, discard_template, learn_template,
+)
+
+logger = logging.getLogger(__name__)
+
+def extract_bca_transactions(pdf_path, bank_type: str, export_type: str, layout: str = "basic",
+                             only_new: bool = False, owner=None, with_transactions: bool = False):
+    """Convert a BCA statement to an Excel workbook.
+
+    With ``with_transactions`` an ``(output, records)`` tuple is returned,
+    where ``records`` are the rows in the compact form stored for search.
+    """
+    output, merged_df, scan = _extract_bca(pdf_path, bank_type, export_type, layout, only_new, owner, with_transactions)
+    if not with_transactions:
+        return output
+    records = []
+    if merged_df is not None:
+        with stage_timer("transaction_records"):
+            records = transaction_records(merged_df, scan.period if scan is not None else None)
+    return output, records
 
-def extract_bca_transactions(pdf_path: str, bank_type: str, export_type: str) -> BytesIO:
 
+def _extract_bca(pdf_path, bank_type: str, export_type: str, layout: str, only_new: bool, owner, need_scan: bool):
+    # camelot (OpenCV, ghostscript) and pandas are imported on first use to keep app startup lean
     import camelot
     import pandas as pd
-    from io import BytesIO
-    from PyPDF2 import PdfReader
-    import re
-
-    tables = camelot.read_pdf(
-        filepath=pdf_path,
-        pages="all",
-        flavor="stream",
-        strip_text="\n",
-        edge_tol=500,
-    )
 
-    if not tables:
-        print("No tables found in the PDF. Please check the PDF path and structure.")
+    scan = None
+    if settings.PAGE_PREFILTER or settings.PAGE_CACHE or settings.OCR_ENABLED or need_scan:
+        with stage_timer("page_filter"):
+            filter_start = time.perf_counter()
+            scan = scan_pages(pdf_path)
+            filter_seconds = time.perf_counter() - filter_start
+
+    filepath = pdf_path.path if isinstance(pdf_path, PdfSource) else pdf_path
+    pages = None
+    skipped_pages = 0
+    ocr_targets = []
+    if scan is not None:
+        # Scanned pages have no text layer for camelot; they are OCRed instead
+        if scan.image_pages and isinstance(filepath, str) and ocr_available():
+            ocr_targets = scan.image_pages
+        pages = [page for page in range(1, scan.total_pages + 1) if page not in ocr_targets]
+        # Fall back to every page when nothing matched, e.g. an unfamiliar layout
+        if settings.PAGE_PREFILTER and scan.selected_pages:
+            skipped_pages = len(pages) - len(scan.selected_pages)
+            pages = scan.selected_pages
+        if settings.PAGE_PREFILTER:
+            CONVERSION_PAGES_SKIPPED.observe(skipped_pages, bank=bank_type, export=export_type)
+            record_value("pages_skipped", skipped_pages)
+
+    # Pages whose text is unchanged since an earlier conversion reuse its normalised tables
+    page_tables = {}
+    if ocr_targets:
+        # OCR text is cached by page image instead: every scanned page has the same (empty) text fingerprint
+        with stage_timer("ocr"):
+            for page, result in ocr_pages(filepath, ocr_targets).items():
+                df = _ocr_table(result.words) if result is not None else None
+                df = _normalise_bca_table(df) if df is not None else None
+                page_tables[page] = [df] if df is not None else []
+        record_value("pages_ocr", len(ocr_targets))
+    if scan is not None and settings.PAGE_CACHE:
+        cached_pages = 0
+        for page in pages:
+            cached = load_page_tables(scan.fingerprints[page], dtype=string_dtype())
+            if cached is not None:
+                page_tables[page] = cached
+                cached_pages += 1
+        record_value("pages_cached", cached_pages)
+    pages_to_parse = [page for page in pages if page not in page_tables] if pages is not None else None
+
+    progress = current_progress()
+    if progress is not None and pages is not None:
+        progress.set_total(len(pages) + len(ocr_targets))
+        if page_tables:
+            progress.pages_parsed(sorted(page_tables), sum(len(df) for dfs in page_tables.values() for df in dfs),
+                                  parsed=False)
+
+    # Column positions learned from an earlier statement with the same layout spare camelot's detection
+    template_id = template = None
+    if settings.LAYOUT_TEMPLATES and scan is not None and scan.layout and pages_to_parse:
+        template_id = template_key(bank_type, scan.layout)
+        template = load_template(template_id)
+        record_value("layout_template", "hit" if template is not None else "miss")
+
+    tables = []
+    if pages_to_parse is None or pages_to_parse:
+        extraction_start = time.perf_counter()
+        detected = []
+        with stage_timer("table_extraction"):
+            if progress is not None:
+                progress.start_parsing()
+            # One camelot call per batch; a single batch unless someone is subscribed to the progress
+            for batch in page_batches(pages_to_parse):
+                pages_option = ",".join(str(page) for page in batch) if batch else "all"
+                batch_tables = None
+                if template is not None:
+                    batch_tables = camelot.read_pdf(
+                        filepath=filepath, pages=pages_option, flavor="stream", strip_text="\n",
+                        **template.camelot_options(),
+                    )
+                    if not _covers_pages(batch_tables, batch, scan.dated_rows):
+                        # The layout moved; detect this batch and relearn from it
+                        record_value("layout_template", "fallback")
+                        template = None
+                        discard_template(template_id)
+                        batch_tables = None
+                if batch_tables is None:
+                    # Given a path, camelot reads the spooled upload in place instead of writing its own temp copy
+                    batch_tables = camelot.read_pdf(
+                        filepath=filepath, pages=pages_option, flavor="stream", strip_text="\n", edge_tol=500,
+                    )
+                    detected.extend(batch_tables)
+                tables.extend(batch_tables)
+                if progress is not None and batch:
+                    progress.pages_parsed(batch, sum(table.df.shape[0] for table in batch_tables))
+        if template_id is not None and template is None:
+            learned = learn_template([table for table in detected if _is_transaction_table(table.df)])
+            if learned is not None:
+                # The template only speeds up later statements; failing to save it must not fail this one
+                try:
+                    store_template(template_id, learned)
+                    record_value("layout_template", "learned")
+                except OSError as e:
+                    logger.warning("Could not store layout template %s: %s", template_id, e)
+        if skipped_pages:
+            # Skipped pages would have cost about as much as the pages camelot did parse
+            seconds_per_page = (time.perf_counter() - extraction_start) / len(pages_to_parse)
+            record_value("estimated_seconds_saved", round(seconds_per_page * skipped_pages - filter_seconds, 6))
+
+    if not tables and not page_tables:
+        logger.info("No tables found in the PDF")
         output = BytesIO()
         pd.DataFrame().to_excel(output, index=False, engine="openpyxl")
         output.seek(0)
-        return output
-
-    all_dfs = []
-
-    column_keywords = {
-        'TANGGAL': ['TANGGAL', 'DATE'],
-        'KETERANGAN': ['KETERANGAN', 'DESCRIPTION', 'DETAIL'],
-        'CBG': ['CBG', 'BRANCH'],
-        'MUTASI': ['MUTASI', 'DEBIT', 'CREDIT', 'AMOUNT'],
-        'SALDO': ['SALDO', 'BALANCE']
-    }
-
-    keyword_to_standard_col = {
-        keyword: standard_col
-        for standard_col, keywords in column_keywords.items()
-        for keyword in keywords
-    }
-
-    for i, table in enumerate(tables):
-        df = table.df.copy()
-        if df.shape[0] == 0:
-            continue
-
-        col_idx_to_standard_name = {}
-        header_row_candidate_idx = -1
-
-        for r_idx in range(min(df.shape[0], 5)):
-            row_values = [str(val).upper().replace('\n', ' ').strip() for val in df.iloc[r_idx]]
-            found_keywords_count = 0
-            temp_col_map = {}
-            for c_idx, cell_value in enumerate(row_values):
-                for keyword, standard_col in keyword_to_standard_col.items():
-                    if keyword in cell_value:
-                        temp_col_map[c_idx] = standard_col
-                        found_keywords_count += 1
-                        break
-            if found_keywords_count >= 3:
-                col_idx_to_standard_name = temp_col_map
-                header_row_candidate_idx = r_idx
-                break
-
-        new_df_columns = [f'Col_{j}' for j in range(df.shape[1])]
-        for c_idx, standard_name in col_idx_to_standard_name.items():
-            if c_idx < len(new_df_columns):
-                new_df_columns[c_idx] = standard_name
-
-        df.columns = new_df_columns
-
-        if header_row_candidate_idx != -1:
-            df = df[header_row_candidate_idx + 1:].copy()
-
-        df = df.loc[:, ~df.columns.str.startswith('Col_') | (df.apply(lambda x: x.astype(str).str.strip() != '').any())].copy()
-
-        for col in column_keywords.keys():
-            if col not in df.columns:
-                df[col] = ''
-
-        if 'TANGGAL' in df.columns:
-            df = df[~df['TANGGAL'].astype(str).str.contains(r'^(?:SALDO AWAL|HALAMAN|Bersambung)', na=False, regex=True)]
-
-        df.replace('', pd.NA, inplace=True)
-        df.dropna(subset=list(column_keywords.keys()), how='all', inplace=True)
-
-        # ✅ Custom column remapping
-        rename_map = {
-            'TANGGAL': 'Tanggal Transaksi',
-            'Col_1': 'Keterangan Utama',
-            'KETERANGAN': 'Keterangan Tambahan',
-            'CBG': 'CBG',
-            'MUTASI': 'Mutasi',
-            'Col_5': 'Type',
-            'SALDO': 'Saldo'
-        }
-        df = df.rename(columns=rename_map)
-
-        if 'Col_6' in df.columns:
-            df.drop(columns=['Col_6'], inplace=True)
-
-        all_dfs.append(df)
+        return output, None, scan
+
+    with stage_timer("normalisation"):
+        parsed_tables = {page: [] for page in (pages_to_parse or [])}
+        for table in tables:
+            df = _normalise_bca_table(table.df)
+            if df is not None:
+                parsed_tables.setdefault(int(table.page), []).append(df)
+        if scan is not None and settings.PAGE_CACHE:
+            for page, dfs in parsed_tables.items():
+                store_page_tables(scan.fingerprints[page], dfs)
+        page_tables.update(parsed_tables)
+
+        all_dfs = []
+        merger = TransactionRowMerger()
+        for page in sorted(page_tables):
+            for df in page_tables[page]:
+                # Normalised and cached tables are owned by this conversion, so the column is added in place
+                df[PAGE_COLUMN] = pd.Series(page, index=df.index, dtype='int32')
+                all_dfs.append(merger.feed(df))
+        if all_dfs:
+            all_dfs.append(merger.flush())
+        record_value("continuation_rows_merged", merger.continuation_rows)
+
+        if all_dfs:
+            merged_df = pd.concat(all_dfs, ignore_index=True)
+            merged_df.replace('', pd.NA, inplace=True)
+            merged_df.dropna(how='all', subset=[col for col in merged_df.columns if col != PAGE_COLUMN], inplace=True)
+
+            key = scan.statement_key if scan is not None else None
+            if key is not None and owner is not None:
+                fingerprints = row_fingerprints(merged_df, exclude=(PAGE_COLUMN,))
+                previous = load_statement_rows(owner, key)
+                store_statement_rows(owner, key, previous | Counter(fingerprints))
+                if only_new:
+                    # Identical transactions share a fingerprint: only occurrences beyond the stored count are new
+                    seen = Counter()
+                    new_rows = []
+                    for fingerprint in fingerprints:
+                        seen[fingerprint] += 1
+                        new_rows.append(seen[fingerprint] > previous[fingerprint])
+                    merged_df = merged_df.loc[new_rows]
+                    record_value("new_rows", len(merged_df))
 
     if not all_dfs:
         output = BytesIO()
         pd.DataFrame().to_excel(output, index=False, engine="openpyxl")
         output.seek(0)
-        return output
+        return output, None, scan
 
-    merged_df = pd.concat(all_dfs, ignore_index=True)
-    merged_df.replace('', pd.NA, inplace=True)
-    merged_df.dropna(how='all', inplace=True)
+    CONVERSION_ROWS.observe(len(merged_df), bank=bank_type, export=export_type)
+    record_value("rows", len(merged_df))
 
     output = BytesIO()
     try:
-        merged_df.to_excel(output, index=False, engine="openpyxl")
+        with stage_timer("export"):
+            if layout == "summary":
+                write_summary_workbook(merged_df, output)
+            else:
+                merged_df.drop(columns=[PAGE_COLUMN]).to_excel(output, index=False, engine="openpyxl")
         output.seek(0)
     except Exception as e:
-        print(f"Error exporting to Excel BytesIO: {e}")
+        logger.error("Error exporting to Excel BytesIO: %s", e)
         output = BytesIO()
         pd.DataFrame().to_excel(output, index=False, engine="openpyxl")
         output.seek(0)
 
-    return output
+    return output, merged_df, scan
+
+
+DATE_PATTERN = re.compile(r'^\d{2}/\d{2}$')
+
+
+class PageScan:
+    def __init__(self, total_pages: int, selected_pages: List[int], fingerprints: dict, statement_key, period=None,
+                 layout=None, image_pages=None, dated_rows=None):
+        self.total_pages = total_pages
+        self.selected_pages = selected_pages
+        self.fingerprints = fingerprints
+        self.statement_key = statement_key
+        self.period = period
+        self.layout = layout
+        self.image_pages = image_pages or []
+        # DD/MM dates in each page's text, a floor for the transactions camelot must find there
+        self.dated_rows = dated_rows or {}
+
+
+def scan_pages(pdf_file) -> PageScan:
+    """Cheap text pass over every page.
+
+    Selects the 1-based numbers of pages showing the transaction header row
+    and at least one dated row, fingerprints each page's text for the page
+    cache, reads the account/period statement key and the statement
+    period from the first page, takes the layout signature (page size
+    and header column order) from the first transaction page, counts the
+    dated rows of each page and lists the pages without a text layer (scans).
+    PyPDF2's plain text extraction is used because it is an order of
+    magnitude cheaper than camelot's (or pdfplumber's) layout analysis.
+    """
+    selected: List[int] = []
+    image_pages: List[int] = []
+    fingerprints = {}
+    dated_rows = {}
+    key = period = layout = None
+    if isinstance(pdf_file, PdfSource):
+        reader = pdf_file.reader
+    else:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(pdf_file)
+    for number, page in enumerate(reader.pages, start=1):
+        text = page.extract_text() or ""
+        fingerprints[number] = page_fingerprint(text)
+        if not text.strip():
+            image_pages.append(number)
+        if number == 1:
+            key = statement_key(text)
+            period = statement_period(text)
+        words = text.upper().split()
+        header_columns = {KEYWORD_TO_STANDARD_COL[word] for word in words if word in KEYWORD_TO_STANDARD_COL}
+        dates = sum(1 for word in words if DATE_PATTERN.match(word))
+        if 'TANGGAL' in header_columns and len(header_columns) >= 3 and dates:
+            selected.append(number)
+            dated_rows[number] = dates
+            if layout is None:
+                ordered = dict.fromkeys(KEYWORD_TO_STANDARD_COL[word] for word in words if word in KEYWORD_TO_STANDARD_COL)
+                layout = layout_signature(list(ordered), float(page.mediabox.width), float(page.mediabox.height))
+    if hasattr(pdf_file, "seek"):
+        pdf_file.seek(0)
+    return PageScan(len(reader.pages), selected, fingerprints, key, period, layout, image_pages, dated_rows)
+
+
+COLUMN_KEYWORDS = {
+    'TANGGAL': ['TANGGAL', 'DATE'],
+    'KETERANGAN': ['KETERANGAN', 'DESCRIPTION', 'DETAIL'],
+    'CBG': ['CBG', 'BRANCH'],
+    'MUTASI': ['MUTASI', 'DEBIT', 'CREDIT', 'AMOUNT'],
+    'SALDO': ['SALDO', 'BALANCE']
+}
+
+KEYWORD_TO_STANDARD_COL = {
+    keyword: standard_col
+    for standard_col, keywords in COLUMN_KEYWORDS.items()
+    for keyword in keywords
+}
+
+# ✅ Custom column remapping
+RENAME_MAP = {
+    'TANGGAL': 'Tanggal Transaksi',
+    'Col_1': 'Keterangan Utama',
+    'KETERANGAN': 'Keterangan Tambahan',
+    'CBG': 'CBG',
+    'MUTASI': 'Mutasi',
+    'Col_5': 'Type',
+    'SALDO': 'Saldo'
+}
+
+
+def _find_header(df):
+    """``({column index: standard name}, row index)`` of the header among the first rows, or ``({}, -1)``."""
+    for r_idx in range(min(df.shape[0], 5)):
+        row_values = [str(val).upper().replace('\n', ' ').strip() for val in df.iloc[r_idx]]
+        temp_col_map = {}
+        for c_idx, cell_value in enumerate(row_values):
+            for keyword, standard_col in KEYWORD_TO_STANDARD_COL.items():
+                if keyword in cell_value:
+                    temp_col_map[c_idx] = standard_col
+                    break
+        if len(temp_col_map) >= 3:
+            return temp_col_map, r_idx
+    return {}, -1
+
+
+def _dated_rows(df) -> int:
+    """DD/MM dates in the TANGGAL column below the header row; 0 without such a header."""
+    columns, header_row = _find_header(df)
+    date_columns = [index for index, name in columns.items() if name == 'TANGGAL']
+    if not date_columns:
+        return 0
+    dates = df.iloc[header_row + 1:, date_columns[0]].astype(str).str.strip()
+    return int(dates.str.match(DATE_PATTERN).sum())
+
+
+def _is_transaction_table(df) -> bool:
+    """A header row with TANGGAL and at least one DD/MM date below it."""
+    return _dated_rows(df) > 0
+
+
+# Camelot's BCA table: TANGGAL, Col_1 (Keterangan Utama), KETERANGAN, CBG, MUTASI, Col_5 (Type), SALDO
+OCR_COLUMNS = ['TANGGAL', None, 'KETERANGAN', 'CBG', 'MUTASI', None, 'SALDO']
+TRANSACTION_TYPES = ('DB', 'CR')
+
+
+def _ocr_table(words):
+    """Lay OCR words out like camelot's BCA table so ``_normalise_bca_table`` can read them.
+
+    Column boundaries sit halfway between the header words found on the
+    page; each word goes to the column its centre falls in. A trailing
+    DB/CR on the amount becomes the Type column. Returns None without a
+    recognisable header line.
+    """
+    import pandas as pd
+
+    lines = {}
+    for word in words:
+        lines.setdefault(word.line, []).append(word)
+    ordered = sorted(lines.values(), key=lambda line: min(word.top for word in line))
+
+    header_index, anchors = -1, []
+    for index, line in enumerate(ordered):
+        found = {}
+        for word in sorted(line, key=lambda word: word.left):
+            standard = KEYWORD_TO_STANDARD_COL.get(word.text.upper().strip(':.'))
+            if standard and standard not in found:
+                found[standard] = word
+        if 'TANGGAL' in found and len(found) >= 3:
+            header_index = index
+            anchors = sorted(found.items(), key=lambda item: item[1].left)
+            break
+    if header_index == -1:
+        return None
+
+    # boundary i separates anchor i from anchor i + 1
+    boundaries = [
+        (left_word.left + left_word.width + right_word.left) / 2
+        for (_, left_word), (_, right_word) in zip(anchors, anchors[1:])
+    ]
+    rows = [[name or '' for name in OCR_COLUMNS]]
+    for line in ordered[header_index + 1:]:
+        cells = {}
+        for word in sorted(line, key=lambda word: word.left):
+            centre = word.left + word.width / 2
+            column = anchors[sum(centre > boundary for boundary in boundaries)][0]
+            cells[column] = f"{cells[column]} {word.text}" if column in cells else word.text
+        amount = cells.get('MUTASI', '').split()
+        transaction_type = ''
+        if amount and amount[-1].upper() in TRANSACTION_TYPES:
+            transaction_type = amount.pop().upper()
+        cells['MUTASI'] = ' '.join(amount)
+        rows.append([
+            cells.get(name, '') if name else (transaction_type if position == 5 else '')
+            for position, name in enumerate(OCR_COLUMNS)
+        ])
+    return pd.DataFrame(rows)
+
+
+def _covers_pages(tables, pages, expected_rows=None) -> bool:
+    """Whether a template's tables hold every dated row the pre-pass saw on each page.
+
+    The template fixes camelot's table area, so rows of a longer table
+    outside it are silently dropped: any page with fewer dated rows than
+    ``expected_rows`` counted in its text means the layout moved. Without
+    counts every page must yield at least one dated row.
+    """
+    found = {}
+    for table in tables:
+        found[int(table.page)] = found.get(int(table.page), 0) + _dated_rows(table.df)
+    if expected_rows is None:
+        return all(found.get(page, 0) >= 1 for page in pages or [])
+    return all(found.get(page, 0) >= expected_rows.get(page, 0) for page in pages or [])
+
+
+def string_dtype():
+    """Arrow-backed strings when pyarrow is installed, pandas' own string dtype otherwise.
+
+    Either stores a column as one buffer plus offsets instead of a Python
+    ``str`` object per cell, and both use ``pd.NA`` for empty cells.
+    """
+    import pandas as pd
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return pd.StringDtype()
+    return pd.StringDtype("pyarrow")
+
+
+def _normalise_bca_table(df):
+    """Name the columns of a raw camelot table and keep its transaction rows.
+
+    ``df`` is only read. Rows and columns are chosen on the raw cells and
+    the selection is converted to ``string_dtype()`` in one step, so each
+    table is copied once.
+    """
+    import pandas as pd
+
+    if df.shape[0] == 0:
+        return None
+
+    col_idx_to_standard_name, header_row_candidate_idx = _find_header(df)
+    names = [col_idx_to_standard_name.get(j, f'Col_{j}') for j in range(df.shape[1])]
+    body = df.iloc[header_row_candidate_idx + 1:] if header_row_candidate_idx != -1 else df
+
+    # Unnamed columns without any text are camelot's padding; Col_6 is never exported
+    columns = [
+        j for j, name in enumerate(names)
+        if name != 'Col_6' and (not name.startswith('Col_') or body.iloc[:, j].astype(str).str.strip().ne('').any())
+    ]
+    standard = [j for j in columns if names[j] in COLUMN_KEYWORDS]
+    rows = body.iloc[:, standard].ne('').any(axis=1) if standard else pd.Series(False, index=body.index)
+    if 'TANGGAL' in col_idx_to_standard_name.values():
+        dates = body.iloc[:, names.index('TANGGAL')].astype(str)
+        rows &= ~dates.str.contains(r'^(?:SALDO AWAL|HALAMAN|Bersambung)', na=False, regex=True)
+
+    dtype = string_dtype()
+    df = body.iloc[rows.to_numpy(), columns].astype(dtype)
+    df.columns = [RENAME_MAP.get(names[j], names[j]) for j in columns]
+    df.replace('', pd.NA, inplace=True)
+    for col in COLUMN_KEYWORDS.keys():
+        if RENAME_MAP[col] not in df.columns:
+            df[RENAME_MAP[col]] = pd.Series(pd.NA, index=df.index, dtype=dtype)
+    return df
+
+DATE_COLUMN = 'Tanggal Transaksi'
+DESCRIPTION_COLUMN = 'Keterangan Tambahan'
+PAGE_COLUMN = 'Halaman'
+# Columns never carried over from a continuation row into the description
+AMOUNT_COLUMNS = ('CBG', 'Mutasi', 'Type', 'Saldo')
+
+
+class TransactionRowMerger:
+    """Folds continuation rows (no TANGGAL) into the transaction above them.
+
+    camelot emits each wrapped description line, e.g. "JULEHA" or
+    "0312/FTSCY/WS95011", as its own row with an empty date. Tables are fed in
+    page order; the last transaction of each table is held back until the
+    next table shows whether it continues, so a transaction split across a
+    page break is merged too. Each row is visited once.
+    """
+
+    def __init__(self):
+        self._pending = None
+        self.continuation_rows = 0
+
+    def feed(self, df):
+        import pandas as pd
+
+        if self._pending is not None:
+            df = pd.concat([self._pending, df], ignore_index=True)
+        else:
+            df = df.reset_index(drop=True)
+        self._pending = None
+        if df.empty:
+            return df
+
+        starts = df[DATE_COLUMN].notna()
+        if not starts.any():
+            # No transaction to attach to yet, e.g. text above the first dated row
+            return df
+
+        group = starts.cumsum()
+        orphans = df[group == 0]
+        last_start = group.iloc[-1]
+        self._pending = df[group == last_start]
+        body = df[(group > 0) & (group < last_start)]
+        merged = self._merge(body, group[body.index]) if not body.empty else body
+        return pd.concat([orphans, merged], ignore_index=True)
+
+    def flush(self):
+        import pandas as pd
+
+        if self._pending is None:
+            return pd.DataFrame()
+        pending, self._pending = self._pending, None
+        group = pending[DATE_COLUMN].notna().cumsum()
+        return self._merge(pending, group)
+
+    def _merge(self, df, group):
+        import pandas as pd
+
+        starts = df[DATE_COLUMN].notna()
+        self.continuation_rows += int((~starts).sum())
+        if starts.all():
+            return df.reset_index(drop=True)
+
+        dtype = string_dtype()
+        text_columns = [col for col in df.columns if col not in (DATE_COLUMN, PAGE_COLUMN) and col not in AMOUNT_COLUMNS]
+        continuation_text = pd.Series('', index=df.index, dtype=dtype)
+        for col in text_columns:
+            continuation_text = continuation_text + ' ' + df[col].astype(dtype).fillna('')
+        continuation_text = continuation_text.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+        description = df[DESCRIPTION_COLUMN].astype(dtype).where(starts, continuation_text)
+        description = description[description.fillna('').ne('')]
+        joined = description.groupby(group[description.index], sort=False).agg(' '.join).astype(dtype)
+
+        # Transaction rows keep their own text columns; amounts missing on the
+        # first line are taken from the first continuation row that has them
+        merged = df[starts].set_index(group[starts])
+        amount_columns = [col for col in AMOUNT_COLUMNS if col in df.columns]
+        if amount_columns:
+            merged[amount_columns] = df[amount_columns].groupby(group, sort=False).first()
+        merged[DESCRIPTION_COLUMN] = joined.reindex(merged.index)
+        return merged.reset_index(drop=True)
+
+
+def _amount_cents(series):
+    """Amounts such as "1,234.50" as fixed-point Int64 cents; cells that are not numbers become NA."""
+    import pandas as pd
+    amount = pd.to_numeric(series.astype(string_dtype()).str.replace(',', '', regex=False), errors='coerce')
+    return (amount * 100).round().astype('Int64')
+
+
+def _parse_amount(series):
+    return _amount_cents(series) / 100
+
+
+def _text_column(df, name):
+    """Stripped text of column ``name``, or all NA when camelot did not find it, e.g. on sparse pages."""
+    import pandas as pd
+
+    if name in df.columns:
+        return df[name].astype(string_dtype()).str.strip()
+    return pd.Series(pd.NA, index=df.index, dtype=string_dtype())
+
+
+def transaction_records(merged_df, period: Optional[tuple] = None) -> List[dict]:
+    """Merged rows in the compact form persisted for transaction search.
+
+    Dates on the statement are "DD/MM"; the year comes from the statement
+    ``period`` and rows dated after the period month belong to the year before.
+    """
+    import pandas as pd
+
+    main, extra = _text_column(merged_df, 'Keterangan Utama'), _text_column(merged_df, DESCRIPTION_COLUMN)
+    description = (main.fillna('') + ' ' + extra.fillna('')).str.strip()
+    amount = _parse_amount(_text_column(merged_df, 'Mutasi'))
+    direction = _text_column(merged_df, 'Type').str.upper()
+    direction = direction.where(direction.eq('DB'), 'CR').where(amount.notna())
+    day_month = _text_column(merged_df, DATE_COLUMN).str.extract(r'^(\d{2})/(\d{2})').astype('Int64')
+
+    posted_on = pd.Series(None, index=merged_df.index, dtype=object)
+    if period is not None:
+        year, month = period
+        years = (year - (day_month[1] > month).astype('Int64')).fillna(year)
+        posted_on = pd.to_datetime(
+            pd.DataFrame({'year': years, 'month': day_month[1], 'day': day_month[0]}), errors='coerce'
+        ).dt.date.astype(object)
+
+    frame = pd.DataFrame({
+        'posted_on': posted_on,
+        'description': description,
+        'branch': _text_column(merged_df, 'CBG').str.slice(0, 8),
+        'amount': amount,
+        'direction': direction,
+        'balance': _parse_amount(_text_column(merged_df, 'Saldo')),
+        'page': merged_df[PAGE_COLUMN],
+    })
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
+
+
+def summarise_transactions(merged_df):
+    """Daily, monthly and overall aggregates from one groupby pass over the transactions.
+
+    Only the per-day groupby touches every row; the monthly and overall
+    figures are folded from the (at most a few hundred) daily rows. Sums
+    are taken in integer cents and converted to currency units at the end.
+    """
+    import pandas as pd
+
+    amount = _amount_cents(_text_column(merged_df, 'Mutasi'))
+    # Rows without an amount, such as SALDO AWAL, count towards neither side
+    has_amount = amount.notna()
+    amount = amount.fillna(0)
+    is_debit = _text_column(merged_df, 'Type').str.upper().eq('DB').fillna(False)
+    is_credit = has_amount & ~is_debit
+    frame = pd.DataFrame({
+        'date': _text_column(merged_df, DATE_COLUMN),
+        'credit': amount.where(is_credit, 0),
+        'debit': amount.where(is_debit, 0),
+        'has_amount': has_amount.astype('int64'),
+        'credit_count': is_credit.astype('int64'),
+        'debit_count': (has_amount & is_debit).astype('int64'),
+        'balance': _amount_cents(_text_column(merged_df, 'Saldo')),
+    })
+
+    daily = frame.groupby('date', sort=False).agg(
+        transactions=('has_amount', 'sum'),
+        credit_count=('credit_count', 'sum'),
+        debit_count=('debit_count', 'sum'),
+        credit=('credit', 'sum'),
+        debit=('debit', 'sum'),
+        closing_balance=('balance', 'last'),
+    )
+    daily['net'] = daily['credit'] - daily['debit']
+
+    month = daily.index.str.slice(3, 5)
+    monthly = daily.groupby(month, sort=False).agg(
+        transactions=('transactions', 'sum'),
+        credit_count=('credit_count', 'sum'),
+        debit_count=('debit_count', 'sum'),
+        credit=('credit', 'sum'),
+        debit=('debit', 'sum'),
+        net=('net', 'sum'),
+        closing_balance=('closing_balance', 'last'),
+    )
+
+    balances = daily['closing_balance'].dropna()
+    totals = {
+        'Opening balance': int(balances.iloc[0] - daily.loc[balances.index[0], 'net']) / 100 if len(balances) else None,
+        'Transactions': int(daily['transactions'].sum()),
+        'Credit transactions (CR)': int(daily['credit_count'].sum()),
+        'Debit transactions (DB)': int(daily['debit_count'].sum()),
+        'Total in': int(daily['credit'].sum()) / 100,
+        'Total out': int(daily['debit'].sum()) / 100,
+        'Net': int(daily['net'].sum()) / 100,
+        'Closing balance': int(balances.iloc[-1]) / 100 if len(balances) else None,
+    }
+    money = ['credit', 'debit', 'net', 'closing_balance']
+    daily[money] = daily[money] / 100
+    monthly[money] = monthly[money] / 100
+    return totals, daily, monthly
+
+
+def _write_frame(workbook, name: str, header, rows, formats=None):
+    worksheet = workbook.add_worksheet(name)
+    worksheet.write_row(0, 0, header)
+    formats = formats or {}
+    for row_idx, row in enumerate(rows, start=1):
+        for col_idx, value in enumerate(row):
+            if value is not None:
+                worksheet.write(row_idx, col_idx, value, formats.get(col_idx))
+    return worksheet
+
+
+def write_summary_workbook(merged_df, output):
+    """Write Transactions, Summary, Daily, Monthly and one sheet per statement page.
+
+    xlsxwriter's constant_memory mode flushes each row as it is written, so
+    memory stays flat however long the statement is; it requires every
+    sheet to be written top to bottom, which is how the rows are produced.
+    """
+    import xlsxwriter
+
+    totals, daily, monthly = summarise_transactions(merged_df)
+
+    transactions = merged_df.copy()
+    transactions['Mutasi'] = _parse_amount(transactions['Mutasi'])
+    transactions['Saldo'] = _parse_amount(transactions['Saldo'])
+    transactions = transactions.astype(object).where(transactions.notna(), None)
+    columns = list(transactions.columns)
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    money = workbook.add_format({'num_format': '#,##0.00'})
+    transaction_formats = {columns.index('Mutasi'): money, columns.index('Saldo'): money}
+
+    _write_frame(workbook, 'Transactions', columns, transactions.itertuples(index=False), transaction_formats)
+
+    summary = workbook.add_worksheet('Summary')
+    summary.write_row(0, 0, ['Item', 'Value'])
+    for row_idx, (label, value) in enumerate(totals.items(), start=1):
+        summary.write(row_idx, 0, label)
+        if value is not None:
+            summary.write(row_idx, 1, value, money if isinstance(value, float) else None)
+
+    aggregate_header = ['Transactions', 'CR count', 'DB count', 'Total in', 'Total out', 'Closing balance', 'Net']
+    aggregate_formats = {4: money, 5: money, 6: money, 7: money}
+    daily_rows = daily.astype(object).where(daily.notna(), None).itertuples()
+    _write_frame(workbook, 'Daily', ['Tanggal'] + aggregate_header, daily_rows, aggregate_formats)
+    monthly = monthly[['transactions', 'credit_count', 'debit_count', 'credit', 'debit', 'closing_balance', 'net']]
+    monthly_rows = monthly.astype(object).where(monthly.notna(), None).itertuples()
+    _write_frame(workbook, 'Monthly', ['Bulan'] + aggregate_header, monthly_rows, aggregate_formats)
+
+    page_columns = [col for col in columns if col != PAGE_COLUMN]
+    page_formats = {page_columns.index('Mutasi'): money, page_columns.index('Saldo'): money}
+    for page, rows in transactions.groupby(PAGE_COLUMN, sort=True):
+        _write_frame(workbook, f'Page {page}', page_columns, rows[page_columns].itertuples(index=False), page_formats)
+
+    workbook.close()
+
 
 # base export function BCA
 # def extract_bca_transactions(pdf_path: str, bank_type: str, export_type: str) -> BytesIO:
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import os
+from typing import List, Optional, Sequence
+
+from app.utils.config import settings
+from app.utils.page_cache import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Bump when the learning rule changes so templates learned by an older version are ignored
+LAYOUT_TEMPLATE_VERSION = "1"
+# Points added around the learned table area so small shifts between statements still fit
+AREA_PADDING = 2.0
+
+
+class LayoutTemplate:
+    """Column separators and table area for one bank layout, in PDF points.
+
+    ``area`` is ``(left, top, right, bottom)``, the order camelot's
+    ``table_areas`` expects.
+    """
+
+    def __init__(self, columns: List[float], area: Sequence[float]):
+        self.columns = list(columns)
+        self.area = tuple(area)
+
+    def camelot_options(self) -> dict:
+        return {
+            "table_areas": [",".join(f"{value:.2f}" for value in self.area)],
+            "columns": [",".join(f"{value:.2f}" for value in self.columns)],
+        }
+
+    def to_dict(self) -> dict:
+        return {"columns": self.columns, "area": list(self.area)}
+
+
+def layout_signature(header_columns: Sequence[str], width: float, height: float) -> str:
+    """Page size plus the order of the header columns, e.g. ``"595x842|TANGGAL-KETERANGAN-CBG-MUTASI-SALDO"``."""
+    return f"{round(width)}x{round(height)}|{'-'.join(header_columns)}"
+
+
+def template_key(bank, signature: str) -> str:
+    # str-valued enums such as BankType key by their value, not "BankType.bca"
+    bank = getattr(bank, "value", bank)
+    return hashlib.sha256(f"{LAYOUT_TEMPLATE_VERSION}|{bank}|{signature}".encode("utf-8")).hexdigest()[:32]
+
+
+def learn_template(tables) -> Optional[LayoutTemplate]:
+    """Derive a template from camelot stream tables whose header row was recognised.
+
+    The column count of the largest table wins; its column boundaries become
+    the separators and the table area is the union of all tables with that
+    count. Returns None when the tables disagree too much to learn from.
+    """
+    if not tables:
+        return None
+    reference = max(tables, key=lambda table: table.df.shape[0])
+    column_count = len(reference.cols)
+    if column_count < 3:
+        return None
+    matching = [table for table in tables if len(table.cols) == column_count]
+    separators = [right for _, right in reference.cols[:-1]]
+    # camelot's _bbox is (left, bottom, right, top)
+    left = min(table._bbox[0] for table in matching) - AREA_PADDING
+    bottom = min(table._bbox[1] for table in matching) - AREA_PADDING
+    right = max(table._bbox[2] for table in matching) + AREA_PADDING
+    top = max(table._bbox[3] for table in matching) + AREA_PADDING
+    return LayoutTemplate(separators, (max(left, 0.0), top, right, max(bottom, 0.0)))
+
+
+def _template_path(key: str) -> str:
+    return os.path.join(settings.CACHE_DIR, "layouts", key + ".json")
+
+
+def load_template(key: str) -> Optional[LayoutTemplate]:
+    try:
+        with open(_template_path(key)) as file:
+            payload = json.load(file)
+        return LayoutTemplate(payload["columns"], payload["area"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Ignoring unreadable layout template %s: %s", key, e)
+        return None
+
+
+def store_template(key: str, template: LayoutTemplate):
+    payload = template.to_dict()
+    write_atomic(_template_path(key), lambda file: json.dump(payload, file))
+
+
+def discard_template(key: str):
+    try:
+        os.remove(_template_path(key))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,223 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMEstimate:
+    """Pre-flight size of one LLM conversion.
+
+    ``prompt_tokens`` is counted with the provider's tokenizer on the exact
+    prompt that would be sent; the completion is bounded by
+    ``LLM_MAX_OUTPUT_TOKENS``, so ``total_tokens`` and ``cost`` are upper bounds.
+    """
+
+    def __init__(self, provider: str, prompt_tokens: int, max_completion_tokens: int, cost: float,
+                 input_chars: int, truncated: bool):
+        self.provider = provider
+        self.prompt_tokens = prompt_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.cost = cost
+        self.input_chars = input_chars
+        self.truncated = truncated
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.max_completion_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            "provider": self.provider,
+            "prompt_tokens": self.prompt_tokens,
+            "max_completion_tokens": self.max_completion_tokens,
+            "total_tokens": self.total_tokens,
+            "max_cost_usd": round(self.cost, 6),
+            "input_chars": self.input_chars,
+            "truncated": self.truncated,
+        }
+
+
+def request_budget_errors(estimate: LLMEstimate) -> List[str]:
+    """Reasons the estimate exceeds the per-request limits; empty when it fits."""
+    errors = []
+    if settings.LLM_MAX_TOKENS_PER_REQUEST and estimate.total_tokens > settings.LLM_MAX_TOKENS_PER_REQUEST:
+        errors.append(
+            f"estimated {estimate.total_tokens} tokens exceeds the per-request limit of "
+            f"{settings.LLM_MAX_TOKENS_PER_REQUEST}"
+        )
+    if settings.LLM_MAX_COST_PER_REQUEST_USD and estimate.cost > settings.LLM_MAX_COST_PER_REQUEST_USD:
+        errors.append(
+            f"estimated cost ${estimate.cost:.4f} exceeds the per-request limit of "
+            f"${settings.LLM_MAX_COST_PER_REQUEST_USD:.4f}"
+        )
+    return errors
+
+
+def check_request_budget(estimate: LLMEstimate):
+    errors = request_budget_errors(estimate)
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Statement too large for the LLM conversion: {'; '.join(errors)}",
+        )
+
+
+def _day_key(user_id, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    return f"{now:%Y-%m-%d}:{user_id}"
+
+
+def _seconds_until_reset(now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(int((tomorrow - now).total_seconds()), 1)
+
+
+class InMemoryUsageStore:
+    """Per-user daily LLM usage kept in this process; enough for a single worker and for tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage: Dict[str, Tuple[float, float]] = {}
+
+    def add(self, key: str, tokens: float, cost: float, token_limit: float = 0,
+            cost_limit: float = 0) -> Tuple[bool, float, float]:
+        """Add usage unless it would pass a non-zero limit; return ``(added, tokens used, cost used)`` before it."""
+        with self._lock:
+            day = key.partition(":")[0]
+            # Keys start with their UTC day (ISO dates sort by time); earlier days' totals are dropped
+            for stale in [other for other in self._usage if other.partition(":")[0] < day]:
+                del self._usage[stale]
+            used_tokens, used_cost = self._usage.get(key, (0.0, 0.0))
+            if (token_limit and used_tokens + tokens > token_limit) or (cost_limit and used_cost + cost > cost_limit):
+                return False, used_tokens, used_cost
+            self._usage[key] = (used_tokens + tokens, used_cost + cost)
+            return True, used_tokens, used_cost
+
+    def get(self, key: str) -> Tuple[float, float]:
+        with self._lock:
+            return self._usage.get(key, (0.0, 0.0))
+
+
+# KEYS[1] usage hash; ARGV: tokens, cost, token limit, cost limit, ttl. Returns {added, tokens, cost}.
+_REDIS_ADD = """
+local used_tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or '0')
+local used_cost = tonumber(redis.call('HGET', KEYS[1], 'cost') or '0')
+local tokens = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local token_limit = tonumber(ARGV[3])
+local cost_limit = tonumber(ARGV[4])
+if (token_limit > 0 and used_tokens + tokens > token_limit) or (cost_limit > 0 and used_cost + cost > cost_limit) then
+    return {0, tostring(used_tokens), tostring(used_cost)}
+end
+redis.call('HINCRBYFLOAT', KEYS[1], 'tokens', tokens)
+redis.call('HINCRBYFLOAT', KEYS[1], 'cost', cost)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return {1, tostring(used_tokens), tostring(used_cost)}
+"""
+
+
+class RedisUsageStore:
+    """Per-user daily LLM usage shared by every worker, checked and added atomically by a Lua script."""
+
+    def __init__(self, url: str, prefix: str = "llm_usage:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._add = self._client.register_script(_REDIS_ADD)
+        self._prefix = prefix
+
+    def add(self, key: str, tokens: float, cost: float, token_limit: float = 0,
+            cost_limit: float = 0) -> Tuple[bool, float, float]:
+        # Two days covers the rest of the current UTC day wherever the key was created
+        added, used_tokens, used_cost = self._add(
+            keys=[self._prefix + key], args=[tokens, cost, token_limit, cost_limit, 2 * 86400]
+        )
+        return bool(added), float(used_tokens), float(used_cost)
+
+    def get(self, key: str) -> Tuple[float, float]:
+        tokens, cost = self._client.hmget(self._prefix + key, "tokens", "cost")
+        return float(tokens or 0), float(cost or 0)
+
+
+class UsageReservation:
+    """An estimate charged against a user's daily budget until the actual usage is known."""
+
+    def __init__(self, store, key: str, tokens: int, cost: float):
+        self._store = store
+        self._key = key
+        self._tokens = tokens
+        self._cost = cost
+
+    def settle(self, tokens: int, cost: float):
+        """Replace the reserved estimate with the usage the provider reported."""
+        self._store.add(self._key, tokens - self._tokens, cost - self._cost)
+        self._tokens, self._cost = tokens, cost
+
+    def release(self):
+        self.settle(0, 0.0)
+
+
+class LLMBudget:
+    """Daily per-user token and cost limits for the LLM path (0 disables a limit)."""
+
+    def __init__(self, store, daily_tokens: int, daily_cost: float):
+        self.store = store
+        self.daily_tokens = daily_tokens
+        self.daily_cost = daily_cost
+
+    def status(self, user_id, estimate: Optional[LLMEstimate] = None) -> dict:
+        used_tokens, used_cost = self.store.get(_day_key(user_id))
+        result = {
+            "daily_tokens_used": int(used_tokens),
+            "daily_tokens_limit": self.daily_tokens or None,
+            "daily_cost_used_usd": round(used_cost, 6),
+            "daily_cost_limit_usd": self.daily_cost or None,
+        }
+        if estimate is not None:
+            result["within_daily_budget"] = not (
+                (self.daily_tokens and used_tokens + estimate.total_tokens > self.daily_tokens)
+                or (self.daily_cost and used_cost + estimate.cost > self.daily_cost)
+            )
+        return result
+
+    def reserve(self, user_id, estimate: LLMEstimate) -> UsageReservation:
+        """Charge the estimate to today's usage, or answer 429 when it does not fit."""
+        key = _day_key(user_id)
+        added, used_tokens, used_cost = self.store.add(
+            key, estimate.total_tokens, estimate.cost, self.daily_tokens, self.daily_cost
+        )
+        if not added:
+            logger.warning(
+                "LLM budget exhausted for user %s: %d tokens / $%.4f used today, %d tokens / $%.4f requested",
+                user_id, used_tokens, used_cost, estimate.total_tokens, estimate.cost,
+            )
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Your daily LLM conversion budget is used up",
+                headers={"Retry-After": str(_seconds_until_reset())},
+            )
+        return UsageReservation(self.store, key, estimate.total_tokens, estimate.cost)
+
+
+_budget: Optional[LLMBudget] = None
+
+
+def get_budget() -> LLMBudget:
+    global _budget
+    if _budget is None:
+        store = RedisUsageStore(settings.LLM_BUDGET_REDIS_URL) if settings.LLM_BUDGET_REDIS_URL else InMemoryUsageStore()
+        _budget = LLMBudget(store, settings.LLM_USER_DAILY_TOKENS, settings.LLM_USER_DAILY_COST_USD)
+    return _budget
+
+
+def set_budget(budget: Optional[LLMBudget]):
+    """Swap the budget, e.g. for one over an ``InMemoryUsageStore`` in tests; None re-reads the settings."""
+    global _budget
+    _budget = budget
@@ -0,0 +1,260 @@
+import logging
+import math
+import re
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Several documents sent in one request are delimited, and answered, with this line
+DOCUMENT_MARKER = "### DOCUMENT {index}"
+_DOCUMENT_LINE = re.compile(r'^### DOCUMENT (\d+)[ \t]*$', re.MULTILINE)
+
+
+class LLMResponse:
+    """Text of one completion plus the usage the provider reported for it."""
+
+    def __init__(self, text: str, prompt_tokens: int, completion_tokens: int, cost: float, elapsed: float):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cost = cost
+        self.elapsed = elapsed
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class LLMProvider:
+    """One completion backend. Subclasses implement ``_complete`` and set their prices.
+
+    Prices are USD per 1000 tokens; ``LLM_PRICES`` overrides the class defaults.
+    """
+
+    name = ""
+    prompt_price_per_1k = 0.0
+    completion_price_per_1k = 0.0
+    # Fallback tokenizer: roughly four characters per token for Latin-script text
+    chars_per_token = 4.0
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens ``text`` takes in a prompt; providers with a local tokenizer override this."""
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def count_prompt_tokens(self, system_prompt: str, user_prompt: str) -> int:
+        return self.count_tokens(system_prompt + user_prompt)
+
+    def complete(self, system_prompt: str, user_prompt: str, stop: Optional[List[str]] = None,
+                 max_tokens: Optional[int] = None) -> LLMResponse:
+        start = time.perf_counter()
+        text, prompt_tokens, completion_tokens = self._complete(
+            system_prompt, user_prompt, stop, max_tokens or settings.LLM_MAX_OUTPUT_TOKENS
+        )
+        return LLMResponse(text, prompt_tokens, completion_tokens, self.cost(prompt_tokens, completion_tokens),
+                           time.perf_counter() - start)
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return prompt_tokens / 1000 * self.prompt_price_per_1k + completion_tokens / 1000 * self.completion_price_per_1k
+
+    def _complete(self, system_prompt: str, user_prompt: str, stop: Optional[List[str]], max_tokens: int):
+        """Return ``(text, prompt_tokens, completion_tokens)``."""
+        raise NotImplementedError
+
+
+PROVIDERS: Dict[str, Type[LLMProvider]] = {}
+
+
+def register_provider(name: str) -> Callable[[Type[LLMProvider]], Type[LLMProvider]]:
+    def register(cls):
+        cls.name = name
+        PROVIDERS[name] = cls
+        return cls
+    return register
+
+
+@register_provider("openai")
+class OpenAIProvider(LLMProvider):
+    prompt_price_per_1k = 0.01
+    completion_price_per_1k = 0.03
+
+    def __init__(self):
+        import openai
+
+        # One client per process so its HTTP connections are reused across conversions
+        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY or None)
+        self.model = settings.OPENAI_MODEL
+        self._encoding = None
+
+    def count_tokens(self, text: str) -> int:
+        # tiktoken is optional; without it the character estimate is used
+        if self._encoding is None:
+            try:
+                import tiktoken
+            except ImportError:
+                return super().count_tokens(text)
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        return len(self._encoding.encode(text))
+
+    def count_prompt_tokens(self, system_prompt: str, user_prompt: str) -> int:
+        # Chat formatting adds about 3 tokens per message plus 3 priming the reply
+        return self.count_tokens(system_prompt) + self.count_tokens(user_prompt) + 2 * 3 + 3
+
+    def _complete(self, system_prompt, user_prompt, stop, max_tokens):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0.2,
+            max_tokens=max_tokens,
+            top_p=1,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=stop,
+        )
+        usage = response.usage
+        return (
+            response.choices[0].message.content or "",
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+
+@register_provider("gemini")
+class GeminiProvider(LLMProvider):
+    prompt_price_per_1k = 0.000075
+    completion_price_per_1k = 0.0003
+
+    def __init__(self):
+        import google.generativeai as genai
+
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._genai = genai
+        self._models = {}
+
+    def _model(self, system_prompt: str):
+        # The system instruction is fixed per GenerativeModel; there are only a couple of prompts
+        if system_prompt not in self._models:
+            self._models[system_prompt] = self._genai.GenerativeModel(
+                settings.GEMINI_MODEL, system_instruction=system_prompt
+            )
+        return self._models[system_prompt]
+
+    def _complete(self, system_prompt, user_prompt, stop, max_tokens):
+        response = self._model(system_prompt).generate_content(
+            user_prompt,
+            generation_config={
+                "temperature": 0.2,
+                "top_p": 1,
+                "max_output_tokens": max_tokens,
+                "stop_sequences": stop or [],
+            },
+        )
+        usage = response.usage_metadata
+        return (
+            response.text,
+            usage.prompt_token_count if usage else 0,
+            usage.candidates_token_count if usage else 0,
+        )
+
+
+_AMOUNT = re.compile(r'^\d{1,3}(?:,\d{3})*\.\d{2}$')
+_DATE = re.compile(r'^\d{2}/\d{2}$')
+
+
+@register_provider("stub")
+class StubProvider(LLMProvider):
+    """Deterministic local provider for tests and benchmarks; no network, no cost.
+
+    Every line starting with a DD/MM date becomes a CSV row: the amounts on
+    it are the mutation and the balance, a ``DB`` token marks money going
+    out and the other words are the description. Usage is counted with the
+    character estimate, so pre-flight estimates match it exactly.
+    """
+
+    HEADER = "Tanggal Transaksi,Keterangan Utama,Keterangan Tambahan,Uang Masuk IDR,Uang Keluar IDR,Saldo"
+
+    def _complete(self, system_prompt, user_prompt, stop, max_tokens):
+        documents = split_documents(user_prompt)
+        if documents:
+            text = "\n".join(
+                f"{DOCUMENT_MARKER.format(index=index)}\n{self._csv(document)}"
+                for index, document in sorted(documents.items())
+            )
+        else:
+            text = self._csv(user_prompt)
+        return text, self.count_tokens(system_prompt + user_prompt), self.count_tokens(text)
+
+    def _csv(self, text: str) -> str:
+        rows = [self.HEADER]
+        for line in text.splitlines():
+            words = line.split()
+            if not words or not _DATE.match(words[0]):
+                continue
+            amounts = [word for word in words[1:] if _AMOUNT.match(word)]
+            description = [word for word in words[1:] if not _AMOUNT.match(word) and word != "DB"]
+            amount = amounts[0].replace(",", "") if amounts else ""
+            balance = amounts[-1].replace(",", "") if len(amounts) > 1 else ""
+            money_in, money_out = ("", amount) if "DB" in words[1:] else (amount, "")
+            main = " ".join(description[:3])
+            extra = " ".join(description[3:])
+            rows.append(",".join([words[0], main, extra, money_in, money_out, balance]))
+        return "\n".join(rows)
+
+
+def join_documents(texts: Sequence[str]) -> str:
+    """Concatenate ``texts`` for one request, each introduced by its ``DOCUMENT_MARKER`` line."""
+    return "\n\n".join(f"{DOCUMENT_MARKER.format(index=index)}\n{text}" for index, text in enumerate(texts, start=1))
+
+
+def split_documents(text: str) -> Dict[int, str]:
+    """Sections of a batched prompt or response by document number; empty when there are no markers."""
+    matches = list(_DOCUMENT_LINE.finditer(text))
+    documents = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following is not None else len(text)
+        documents[int(match.group(1))] = text[match.end():end].strip()
+    return documents
+
+
+def provider_prices() -> Dict[str, Tuple[float, float]]:
+    # LLM_PRICES looks like "openai=0.01/0.03,gemini=0.000075/0.0003" (USD per 1000 prompt/completion tokens)
+    prices = {}
+    for item in settings.LLM_PRICES.split(","):
+        name, _, price = item.strip().partition("=")
+        if name and price:
+            prompt, _, completion = price.partition("/")
+            prices[name.strip()] = (float(prompt), float(completion or prompt))
+    return prices
+
+
+_provider: Optional[LLMProvider] = None
+
+
+def get_provider() -> LLMProvider:
+    """The provider named by ``LLM_PROVIDER``, created on first use and kept for the process."""
+    global _provider
+    if _provider is None:
+        if settings.LLM_PROVIDER not in PROVIDERS:
+            raise ValueError(
+                f"Unknown LLM_PROVIDER {settings.LLM_PROVIDER!r}; expected one of {', '.join(sorted(PROVIDERS))}"
+            )
+        _provider = PROVIDERS[settings.LLM_PROVIDER]()
+        prices = provider_prices().get(settings.LLM_PROVIDER)
+        if prices is not None:
+            _provider.prompt_price_per_1k, _provider.completion_price_per_1k = prices
+        logger.info("Using LLM provider %s", settings.LLM_PROVIDER)
+    return _provider
+
+
+def set_provider(provider: Optional[LLMProvider]):
+    """Swap the provider, e.g. for a ``StubProvider`` in tests; None re-reads the settings."""
+    global _provider
+    _provider = provider
@@ -0,0 +1,335 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+from app.utils.config import settings
+from app.utils.progress import stage_started
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+ROW_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+BYTE_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000, 100_000_000)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+COST_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+RATIO_BUCKETS = (0.5, 0.75, 0.9, 0.95, 1.0, 1.05, 1.1, 1.25, 1.5, 2.0)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram kept in process memory."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(_label_value(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def merge(self, series_by_key):
+        with self._lock:
+            for key, series in series_by_key.items():
+                current = self._series.get(key)
+                if current is None:
+                    self._series[key] = list(series)
+                else:
+                    self._series[key] = [a + b for a, b in zip(current, series)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.snapshot().items()):
+            label_pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for upper, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if upper == float("inf") else repr(float(upper))
+                bucket_labels = ",".join(label_pairs + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(label_pairs)}}}" if label_pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic Prometheus-style counter; series are one-element lists so snapshots diff like histograms."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(_label_value(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0])
+            series[0] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def merge(self, series_by_key):
+        with self._lock:
+            for key, series in series_by_key.items():
+                self._series.setdefault(key, [0])[0] += series[0]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, series in sorted(self.snapshot().items()):
+            label_pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+            lines.append(f"{self.name}{{{label_pairs}}} {series[0]}" if label_pairs else f"{self.name} {series[0]}")
+        return lines
+
+
+def _label_value(label) -> str:
+    # str-valued enums such as BankType render as their value, not "BankType.bca"
+    return str(getattr(label, "value", label))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = []
+
+
+def histogram(name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+    metric = Histogram(name, documentation, buckets, labelnames)
+    REGISTRY.append(metric)
+    return metric
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    REGISTRY.append(metric)
+    return metric
+
+
+def snapshot():
+    """Copy every metric's series, e.g. to ship observations made in a worker process."""
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def diff(before, after):
+    delta = {}
+    for name, series_by_key in after.items():
+        previous = before.get(name, {})
+        changed = {}
+        for key, series in series_by_key.items():
+            old = previous.get(key)
+            if old is None:
+                changed[key] = series
+            elif old != series:
+                changed[key] = [new - prior for new, prior in zip(series, old)]
+        if changed:
+            delta[name] = changed
+    return delta
+
+
+def merge(delta):
+    metrics_by_name = {metric.name: metric for metric in REGISTRY}
+    for name, series_by_key in delta.items():
+        metric = metrics_by_name.get(name)
+        if metric is not None:
+            metric.merge(series_by_key)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_LATENCY = histogram(
+    "http_request_duration_seconds", "HTTP request latency", LATENCY_BUCKETS, ("method", "path", "status")
+)
+STAGE_LATENCY = histogram(
+    "conversion_stage_duration_seconds", "Time spent in each conversion stage", LATENCY_BUCKETS, ("stage",)
+)
+CONVERSION_PAGES = histogram("conversion_pages", "Pages per converted statement", PAGE_BUCKETS, ("bank", "export"))
+CONVERSION_PAGES_SKIPPED = histogram(
+    "conversion_pages_skipped", "Pages skipped by the pre-pass before table extraction", PAGE_BUCKETS, ("bank", "export")
+)
+CONVERSION_ROWS = histogram("conversion_rows", "Transaction rows per converted statement", ROW_BUCKETS, ("bank", "export"))
+CONVERSION_BYTES = histogram("conversion_upload_bytes", "Uploaded statement size in bytes", BYTE_BUCKETS, ("bank", "export"))
+LLM_TOKENS = histogram("llm_tokens", "Tokens used per LLM call", TOKEN_BUCKETS, ("provider", "kind"))
+LLM_COST = histogram("llm_cost_usd", "Estimated cost per LLM call in USD", COST_BUCKETS, ("provider",))
+LLM_ESTIMATE_RATIO = histogram(
+    "llm_prompt_estimate_ratio", "Reported over pre-flight estimated prompt tokens per LLM call", RATIO_BUCKETS,
+    ("provider",),
+)
+DB_QUERIES = histogram("db_queries_per_request", "SQL statements executed per HTTP request", QUERY_BUCKETS, ("path",))
+DB_REPEATED_QUERIES = counter(
+    "db_repeated_queries_total", "Requests that ran one statement at least SQL_N_PLUS_ONE_THRESHOLD times", ("path",)
+)
+
+
+class RequestMetrics:
+    """Per-request stage timings and counters, written to the structured request log."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.values: Dict[str, object] = {}
+        # SQL text -> [executions, seconds]; identical text with different parameters is one entry
+        self.queries: Dict[str, list] = {}
+
+    def add_stage(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_query(self, statement: str, seconds: float) -> int:
+        """Count one execution of ``statement`` and return how often it has run in this request."""
+        entry = self.queries.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        return entry[0]
+
+    @property
+    def query_count(self) -> int:
+        return sum(count for count, _ in self.queries.values())
+
+    @property
+    def query_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.queries.values())
+
+    def repeated_queries(self, threshold: int) -> Dict[str, int]:
+        """Statements run at least ``threshold`` times, the usual sign of a lazy load in a loop."""
+        if threshold <= 0:
+            return {}
+        return {statement: count for statement, (count, _) in self.queries.items() if count >= threshold}
+
+
+_current_request: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar(
+    "current_request_metrics", default=None
+)
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current_request.get()
+
+
+@contextmanager
+def capture_request_metrics():
+    """Collect stage timings outside of an HTTP request, e.g. in benchmarks or worker processes."""
+    request_metrics = RequestMetrics()
+    token = _current_request.set(request_metrics)
+    try:
+        yield request_metrics
+    finally:
+        _current_request.reset(token)
+
+
+def record_value(name: str, value):
+    request_metrics = _current_request.get()
+    if request_metrics is not None:
+        request_metrics.values[name] = value
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_LATENCY.observe(seconds, stage=stage)
+    request_metrics = _current_request.get()
+    if request_metrics is not None:
+        request_metrics.add_stage(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    stage_started(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def _route_template(scope) -> str:
+    # Label by route template rather than raw path to keep label cardinality bounded
+    route = scope.get("route")
+    if route is None or not hasattr(route, "path"):
+        return "unmatched"
+    mount_prefix = scope.get("root_path", "")[len(scope.get("app_root_path", "")):]
+    return mount_prefix + route.path
+
+
+def _report_queries(request_metrics: RequestMetrics, method: str, path: str):
+    DB_QUERIES.observe(request_metrics.query_count, path=path)
+    repeated = request_metrics.repeated_queries(settings.SQL_N_PLUS_ONE_THRESHOLD)
+    if repeated:
+        DB_REPEATED_QUERIES.inc(path=path)
+        logger.warning(json.dumps({
+            "event": "repeated_queries",
+            "method": method,
+            "path": path,
+            "db_queries": request_metrics.query_count,
+            "repeated": [{"count": count, "statement": statement} for statement, count in repeated.items()],
+        }))
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request latency and logging the per-stage breakdown."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_metrics = RequestMetrics()
+        token = _current_request.set(request_metrics)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            path = _route_template(scope)
+            REQUEST_LATENCY.observe(elapsed, method=scope["method"], path=path, status=status_code)
+            if request_metrics.queries:
+                _report_queries(request_metrics, scope["method"], path)
+            if request_metrics.stages or request_metrics.values:
+                logger.info(json.dumps({
+                    "event": "request_completed",
+                    "method": scope["method"],
+                    "path": path,
+                    "status": status_code,
+                    "duration_seconds": round(elapsed, 6),
+                    "stages": {stage: round(seconds, 6) for stage, seconds in request_metrics.stages.items()},
+                    "db_queries": request_metrics.query_count,
+                    "db_seconds": round(request_metrics.query_seconds, 6),
+                    **request_metrics.values,
+                }, default=str))
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from app.utils.config import settings
+from app.utils.page_cache import maybe_prune_cache, touch, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rasterisation or OCR options change so older cached text is not reused
+OCR_CACHE_VERSION = "1"
+
+
+class OcrWord(NamedTuple):
+    line: tuple  # (block, paragraph, line) as numbered by Tesseract
+    left: int
+    top: int
+    width: int
+    text: str
+
+
+class OcrPage:
+    """Tesseract's TSV output for one page image: word boxes plus the plain text built from them."""
+
+    def __init__(self, tsv: str):
+        self.tsv = tsv
+        self.words = parse_tsv(tsv)
+
+    @property
+    def text(self) -> str:
+        lines: Dict[tuple, List[str]] = {}
+        for word in self.words:
+            lines.setdefault(word.line, []).append(word.text)
+        return "\n".join(" ".join(words) for words in lines.values())
+
+
+def parse_tsv(tsv: str) -> List[OcrWord]:
+    words = []
+    for row in tsv.splitlines()[1:]:
+        fields = row.split("\t")
+        # level, page, block, par, line, word, left, top, width, height, conf, text
+        if len(fields) < 12 or fields[0] != "5" or not fields[11].strip():
+            continue
+        words.append(OcrWord(
+            (int(fields[2]), int(fields[3]), int(fields[4])),
+            int(fields[6]), int(fields[7]), int(fields[8]), fields[11].strip(),
+        ))
+    return words
+
+
+def ocr_available() -> bool:
+    return bool(settings.OCR_ENABLED and shutil.which(settings.TESSERACT_CMD) and shutil.which(settings.GHOSTSCRIPT_CMD))
+
+
+def _cache_path(image_hash: str) -> str:
+    return os.path.join(settings.CACHE_DIR, "ocr", image_hash[:2], image_hash + ".tsv")
+
+
+def _rasterise(pdf_path: str, page: int, output_path: str):
+    # Ghostscript is already required by camelot, so no extra renderer is needed
+    subprocess.run(
+        [
+            settings.GHOSTSCRIPT_CMD, "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE", "-sDEVICE=pnggray",
+            f"-r{settings.OCR_DPI}", f"-dFirstPage={page}", f"-dLastPage={page}",
+            f"-sOutputFile={output_path}", pdf_path,
+        ],
+        check=True, capture_output=True, timeout=settings.OCR_TIMEOUT_SECONDS,
+    )
+
+
+def ocr_page(pdf_path: str, page: int) -> OcrPage:
+    """Rasterise one page and OCR it, reusing the text of an identical page image."""
+    with tempfile.TemporaryDirectory(prefix="ocr_") as workdir:
+        image_path = os.path.join(workdir, "page.png")
+        _rasterise(pdf_path, page, image_path)
+        with open(image_path, "rb") as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        image_hash = hashlib.sha256(
+            f"{OCR_CACHE_VERSION}|{settings.OCR_LANG}|{settings.OCR_DPI}|{digest}".encode("utf-8")
+        ).hexdigest()
+        path = _cache_path(image_hash)
+        try:
+            with open(path, encoding="utf-8") as file:
+                tsv = file.read()
+            touch(path)
+            return OcrPage(tsv)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Ignoring unreadable OCR cache entry %s: %s", image_hash, e)
+
+        completed = subprocess.run(
+            [settings.TESSERACT_CMD, image_path, "stdout", "-l", settings.OCR_LANG, "--psm", "6", "tsv"],
+            check=True, capture_output=True, timeout=settings.OCR_TIMEOUT_SECONDS,
+            # Pages already run in parallel; Tesseract's own OpenMP threads would oversubscribe the CPUs
+            env={**os.environ, "OMP_THREAD_LIMIT": "1"},
+        )
+    tsv = completed.stdout.decode("utf-8", errors="replace")
+    write_atomic(path, lambda file: file.write(tsv))
+    maybe_prune_cache()
+    return OcrPage(tsv)
+
+
+def ocr_pages(pdf_path: str, pages: Sequence[int]) -> Dict[int, Optional[OcrPage]]:
+    """OCR ``pages`` concurrently; a page that fails maps to None.
+
+    Ghostscript and Tesseract run as separate processes, so a thread per
+    page is enough to keep ``OCR_WORKERS`` of them busy at once.
+    """
+    if not pages:
+        return {}
+    workers = settings.OCR_WORKERS or os.cpu_count() or 1
+
+    def run(page):
+        try:
+            return ocr_page(pdf_path, page)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("OCR failed for page %d: %s", page, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(pages)), thread_name_prefix="ocr") as pool:
+        return dict(zip(pages, pool.map(run, pages)))
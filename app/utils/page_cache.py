@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import IO, Callable, List, Optional, Tuple
+
+from app.utils.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extraction or normalisation changes what a page turns into,
+# so rows cached by an older version are not reused.
+PAGE_CACHE_VERSION = "1"
+
+# Page numbering changes when a statement grows ("HALAMAN : 2 / 3" becomes
+# "2 / 5") although the transactions on the page do not.
+_VOLATILE_LINES = re.compile(r'HALAMAN\s*:\s*\d+\s*/\s*\d+', re.IGNORECASE)
+_ACCOUNT = re.compile(r'NO\.?\s*REKENING\s*:\s*([\d\-]+)', re.IGNORECASE)
+_PERIOD = re.compile(r'PERIODE\s*:\s*([A-Z]+\s+\d{4})', re.IGNORECASE)
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('JANUARI', 'JANUARY'), ('FEBRUARI', 'FEBRUARY'), ('MARET', 'MARCH'), ('APRIL',),
+        ('MEI', 'MAY'), ('JUNI', 'JUNE'), ('JULI', 'JULY'), ('AGUSTUS', 'AUGUST'),
+        ('SEPTEMBER',), ('OKTOBER', 'OCTOBER'), ('NOVEMBER',), ('DESEMBER', 'DECEMBER'),
+    ], start=1)
+    for name in names
+}
+
+
+def page_fingerprint(text: str) -> str:
+    stable = _VOLATILE_LINES.sub('', text)
+    return hashlib.sha256(f"{PAGE_CACHE_VERSION}\n{stable}".encode("utf-8")).hexdigest()
+
+
+def statement_key(text: str) -> Optional[str]:
+    """Identify a statement by account number and period, e.g. from its first page."""
+    account, period = _ACCOUNT.search(text), _PERIOD.search(text)
+    if account is None or period is None:
+        return None
+    identity = f"{account.group(1)}|{' '.join(period.group(1).upper().split())}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+
+
+def statement_period(text: str) -> Optional[Tuple[int, int]]:
+    """``(year, month)`` of the statement, e.g. ``(2023, 12)`` for "PERIODE : DESEMBER 2023"."""
+    period = _PERIOD.search(text)
+    if period is None:
+        return None
+    month, year = period.group(1).upper().split()
+    if month not in _MONTHS:
+        return None
+    return int(year), _MONTHS[month]
+
+
+# CACHE_DIR subdirectories that gain files with every conversion
+PRUNED_DIRS = ("pages", "statements", "ocr")
+_prune_lock = threading.Lock()
+_last_prune: Optional[float] = None
+
+
+def touch(path: str):
+    """Mark a cache entry as used; pruning removes the least recently used entries first."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache(max_age_days: Optional[float] = None, max_mb: Optional[float] = None) -> int:
+    """Delete cache entries unused for ``CACHE_MAX_AGE_DAYS``, then the least
+    recently used ones until the cache fits in ``CACHE_MAX_MB``.
+
+    A limit of 0 is not enforced. Returns the number of files removed.
+    """
+    max_age_days = settings.CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_mb = settings.CACHE_MAX_MB if max_mb is None else max_mb
+    entries = []
+    for subdir in PRUNED_DIRS:
+        for root, _, files in os.walk(os.path.join(settings.CACHE_DIR, subdir)):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                # A recent temp file may be another writer's, about to be renamed into place
+                if name.endswith(".tmp") and stat.st_mtime > time.time() - 3600:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    total = sum(size for _, size, _ in entries)
+    limit = max_mb * 1024 * 1024 if max_mb else None
+    removed = 0
+    for mtime, size, path in entries:
+        expired = cutoff is not None and mtime < cutoff
+        if not expired and (limit is None or total <= limit):
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def maybe_prune_cache():
+    """Run ``prune_cache`` at most once per ``CACHE_PRUNE_INTERVAL_SECONDS`` in this process."""
+    global _last_prune
+    if settings.CACHE_PRUNE_INTERVAL_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    with _prune_lock:
+        if _last_prune is not None and now - _last_prune < settings.CACHE_PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune = now
+    start = time.perf_counter()
+    removed = prune_cache()
+    if removed:
+        logger.info("Pruned %d cache files in %.2fs", removed, time.perf_counter() - start)
+
+
+def write_atomic(path: str, write: Callable[[IO[str]], None]):
+    """Create ``path`` through a uniquely named temp file renamed over it, so
+    concurrent readers never see a partial file and concurrent writers, in
+    this or another process, never share a temp file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            write(file)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _page_path(fingerprint: str) -> str:
+    return os.path.join(settings.CACHE_DIR, "pages", fingerprint[:2], fingerprint + ".json")
+
+
+def load_page_tables(fingerprint: str, dtype=object) -> Optional[list]:
+    """Normalised tables cached for a page, an empty list for a page without
+    tables, or None when the page has not been converted before.
+
+    Cells are loaded as ``dtype``, e.g. the string dtype the normalisation uses.
+    """
+    import pandas as pd
+
+    try:
+        path = _page_path(fingerprint)
+        with open(path) as file:
+            payload = json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable page cache entry %s: %s", fingerprint, e)
+        return None
+    touch(path)
+    tables = []
+    for table in payload["tables"]:
+        df = pd.DataFrame(table["data"], columns=table["columns"], dtype=object)
+        tables.append(df.where(df.notna(), pd.NA).astype(dtype))
+    return tables
+
+
+def store_page_tables(fingerprint: str, tables: List):
+    payload = {
+        "tables": [
+            {"columns": list(df.columns), "data": df.astype(object).where(df.notna(), None).values.tolist()}
+            for df in tables
+        ]
+    }
+    write_atomic(_page_path(fingerprint), lambda file: json.dump(payload, file))
+    maybe_prune_cache()
+
+
+def row_fingerprints(df, exclude=()) -> List[str]:
+    columns = [col for col in df.columns if col not in exclude]
+    values = df[columns].astype(object).where(df[columns].notna(), None).values.tolist()
+    return [hashlib.sha256(json.dumps(row, default=str).encode("utf-8")).hexdigest()[:32] for row in values]
+
+
+def _statement_path(owner, key: str) -> str:
+    return os.path.join(settings.CACHE_DIR, "statements", str(owner), key + ".json")
+
+
+def load_statement_rows(owner, key: str) -> Counter:
+    """How many times each row fingerprint was seen in earlier uploads of the statement."""
+    try:
+        with open(_statement_path(owner, key)) as file:
+            rows = json.load(file)["rows"]
+    except FileNotFoundError:
+        return Counter()
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable statement index %s: %s", key, e)
+        return Counter()
+    # Indexes written before counts were kept hold a list, which counts each fingerprint once
+    return Counter(rows)
+
+
+def store_statement_rows(owner, key: str, rows: Counter):
+    payload = {"rows": dict(sorted(rows.items()))}
+    write_atomic(_statement_path(owner, key), lambda file: json.dump(payload, file))
+    maybe_prune_cache()
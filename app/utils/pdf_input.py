@@ -0,0 +1,100 @@
+import hashlib
+import mmap
+import os
+import tempfile
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.config import settings
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class PdfSource:
+    """An uploaded PDF spooled once to a named temp file.
+
+    camelot and pdfplumber open ``path`` directly, so neither keeps its own
+    copy; PyPDF2 reads through a read-only mmap of the same file. The
+    PyPDF2 reader is cached, so the page count check and the page pre-pass
+    parse the document once. Only the path is pickled when the source is
+    sent to a conversion worker process.
+    """
+
+    def __init__(self, path: str, size: int, owns_file: bool = True, sha256: Optional[str] = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.owns_file = owns_file
+        self._file = None
+        self._buffer: Optional[mmap.mmap] = None
+        self._reader = None
+
+    @classmethod
+    def from_file(cls, fileobj) -> "PdfSource":
+        """Copy a binary file object into a spool file in fixed-size chunks, hashing it on the way."""
+        if settings.UPLOAD_SPOOL_DIR:
+            os.makedirs(settings.UPLOAD_SPOOL_DIR, exist_ok=True)
+        spool = tempfile.NamedTemporaryFile(
+            prefix="upload_", suffix=".pdf", dir=settings.UPLOAD_SPOOL_DIR or None, delete=False
+        )
+        digest = hashlib.sha256()
+        try:
+            with spool:
+                while True:
+                    chunk = fileobj.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    spool.write(chunk)
+                size = spool.tell()
+        except BaseException:
+            os.remove(spool.name)
+            raise
+        return cls(spool.name, size, sha256=digest.hexdigest())
+
+    @classmethod
+    async def from_upload(cls, upload) -> "PdfSource":
+        await upload.seek(0)
+        return await run_in_threadpool(cls.from_file, upload.file)
+
+    @property
+    def buffer(self) -> mmap.mmap:
+        if self._buffer is None:
+            self._file = open(self.path, "rb")
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buffer
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            from PyPDF2 import PdfReader
+
+            self._reader = PdfReader(self.buffer)
+        return self._reader
+
+    @property
+    def page_count(self) -> int:
+        return len(self.reader.pages)
+
+    def close(self):
+        self._reader = None
+        if self._buffer is not None:
+            self._buffer.close()
+            self._file.close()
+            self._buffer = self._file = None
+        if self.owns_file and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getstate__(self):
+        # Worker processes re-open the file themselves and never delete it
+        return {"path": self.path, "size": self.size, "sha256": self.sha256}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["size"], owns_file=False, sha256=state["sha256"])
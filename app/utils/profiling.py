@@ -0,0 +1,96 @@
+import cProfile
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from enum import Enum
+
+from app.utils.config import settings
+
+
+class ProfileMode(str, Enum):
+    cprofile = "cprofile"  # deterministic, written as a .pstats file
+    sample = "sample"      # sampling, written as flamegraph-ready collapsed stacks
+
+
+PROFILE_EXTENSIONS = {
+    ProfileMode.cprofile: ".pstats",
+    ProfileMode.sample: ".collapsed",
+}
+
+
+class ProfileResult:
+    def __init__(self, mode: ProfileMode):
+        self.mode = mode
+        self.profile_id = f"{time.strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(4)}_{mode.value}"
+        self.path = None
+
+
+def profile_path(profile_id: str):
+    """Resolve a profile id to its file, or None when it is unknown or malformed."""
+    if not profile_id or os.path.basename(profile_id) != profile_id:
+        return None
+    for extension in PROFILE_EXTENSIONS.values():
+        path = os.path.join(settings.PROFILE_DIR, profile_id + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profiled(mode: ProfileMode):
+    """Profile the enclosed block and write the result under ``settings.PROFILE_DIR``."""
+    result = ProfileResult(mode)
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, result.profile_id + PROFILE_EXTENSIONS[mode])
+
+    if mode == ProfileMode.cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            result.path = path
+    else:
+        sampler = _StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            yield result
+        finally:
+            sampler.stop()
+            with open(path, "w") as file:
+                for stack, count in sampler.samples.most_common():
+                    file.write(f"{stack} {count}\n")
+            result.path = path
@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from app.utils.config import settings
+
+
+class ProgressHub:
+    """Fans conversion progress events out to Server-Sent Event subscribers.
+
+    Channels exist only while someone is subscribed, so publishing to a job
+    nobody watches is a dictionary miss. Publishers may run in any thread;
+    events are handed to each subscriber's event loop thread-safely.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._channels: Dict[Hashable, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def has_subscribers(self, key: Hashable) -> bool:
+        return key in self._channels
+
+    def publish(self, key: Hashable, event: dict):
+        subscribers = self._channels.get(key)
+        if not subscribers:
+            return
+        with self._lock:
+            subscribers = list(subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+    @contextmanager
+    def subscribe(self, key: Hashable):
+        """Register an ``asyncio.Queue`` for ``key`` on the running loop for the ``with`` block."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._channels.setdefault(key, []).append(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                subscribers = self._channels.get(key, [])
+                if subscriber in subscribers:
+                    subscribers.remove(subscriber)
+                if not subscribers:
+                    self._channels.pop(key, None)
+
+
+def _offer(queue: asyncio.Queue, event: dict):
+    # A subscriber too slow to keep up loses intermediate page events, never the terminal one
+    if queue.full() and event.get("event") not in TERMINAL_EVENTS:
+        return
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+TERMINAL_EVENTS = ("done", "failed")
+
+
+class ProgressReporter:
+    """Progress of one conversion: current stage, pages parsed, rows found so far and an ETA."""
+
+    def __init__(self, hub: ProgressHub, key: Hashable):
+        self.hub = hub
+        self.key = key
+        self.pages_total = 0
+        self.pages_done = 0
+        self.rows = 0
+        self._parse_start: Optional[float] = None
+        self._parse_pages = 0
+
+    def emit(self, event: str, **fields):
+        self.hub.publish(self.key, {"event": event, **fields})
+
+    def stage(self, stage: str):
+        self.emit("stage", stage=stage)
+
+    def set_total(self, pages: int):
+        self.pages_total = pages
+
+    def pages_parsed(self, pages: Sequence[int], rows: int, parsed: bool = True):
+        """Record finished pages; cached pages pass ``parsed=False`` so they do not skew the ETA."""
+        self.pages_done += len(pages)
+        self.rows += rows
+        eta = None
+        if parsed and self._parse_start is not None:
+            self._parse_pages += len(pages)
+            remaining = max(self.pages_total - self.pages_done, 0)
+            eta = round((time.perf_counter() - self._parse_start) / self._parse_pages * remaining, 1)
+        self.emit(
+            "page", pages=list(pages), pages_done=self.pages_done, pages_total=self.pages_total,
+            rows=self.rows, eta_seconds=eta,
+        )
+
+    def start_parsing(self):
+        # Time per page is measured from here, not from the upload
+        self._parse_start = time.perf_counter()
+
+
+_current_progress: contextvars.ContextVar[Optional[ProgressReporter]] = contextvars.ContextVar(
+    "current_progress", default=None
+)
+
+
+def current_progress() -> Optional[ProgressReporter]:
+    return _current_progress.get()
+
+
+@contextmanager
+def reporting_progress(reporter: Optional[ProgressReporter]):
+    token = _current_progress.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _current_progress.reset(token)
+
+
+def stage_started(stage: str):
+    reporter = _current_progress.get()
+    if reporter is not None:
+        reporter.stage(stage)
+
+
+def page_batches(pages: Optional[List[int]]) -> List[Optional[List[int]]]:
+    """Split the pages handed to camelot so each batch can report progress.
+
+    Unless someone is subscribed to the conversion's progress (or when the
+    page list is unknown) this is a single batch, i.e. exactly one camelot
+    call as before: sending a progress id alone does not cost extra calls.
+    """
+    reporter = _current_progress.get()
+    if reporter is None or not reporter.hub.has_subscribers(reporter.key) or not pages:
+        return [pages]
+    size = max(settings.PROGRESS_PAGE_BATCH, 1)
+    return [pages[start:start + size] for start in range(0, len(pages), size)]
+
+
+hub = ProgressHub()
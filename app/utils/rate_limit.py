@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from app.utils.config import settings
+from app.utils.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(value: str) -> Tuple[int, float]:
+    """Parse ``"<requests>/<seconds>"``, e.g. ``"10/60"``, into bucket capacity and period."""
+    requests, _, seconds = value.partition("/")
+    return int(requests), float(seconds or 60)
+
+
+def role_rates() -> Dict[str, Tuple[int, float]]:
+    # RATE_LIMIT_ROLES looks like "admin=120/60,user=10/60"
+    rates = {}
+    for item in settings.RATE_LIMIT_ROLES.split(","):
+        role, _, rate = item.strip().partition("=")
+        if role and rate:
+            rates[role.strip()] = parse_rate(rate.strip())
+    return rates
+
+
+def rate_for_user(user) -> Tuple[int, float]:
+    """The most generous rate among the user's roles, or ``RATE_LIMIT_DEFAULT``."""
+    rates = role_rates()
+    candidates = [rates[role.name] for role in user.roles if role.name in rates]
+    if not candidates:
+        return parse_rate(settings.RATE_LIMIT_DEFAULT)
+    return max(candidates, key=lambda rate: rate[0] / rate[1])
+
+
+class InMemoryBucketStore:
+    """Token buckets kept in this process; enough for a single worker and for tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str, capacity: int, period: float, now: Optional[float] = None) -> float:
+        """Take one token; return 0 when allowed, otherwise the seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        refill_per_second = capacity / period
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - updated) * refill_per_second)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / refill_per_second
+
+
+# KEYS[1] bucket; ARGV: capacity, refill per second, now. Returns the wait in seconds as a string.
+_REDIS_TAKE = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by every worker through Redis, updated atomically by a Lua script."""
+
+    def __init__(self, url: str, prefix: str = "rate_limit:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE)
+        self._prefix = prefix
+
+    def take(self, key: str, capacity: int, period: float, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        return float(self._take(keys=[self._prefix + key], args=[capacity, capacity / period, now]))
+
+
+_store = None
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        _store = RedisBucketStore(settings.RATE_LIMIT_REDIS_URL) if settings.RATE_LIMIT_REDIS_URL else InMemoryBucketStore()
+    return _store
+
+
+def set_bucket_store(store):
+    """Swap the bucket store, e.g. for an ``InMemoryBucketStore`` in tests."""
+    global _store
+    _store = store
+
+
+class FairScheduler:
+    """Hands out conversion slots round-robin across users.
+
+    Each user has a FIFO queue; when a slot frees up it goes to the head of
+    the next user's queue in turn, so one user with hundreds of queued
+    conversions delays everyone else by at most one conversion per round.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = max(slots, 1)
+        self.running = 0
+        self._queues: "OrderedDict[object, deque]" = OrderedDict()
+
+    async def acquire(self, key):
+        if self.running < self.slots and not self._queues:
+            self.running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the request went away
+                self.release()
+            else:
+                queue = self._queues.get(key)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._queues[key]
+            raise
+
+    def release(self):
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if not future.done():
+                # The slot passes straight to the waiter, so ``running`` is unchanged
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self, key):
+        with stage_timer("queue_wait"):
+            await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_scheduler: Optional[FairScheduler] = None
+
+
+def get_scheduler() -> FairScheduler:
+    global _scheduler
+    if _scheduler is None:
+        slots = settings.CONVERSION_CONCURRENCY or settings.CONVERSION_WORKERS or os.cpu_count() or 1
+        _scheduler = FairScheduler(slots)
+    return _scheduler
@@ -22,11 +22,3 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-
-def test_password_hashing():
-    plain_password = "superduper"
-    hashed_password = get_password_hash(plain_password)
-    assert verify_password(plain_password, hashed_password) == True
-    assert verify_password("wrongpassword", hashed_password) == False
-
-test_password_hashing()
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Normalisation memory benchmark.
+
+Builds raw camelot-shaped tables (every cell a ``str``, header row on each
+page, wrapped descriptions on continuation rows) for a synthetic statement
+and runs them through the steps between camelot and export: table
+normalisation, continuation-row merging, the final concat, the summary
+aggregates and the transaction records. Peak traced memory, allocated
+blocks and time are reported per step:
+
+    python -m benchmarks.normalisation_benchmark --rows 100000
+    python -m benchmarks.normalisation_benchmark --rows 100000 --output normalisation.json
+
+``tracemalloc`` only sees allocations made through Python's allocator;
+Arrow buffers are reported separately from ``pyarrow.total_allocated_bytes``
+when pyarrow is installed, and the process peak RSS covers both.
+"""
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic_statement import NAMES, TRANSACTION_KINDS, _format_amount
+
+HEADER = ["TANGGAL", "", "KETERANGAN", "CBG", "MUTASI", "", "SALDO"]
+
+
+def build_tables(rows: int, rows_per_page: int, continuation_rate: float, seed: int):
+    """Raw tables as camelot returns them, ``[(page, DataFrame)]``, holding ``rows`` transactions."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    balance = rng.randint(1_000_000, 10_000_000) * 100
+    tables, lines, page = [], [HEADER], 1
+    for index in range(rows):
+        kind, direction = rng.choice(TRANSACTION_KINDS)
+        amount = rng.randint(1_000, 5_000_000) * 100
+        balance += amount if direction == "CR" else -amount
+        day = 1 + index * 28 // rows
+        branch = f"{rng.randint(1, 9999):04d}" if rng.random() < 0.2 else ""
+        lines.append([
+            f"{day:02d}/12", kind, f"{day:02d}12/FTSCY/WS{rng.randint(10000, 99999)}", branch,
+            _format_amount(amount), "DB" if direction == "DB" else "", _format_amount(balance),
+        ])
+        if rng.random() < continuation_rate:
+            lines.append(["", "", f"{amount // 100}.00", "", "", "", ""])
+            lines.append(["", "", rng.choice(NAMES), "", "", "", ""])
+        if len(lines) > rows_per_page:
+            tables.append((page, pd.DataFrame(lines)))
+            lines, page = [HEADER], page + 1
+    if len(lines) > 1:
+        tables.append((page, pd.DataFrame(lines)))
+    return tables
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _arrow_bytes():
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow.total_allocated_bytes()
+
+
+def _measure(name: str, func, results: dict):
+    tracemalloc.reset_peak()
+    blocks_before = sys.getallocatedblocks()
+    current_before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    current_after, peak = tracemalloc.get_traced_memory()
+    results[name] = {
+        "seconds": round(seconds, 4),
+        "peak_mb": round((peak - current_before) / (1024 * 1024), 2),
+        "retained_mb": round((current_after - current_before) / (1024 * 1024), 2),
+        "allocated_blocks": sys.getallocatedblocks() - blocks_before,
+    }
+    return value
+
+
+def run_benchmark(rows: int, rows_per_page: int, continuation_rate: float, seed: int) -> dict:
+    import pandas as pd
+
+    from app.utils.excel_convert import (
+        PAGE_COLUMN, TransactionRowMerger, _normalise_bca_table, string_dtype, summarise_transactions,
+        transaction_records,
+    )
+
+    tables = build_tables(rows, rows_per_page, continuation_rate, seed)
+    steps = {}
+    tracemalloc.start()
+    try:
+        def normalise():
+            normalised = []
+            for page, raw in tables:
+                df = _normalise_bca_table(raw)
+                if df is not None:
+                    normalised.append((page, df))
+            return normalised
+
+        normalised = _measure("normalise", normalise, steps)
+        del tables
+
+        def merge():
+            merger = TransactionRowMerger()
+            merged = []
+            for page, df in normalised:
+                df[PAGE_COLUMN] = pd.Series(page, index=df.index, dtype="int32")
+                merged.append(merger.feed(df))
+            merged.append(merger.flush())
+            return pd.concat(merged, ignore_index=True)
+
+        merged_df = _measure("merge_concat", merge, steps)
+        del normalised
+        _measure("summary", lambda: summarise_transactions(merged_df), steps)
+        _measure("records", lambda: transaction_records(merged_df, (2023, 12)), steps)
+    finally:
+        tracemalloc.stop()
+
+    arrow_bytes = _arrow_bytes()
+    return {
+        "rows": rows,
+        "merged_rows": len(merged_df),
+        "rows_per_page": rows_per_page,
+        "string_dtype": str(string_dtype().storage),
+        "frame_mb": round(merged_df.memory_usage(deep=True).sum() / (1024 * 1024), 2),
+        "arrow_allocated_mb": round(arrow_bytes / (1024 * 1024), 2) if arrow_bytes is not None else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 2),
+        "steps": steps,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure memory of the table normalisation pipeline")
+    parser.add_argument("--rows", type=int, default=100000, help="Transactions in the synthetic statement")
+    parser.add_argument("--rows-per-page", type=int, default=60, help="Table lines per page")
+    parser.add_argument("--continuation-rate", type=float, default=0.6, help="Share of wrapped transactions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.rows, args.rows_per_page, args.continuation_rate, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.output}")
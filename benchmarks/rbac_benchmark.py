@@ -0,0 +1,151 @@
+"""Permission check benchmark.
+
+Builds a synthetic RBAC dataset (users, roles, permissions) and compares the
+old check, which walks ``user.roles`` -> ``role.permissions`` through the
+ORM, with the ``user_effective_permissions`` primary-key lookup. It also
+times the projection rebuilds the RBAC mutators trigger:
+
+    python -m benchmarks.rbac_benchmark --users 10000 --roles 2000 --permissions 200
+    python -m benchmarks.rbac_benchmark --database-url postgresql://... --output rbac.json
+
+Without ``--database-url`` the dataset lives in an in-memory SQLite database.
+Never point it at a database with data you want to keep: all tables are
+dropped first.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+def _timed(func, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {"median_ms": round(statistics.median(samples) * 1000, 4), "max_ms": round(max(samples) * 1000, 4)}
+
+
+def build_dataset(db, users: int, roles: int, permissions: int, roles_per_user: int, permissions_per_role: int,
+                  seed: int):
+    from app.models.user import Permission, Role, User, role_permissions, user_roles
+
+    rng = random.Random(seed)
+    db.execute(insert(Permission), [{"id": i + 1, "name": f"permission_{i}"} for i in range(permissions)])
+    db.execute(insert(Role), [{"id": i + 1, "name": f"role_{i}"} for i in range(roles)])
+    db.execute(insert(User), [
+        {"id": i + 1, "username": f"user_{i}", "email": f"user_{i}@example.com", "name": f"User {i}", "password": "x"}
+        for i in range(users)
+    ])
+    db.execute(insert(role_permissions), [
+        {"role_id": role, "permission_id": permission}
+        for role in range(1, roles + 1)
+        for permission in rng.sample(range(1, permissions + 1), min(permissions_per_role, permissions))
+    ])
+    db.execute(insert(user_roles), [
+        {"user_id": user, "role_id": role}
+        for user in range(1, users + 1)
+        for role in rng.sample(range(1, roles + 1), min(roles_per_user, roles))
+    ])
+    db.commit()
+
+
+def run_benchmark(database_url: str, users: int, roles: int, permissions: int, roles_per_user: int,
+                  permissions_per_role: int, checks: int, seed: int) -> dict:
+    import app.models  # noqa: F401  registers every table on Base.metadata
+    from app.crud.effective_permissions import has_permission, refresh_effective_permissions
+    from app.crud.role import add_permission_to_role, remove_permission_from_role
+    from app.crud.user import get_user
+    from app.db.base import Base
+    from app.models.user import Permission, Role
+
+    if database_url.startswith("sqlite"):
+        engine = create_engine(database_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    with Session() as db:
+        build_dataset(db, users, roles, permissions, roles_per_user, permissions_per_role, seed)
+        start = time.perf_counter()
+        refresh_effective_permissions(db)
+        db.commit()
+        full_refresh = time.perf_counter() - start
+
+    rng = random.Random(seed + 1)
+    probes = [(rng.randint(1, users), f"permission_{rng.randrange(permissions)}") for _ in range(checks)]
+
+    def walk_check():
+        # What permission_required did before: a fresh session per request, then lazy loads
+        for user_id, permission in probes:
+            with Session() as db:
+                user = get_user(db, user_id)
+                permission in [perm.name for role in user.roles for perm in role.permissions]
+
+    def lookup_check():
+        for user_id, permission in probes:
+            with Session() as db:
+                user = get_user(db, user_id)
+                has_permission(db, user.id, permission)
+
+    walk = _timed(walk_check, 3)
+    lookup = _timed(lookup_check, 3)
+
+    # A grant change on one role rebuilds the rows of that role's users only
+    with Session() as db:
+        role = db.get(Role, 1)
+        permission = db.query(Permission).filter(Permission.name == f"permission_{permissions - 1}").first()
+
+        def toggle_grant():
+            if permission in role.permissions:
+                remove_permission_from_role(db, role, permission)
+            else:
+                add_permission_to_role(db, role, permission)
+
+        role_change = _timed(toggle_grant, 5)
+        role_users = len(role.users)
+
+    return {
+        "database": engine.dialect.name,
+        "users": users,
+        "roles": roles,
+        "permissions": permissions,
+        "roles_per_user": roles_per_user,
+        "permissions_per_role": permissions_per_role,
+        "checks": checks,
+        "full_refresh_ms": round(full_refresh * 1000, 2),
+        "walk_check_ms_per_check": round(walk["median_ms"] / checks, 4),
+        "lookup_check_ms_per_check": round(lookup["median_ms"] / checks, 4),
+        "role_grant_change_ms": role_change["median_ms"],
+        "role_grant_change_users": role_users,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark RBAC permission checks")
+    parser.add_argument("--database-url", type=str, default="sqlite://", help="Scratch database (tables are dropped)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--roles", type=int, default=2000)
+    parser.add_argument("--permissions", type=int, default=200)
+    parser.add_argument("--roles-per-user", type=int, default=3)
+    parser.add_argument("--permissions-per-role", type=int, default=20)
+    parser.add_argument("--checks", type=int, default=500, help="Permission checks per timed run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.database_url, args.users, args.roles, args.permissions, args.roles_per_user,
+                           args.permissions_per_role, args.checks, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.output}")
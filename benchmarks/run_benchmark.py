@@ -0,0 +1,275 @@
+"""Conversion benchmark runner.
+
+Renders synthetic statements with ``benchmarks.synthetic_statement`` and runs
+each extraction engine / export format on them in a fresh worker process, so
+peak RSS is measured per case. Bytes written per run are read from
+``/proc/self/io`` where available. Results are written as JSON and can be
+compared against a previous report to catch regressions:
+
+    python -m benchmarks.run_benchmark --pages 1 10 50 --output bench.json
+    python -m benchmarks.run_benchmark --compare bench.json
+
+The report also tracks ``python -X importtime`` for ``app.main`` so startup
+cost regressions show up alongside conversion speed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+
+from benchmarks.synthetic_statement import generate_statement
+
+# engine -> export formats it can produce without an external service
+ENGINES = {
+    "camelot": ["excel", "excel_summary"],
+    "pdfplumber": ["text"],
+}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _io_counters() -> dict:
+    # Linux only: write_bytes is what reached the block layer, wchar every write() call
+    try:
+        with open("/proc/self/io") as file:
+            return {key: int(value) for key, value in (line.split(": ") for line in file)}
+    except OSError:
+        return {}
+
+
+def _run_engine(engine: str, export_format: str, pdf: bytes):
+    # Inputs go through the same spooled PdfSource as uploads to /convert-pdf
+    from app.utils.pdf_input import PdfSource
+
+    with PdfSource.from_file(BytesIO(pdf)) as source:
+        if engine == "camelot":
+            from app.utils.excel_convert import extract_bca_transactions
+            layout = "summary" if export_format == "excel_summary" else "basic"
+            output = extract_bca_transactions(source, "bca", "excel", layout)
+            return len(output.getbuffer())
+        if engine == "pdfplumber":
+            from app.utils.csv_convert import extract_text_from_pdf
+            from app.utils.metrics import stage_timer
+            with stage_timer("text_extraction"):
+                text = extract_text_from_pdf(source.path)
+            return len(text)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def _run_case(engine: str, export_format: str, pages: int, rows_per_page: int, repeat: int, seed: int,
+              notes_pages: int = 0) -> dict:
+    # Runs in a fresh worker process. The warm-up conversion in _measure_case
+    # would fill the page cache and layout templates and every timed run would
+    # skip camelot, so both are off and anything else cached (OCR text) goes to
+    # a scratch directory. Settings are read when app.utils.config is first
+    # imported, which happens after this.
+    cache_dir = tempfile.mkdtemp(prefix="bench_cache_")
+    os.environ.update(PAGE_CACHE="false", LAYOUT_TEMPLATES="false", CACHE_DIR=cache_dir)
+    try:
+        return _measure_case(engine, export_format, pages, rows_per_page, repeat, seed, notes_pages)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _measure_case(engine: str, export_format: str, pages: int, rows_per_page: int, repeat: int, seed: int,
+                  notes_pages: int) -> dict:
+    # Import cost is excluded from the timings by converting once before measuring
+    from app.utils.metrics import capture_request_metrics
+
+    statement = generate_statement(pages=pages, rows_per_page=rows_per_page, seed=seed, notes_pages=notes_pages)
+    _run_engine(engine, export_format, statement.pdf)
+    rss_before = _peak_rss_mb()
+    io_before = _io_counters()
+
+    durations = []
+    stage_runs = []
+    rows = None
+    output_size = 0
+    for _ in range(repeat):
+        with capture_request_metrics() as request_metrics:
+            start = time.perf_counter()
+            output_size = _run_engine(engine, export_format, statement.pdf)
+            durations.append(time.perf_counter() - start)
+        stage_runs.append(request_metrics.stages)
+        rows = request_metrics.values.get("rows", rows)
+
+    io_after = _io_counters()
+    median = statistics.median(durations)
+    stages = {
+        stage: round(statistics.median(run.get(stage, 0.0) for run in stage_runs), 6)
+        for stage in sorted({stage for run in stage_runs for stage in run})
+    }
+    return {
+        "engine": engine,
+        "export": export_format,
+        "pages": pages,
+        "rows_per_page": rows_per_page,
+        "notes_pages": notes_pages,
+        "transactions": statement.transactions,
+        "input_bytes": len(statement.pdf),
+        "output_bytes": output_size,
+        "rows": rows,
+        "repeat": repeat,
+        "seconds_median": round(median, 6),
+        "seconds_min": round(min(durations), 6),
+        "pages_per_second": round(pages / median, 3) if median else None,
+        "rows_per_second": round(rows / median, 3) if median and rows else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 2),
+        "warm_rss_mb": round(rss_before, 2),
+        "disk_write_mb": _per_run_mb(io_before, io_after, "write_bytes", repeat),
+        "write_calls_mb": _per_run_mb(io_before, io_after, "wchar", repeat),
+        "stages": stages,
+    }
+
+
+def _per_run_mb(before: dict, after: dict, key: str, runs: int):
+    if key not in before or key not in after:
+        return None
+    return round((after[key] - before[key]) / runs / (1024 * 1024), 3)
+
+
+def measure_import_time(module: str = "app.main", top: int = 15) -> dict:
+    """Import ``module`` in a fresh interpreter under ``-X importtime`` and summarise the slowest imports."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONWARNINGS": "ignore"},
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    total = next((entry["cumulative_us"] for entry in entries if entry["module"] == module), None)
+    return {
+        "module": module,
+        "ok": completed.returncode == 0,
+        "total_us": total,
+        "slowest": sorted(entries, key=lambda entry: entry["cumulative_us"], reverse=True)[:top],
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(page_counts, rows_per_page: int, repeat: int, seed: int, engines=None,
+                   import_module: str = "app.main", notes_pages: int = 0) -> dict:
+    import_time = None
+    if import_module:
+        import_time = measure_import_time(import_module)
+        total = import_time["total_us"]
+        print(f"import {import_module}: {total / 1e6:.3f}s" if total else f"import {import_module}: failed")
+
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    for engine, export_formats in ENGINES.items():
+        if engines and engine not in engines:
+            continue
+        for export_format in export_formats:
+            for pages in page_counts:
+                # One process per case so peak RSS is not inherited from earlier cases
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(
+                        _run_case, engine, export_format, pages, rows_per_page, repeat, seed, notes_pages
+                    ).result()
+                print(
+                    f"{engine:<11} {export_format:<13} {pages:>4} pages  "
+                    f"{result['seconds_median']:>8.3f}s  {result['pages_per_second'] or 0:>8.2f} pages/s  "
+                    f"peak RSS {result['peak_rss_mb']:>7.1f} MB"
+                )
+                cases.append(result)
+
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "import_time": import_time,
+        "cases": cases,
+    }
+
+
+def _case_key(case: dict):
+    return case["engine"], case["export"], case["pages"], case["rows_per_page"], case.get("notes_pages", 0)
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print per-case deltas; return False when any case regressed beyond ``threshold`` (a fraction)."""
+    baseline_cases = {_case_key(case): case for case in baseline.get("cases", [])}
+    ok = True
+    print(f"\nComparing against {baseline.get('commit', 'unknown')} ({baseline.get('created_at', '')})")
+    before = (baseline.get("import_time") or {}).get("total_us")
+    after = (current.get("import_time") or {}).get("total_us")
+    if before and after:
+        change = (after - before) / before
+        flag = "  REGRESSION" if change > threshold else ""
+        ok = ok and not flag
+        print(f"import {current['import_time']['module']:<21} {before / 1e6:>10.3f} -> {after / 1e6:>10.3f} ({change:+.1%}){flag}")
+    for case in current["cases"]:
+        previous = baseline_cases.get(_case_key(case))
+        if previous is None:
+            continue
+        for metric in ("seconds_median", "peak_rss_mb", "write_calls_mb"):
+            before, after = previous.get(metric), case.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(f"{case['engine']:<11} {case['export']:<13} {case['pages']:>4} pages  "
+                  f"{metric:<15} {before:>10.3f} -> {after:>10.3f} ({change:+.1%}){flag}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark statement conversion")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50], help="Page counts to benchmark")
+    parser.add_argument("--rows-per-page", type=int, default=40, help="Printed lines per page")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic statements")
+    parser.add_argument("--notes-pages", type=int, default=0, help="Trailing pages without transactions per statement")
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES), help="Only run these engines")
+    parser.add_argument("--import-module", type=str, default="app.main",
+                        help="Module whose -X importtime cost is tracked (empty string to skip)")
+    parser.add_argument("--output", type=str, help="Write the JSON report to this file")
+    parser.add_argument("--compare", type=str, help="Compare against a previous JSON report")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before flagging (fraction)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.pages, args.rows_per_page, args.repeat, args.seed, args.engine, args.import_module,
+                            args.notes_pages)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if not compare_reports(baseline, report, args.threshold):
+            sys.exit(1)
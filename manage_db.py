@@ -1,5 +1,10 @@
+import csv
+import gzip
+import io
+import json
 import os
 import sys
+import time
 from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError
@@ -10,10 +15,13 @@ from app.db.session import SessionLocal
 from app.crud.role import (
     create_role, delete_role, get_all_roles, get_role, get_role_by_name, update_role,
     create_permission, delete_permission, get_all_permissions, get_permission, update_permission,
-    add_permission_to_role, remove_permission_from_role
+    add_permission_to_role, remove_permission_from_role, seed_roles_and_permissions
+)
+from app.crud.user import (
+    create_user, get_user_by_username, assign_role_to_user, bulk_create_users, get_existing_usernames_and_emails
 )
-from app.crud.user import create_user, get_user_by_username, assign_role_to_user
 from app.utils.security import get_password_hash
+from app.schemas.user import RoleCreate, PermissionCreate
 import psycopg2
 from psycopg2 import sql
 
@@ -173,8 +181,17 @@ def drop_database():
         print(f"Failed to drop database {db['NAME']}: {e}")
 
 def create_tables():
+    from app.crud.effective_permissions import backfill_effective_permissions
+
     Base.metadata.create_all(bind=engine)
     print("Database tables created successfully.")
+    # An existing database gains an empty user_effective_permissions table; fill it from the role grants
+    db = SessionLocal()
+    try:
+        if backfill_effective_permissions(db):
+            print("Effective permissions built for existing users.")
+    finally:
+        db.close()
 
 def drop_tables():
     try:
@@ -218,78 +235,326 @@ def truncate_tables(tables: list):
     except Exception as e:
         print(f"Failed to truncate tables: {e}")
 
-def backup_database(backup_file: str):
+BACKUP_FORMAT = "convert-tools-backup"
+END_OF_TABLE = "\\.\n"  # COPY text format escapes backslashes, so no data line can equal this
+
+class _Throughput:
+    """Print rows, uncompressed bytes and MB/s for a table at most every few seconds."""
+
+    def __init__(self, label: str, interval: float = 5.0):
+        self.label = label
+        self.interval = interval
+        self.rows = 0
+        self.bytes = 0
+        self.start = self.last = time.perf_counter()
+
+    def add(self, rows: int, nbytes: int):
+        self.rows += rows
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.report()
+
+    def report(self, done: bool = False):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        mb = self.bytes / (1024 * 1024)
+        print(f"{'' if done else '  ... '}{self.label}: {self.rows} rows, {mb:.1f} MB in {elapsed:.1f}s ({mb / elapsed:.1f} MB/s)")
+
+class _CopyWriter(io.TextIOBase):
+    """Text sink for ``copy_expert`` that counts COPY lines on their way into the backup."""
+
+    def __init__(self, file, progress: _Throughput):
+        self.file = file
+        self.progress = progress
+
+    def writable(self):
+        return True
+
+    def write(self, data: str):
+        self.file.write(data)
+        self.progress.add(data.count("\n"), len(data))
+        return len(data)
+
+class _CopyReader(io.TextIOBase):
+    """Text source for ``copy_expert`` that yields one table section of the backup, line by line."""
+
+    def __init__(self, file, progress: _Throughput):
+        self.file = file
+        self.progress = progress
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def readline(self, size: int = -1):
+        if self.done:
+            return ""
+        line = self.file.readline()
+        if not line:
+            raise ValueError("Backup file is truncated")
+        if line == END_OF_TABLE:
+            self.done = True
+            return ""
+        self.progress.add(1, len(line))
+        return line
+
+    def read(self, size: int = -1):
+        chunk, length = [], 0
+        while size < 0 or length < size:
+            line = self.readline()
+            if not line:
+                break
+            chunk.append(line)
+            length += len(line)
+        return "".join(chunk)
+
+def _backup_tables():
+    existing = set(inspect(engine).get_table_names())
+    return [table for table in Base.metadata.sorted_tables if table.name in existing]
+
+def backup_database(backup_file: str, chunk_size: int = 10000):
+    """Stream every model table into a gzip file, one section per table.
+
+    PostgreSQL tables are written with ``COPY ... TO STDOUT``; SQLite tables
+    are read ``chunk_size`` rows at a time and written as JSON lines. Tables
+    come in foreign-key order so the file restores without deferred
+    constraints, and nothing larger than one chunk is held in memory.
+
+    All tables are read in one read-only transaction, so the backup is a
+    consistent snapshot even while the application keeps writing.
+    """
+    dialect = engine.dialect.name
+    start = time.perf_counter()
+    conn = engine.raw_connection()
     try:
-        with engine.connect() as conn:
-            with open(backup_file, 'w') as file:
-                for line in conn.execution_options(stream_results=True).connection.connection.iterdump():
-                    file.write('%s\n' % line)
-        print(f"Database backed up successfully to {backup_file}.")
+        with gzip.open(backup_file, 'wt', encoding='utf-8', compresslevel=6) as file:
+            file.write(json.dumps({"format": BACKUP_FORMAT, "version": 1, "dialect": dialect}) + "\n")
+            cursor = conn.cursor()
+            if dialect == "postgresql":
+                # Must be the first statement of the transaction psycopg2 opens for the COPYs below
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            else:
+                cursor.execute("BEGIN")
+            for table in _backup_tables():
+                columns = [column.name for column in table.columns]
+                file.write(json.dumps({"table": table.name, "columns": columns}) + "\n")
+                progress = _Throughput(table.name)
+                if dialect == "postgresql":
+                    query = sql.SQL("COPY {} ({}) TO STDOUT").format(
+                        sql.Identifier(table.name), sql.SQL(", ").join(map(sql.Identifier, columns))
+                    )
+                    cursor.copy_expert(query.as_string(cursor), _CopyWriter(file, progress))
+                else:
+                    column_list = ", ".join(f'"{name}"' for name in columns)
+                    cursor.execute(f'SELECT {column_list} FROM "{table.name}"')
+                    while rows := cursor.fetchmany(chunk_size):
+                        data = "".join(json.dumps(row) + "\n" for row in rows)
+                        file.write(data)
+                        progress.add(len(rows), len(data))
+                file.write(END_OF_TABLE)
+                progress.report(done=True)
+            # Nothing was written; ending the transaction releases the snapshot
+            conn.rollback()
+        size = os.path.getsize(backup_file) / (1024 * 1024)
+        print(f"Database backed up successfully to {backup_file} ({size:.1f} MB compressed, {time.perf_counter() - start:.1f}s).")
     except Exception as e:
         print(f"Failed to backup database: {e}")
+    finally:
+        conn.close()
 
-def restore_database(backup_file: str):
+def restore_database(backup_file: str, chunk_size: int = 10000):
+    """Replace the contents of the model tables with a ``backup_database`` file.
+
+    Missing tables are created and the backed-up tables are emptied first.
+    Everything runs in one transaction, so a failed restore leaves the
+    database as it was. Rows are streamed back with ``COPY ... FROM STDIN``
+    on PostgreSQL and batched ``executemany`` inserts on SQLite.
+    """
+    dialect = engine.dialect.name
+    start = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    conn = engine.raw_connection()
     try:
-        with engine.connect() as conn:
-            with open(backup_file, 'r') as file:
-                sql = file.read()
-            conn.execute(text(sql))
-        print(f"Database restored successfully from {backup_file}.")
+        with gzip.open(backup_file, 'rt', encoding='utf-8') as file:
+            header = json.loads(file.readline() or "{}")
+            if header.get("format") != BACKUP_FORMAT:
+                raise ValueError(f"{backup_file} is not a manage_db.py backup")
+            if header["dialect"] != dialect:
+                raise ValueError(f"Backup was taken from {header['dialect']}, cannot restore into {dialect}")
+
+            cursor = conn.cursor()
+            tables = [table.name for table in Base.metadata.sorted_tables]
+            if dialect == "postgresql":
+                cursor.execute(sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(
+                    sql.SQL(", ").join(map(sql.Identifier, tables))
+                ).as_string(cursor))
+            else:
+                for name in reversed(tables):
+                    cursor.execute(f'DELETE FROM "{name}"')
+
+            while line := file.readline():
+                section = json.loads(line)
+                name, columns = section["table"], section["columns"]
+                progress = _Throughput(name)
+                if dialect == "postgresql":
+                    query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+                        sql.Identifier(name), sql.SQL(", ").join(map(sql.Identifier, columns))
+                    )
+                    cursor.copy_expert(query.as_string(cursor), _CopyReader(file, progress))
+                else:
+                    column_list = ", ".join(f'"{column}"' for column in columns)
+                    statement = f'INSERT INTO "{name}" ({column_list}) VALUES ({", ".join("?" * len(columns))})'
+                    reader = _CopyReader(file, progress)
+                    batch = []
+                    while row := reader.readline():
+                        batch.append(json.loads(row))
+                        if len(batch) >= chunk_size:
+                            cursor.executemany(statement, batch)
+                            batch = []
+                    if batch:
+                        cursor.executemany(statement, batch)
+                progress.report(done=True)
+
+            if dialect == "postgresql":
+                # COPY bypasses the id sequences, so move them past the restored ids
+                for table in Base.metadata.sorted_tables:
+                    if table.autoincrement_column is not None:
+                        column = table.autoincrement_column.name
+                        cursor.execute(sql.SQL(
+                            "SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({col}), 1), MAX({col}) IS NOT NULL) FROM {tbl}"
+                        ).format(col=sql.Identifier(column), tbl=sql.Identifier(table.name)), [table.name, column])
+        conn.commit()
+        print(f"Database restored successfully from {backup_file} in {time.perf_counter() - start:.1f}s.")
     except Exception as e:
+        conn.rollback()
         print(f"Failed to restore database: {e}")
+    finally:
+        conn.close()
 
 def create_user(db: SessionLocal, username: str, email: str, password: str, name: str, role: str = "user"):
-    from app.schemas.user import UserCreate
-    from app.crud.user import create_user as create_user_crud
+    # Same path as --import-users: one hash, and the role is granted in the same commit
     from app.utils.security import get_password_hash
 
-    user_create = UserCreate(
-        username=username,
-        email=email,
-        name=name,
-        password=get_password_hash(password),  # Ensure password is hashed
-        role=role
-    )
+    record = {"username": username, "email": email, "name": name, "password": get_password_hash(password)}
     try:
-        user = create_user_crud(db, user_create)
-        print(f"User '{username}' created successfully")
+        if bulk_create_users(db, [record], {username: [role]}):
+            print(f"User '{username}' created successfully")
+        else:
+            print(f"User '{username}' or email '{email}' already exists")
     except Exception as e:
+        db.rollback()
         print(f"Failed to create user: {e}")
 
+# Every endpoint permission, all granted to the admin role
+ADMIN_PERMISSIONS = [
+    "create_role", "read_role", "update_role", "delete_role",
+    "read_all_roles", "create_permission", "read_permission",
+    "update_permission", "delete_permission", "read_all_permissions",
+    "add_permission_to_role", "remove_permission_from_role",
+    "create_user", "read_user", "update_user", "delete_user",
+    "read_all_users", "assign_role_to_user", "remove_role_from_user",
+    "generate_token", "profile_conversion"
+]
+
 def create_roles_and_permissions(db: SessionLocal):
-    from app.schemas.user import RoleCreate, PermissionCreate
-    from app.models.user import Role, Permission
+    # INSERT ... ON CONFLICT DO NOTHING for roles, permissions and grants, committed once
+    try:
+        role_ids, permission_ids = seed_roles_and_permissions(db, {"admin": ADMIN_PERMISSIONS, "user": []})
+        print(f"Seeded {len(role_ids)} roles and {len(permission_ids)} permissions.")
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to seed roles and permissions: {e}")
 
-    # Create admin role
-    admin_role = RoleCreate(name='admin')
+def refresh_permissions(db: SessionLocal):
+    # Rebuilds user_effective_permissions for every user, e.g. after upgrading an existing database
+    from app.crud.effective_permissions import refresh_effective_permissions
+
+    start = time.perf_counter()
     try:
-        db_admin_role = create_role(db, admin_role)
-        print(f"Admin role '{admin_role.name}' created successfully.")
+        refresh_effective_permissions(db)
+        db.commit()
+        print(f"Effective permissions rebuilt in {time.perf_counter() - start:.2f}s.")
     except Exception as e:
-        db_admin_role = get_role(db, admin_role.name)
-        print(f"Admin role '{admin_role.name}' already exists.")
-
-    # Define permissions
-    permissions = [
-        "create_role", "read_role", "update_role", "delete_role",
-        "read_all_roles", "create_permission", "read_permission", 
-        "update_permission", "delete_permission", "read_all_permissions",
-        "add_permission_to_role", "remove_permission_from_role",
-        "create_user", "read_user", "update_user", "delete_user", 
-        "read_all_users", "assign_role_to_user", "remove_role_from_user", 
-        "generate_token"
-    ]
-
-    # Create permissions and assign to admin role
-    for perm in permissions:
-        db_perm = PermissionCreate(name=perm)
-        try:
-            db_permission = create_permission(db, db_perm)
-            print(f"Permission '{perm}' created successfully.")
-        except Exception as e:
-            db_permission = get_permission(db, perm)
-            print(f"Permission '{perm}' already exists.")
-        add_permission_to_role(db, db_admin_role, db_permission)
+        db.rollback()
+        print(f"Failed to rebuild effective permissions: {e}")
+
+IMPORT_FIELDS = ("username", "email", "password")
+
+def read_user_records(path: str):
+    """Yield user dicts from a CSV file with a header row, or from JSON lines (.jsonl/.ndjson)."""
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+def _batches(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_users(path: str, default_role: str = "user", batch_size: int = 2000, workers: int = 0):
+    """Bulk-create users from ``path``.
+
+    Each record needs username, email and password; name and roles
+    (separated by ";") are optional. Users whose username or email already
+    exists are skipped before hashing, so re-running an import is cheap.
+    bcrypt hashing is spread over worker processes and each batch is
+    inserted and committed with a single statement per table.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from app.utils.security import get_password_hash
+
+    created = skipped = invalid = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool, next(get_db()) as db:
+        for batch in _batches(read_user_records(path), batch_size):
+            valid = []
+            for record in batch:
+                if all(record.get(field) for field in IMPORT_FIELDS):
+                    valid.append(record)
+                else:
+                    invalid += 1
+            existing_usernames, existing_emails = get_existing_usernames_and_emails(
+                db, [record["username"] for record in valid], [record["email"] for record in valid]
+            )
+            new, seen = [], set()
+            for record in valid:
+                key = (record["username"], record["email"])
+                if record["username"] in existing_usernames or record["email"] in existing_emails or not seen.isdisjoint(key):
+                    skipped += 1
+                    continue
+                seen.update(key)
+                new.append(record)
+
+            chunksize = max(1, len(new) // ((workers or os.cpu_count() or 1) * 4))
+            hashes = pool.map(get_password_hash, [record["password"] for record in new], chunksize=chunksize)
+            rows = [
+                {"username": record["username"], "email": record["email"], "name": record.get("name") or None, "password": password}
+                for record, password in zip(new, hashes)
+            ]
+            roles = {
+                record["username"]: [role.strip() for role in (record.get("roles") or default_role).split(";") if role.strip()]
+                for record in new
+            }
+            try:
+                inserted = bulk_create_users(db, rows, roles)
+            except Exception as e:
+                db.rollback()
+                print(f"Failed to import a batch of {len(rows)} users: {e}")
+                sys.exit(1)
+            created += len(inserted)
+            skipped += len(rows) - len(inserted)
+            print(f"Imported {created} users ({skipped} skipped, {invalid} invalid) in {time.perf_counter() - start:.1f}s")
+    print(f"User import finished: {created} created, {skipped} already existed, {invalid} invalid.")
 
 def check_user_exists(username):
     with next(get_db()) as db:
@@ -317,8 +582,9 @@ if __name__ == "__main__":
     parser.add_argument("--list-tables", action="store_true", help="List all tables in the database")
     parser.add_argument("--list-columns", type=str, help="List all columns in a specified table")
     parser.add_argument("--truncate-tables", nargs='+', help="Truncate specified tables")
-    parser.add_argument("--backup-db", type=str, help="Backup the database to a specified file")
-    parser.add_argument("--restore-db", type=str, help="Restore the database from a specified file")
+    parser.add_argument("--backup-db", type=str, help="Backup the database to a specified gzip file")
+    parser.add_argument("--restore-db", type=str, help="Restore the database from a --backup-db file")
+    parser.add_argument("--backup-chunk-size", type=int, default=10000, help="Rows per read/insert batch for SQLite backup and restore (default: 10000)")
     parser.add_argument("--create-user", action="store_true", help="Create a user. Add --username, --email, --password and --fullname as well.")
     parser.add_argument("--username", type=str, help="Username for the user")
     parser.add_argument("--email", type=str, help="Email for the user")
@@ -336,6 +602,10 @@ if __name__ == "__main__":
     parser.add_argument("--rolename", type=str, help="Name of the role to assign to the user")
 
     parser.add_argument("--create-roles-and-permissions", action="store_true", help="Add endpoint permissions to database")
+    parser.add_argument("--refresh-permissions", action="store_true", help="Rebuild the user_effective_permissions table")
+    parser.add_argument("--import-users", type=str, help="Create users from a CSV or JSONL file (username, email, password, name, roles)")
+    parser.add_argument("--import-batch-size", type=int, default=2000, help="Users hashed and inserted per batch (default: 2000)")
+    parser.add_argument("--import-workers", type=int, default=0, help="Password hashing processes (default: CPU count)")
     
     args = parser.parse_args()
 
@@ -361,9 +631,9 @@ if __name__ == "__main__":
     if args.truncate_tables:
         truncate_tables(args.truncate_tables)
     if args.backup_db:
-        backup_database(args.backup_db)
+        backup_database(args.backup_db, args.backup_chunk_size)
     if args.restore_db:
-        restore_database(args.restore_db)
+        restore_database(args.restore_db, args.backup_chunk_size)
     if args.create_user:
         if not (args.username and args.email and args.password and args.fullname):
             print("Username, email, password, and full name must be provided to create a user.")
@@ -410,4 +680,9 @@ if __name__ == "__main__":
     if args.create_roles_and_permissions:
         with next(get_db()) as db:
             create_roles_and_permissions(db)
+    if args.refresh_permissions:
+        with next(get_db()) as db:
+            refresh_permissions(db)
+    if args.import_users:
+        import_users(args.import_users, args.role, args.import_batch_size, args.import_workers)
 
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+import pytest
+
+# Settings are read when app.utils.config is first imported: keep caches and
+# results out of the working tree and use an in-memory database
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="test_cache_"))
+os.environ.setdefault("RESULT_DIR", tempfile.mkdtemp(prefix="test_results_"))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+@pytest.fixture
+def db():
+    """A session on a fresh in-memory SQLite database with every model table."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    import app.models  # noqa: F401  registers every table on Base.metadata
+    from app.db.base import Base
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def extract_statement(monkeypatch, tmp_path):
+    """Run the BCA extractor over a ``fake_camelot.statement``; returns the merged rows and camelot calls."""
+    import sys
+
+    from app.utils import excel_convert
+    from app.utils.config import settings
+    from fake_camelot import LAYOUT, FakeCamelot
+
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LAYOUT_TEMPLATES", True)
+    monkeypatch.setattr(settings, "PAGE_CACHE", False)
+    monkeypatch.setattr(settings, "OCR_ENABLED", False)
+
+    def run(pages, owner=None, only_new=False):
+        camelot = FakeCamelot(pages)
+        monkeypatch.setitem(sys.modules, "camelot", camelot)
+        scan = excel_convert.PageScan(
+            1, [1], {1: "fingerprint"}, "statement", layout=LAYOUT, dated_rows={1: len(pages[1]) - 1},
+        )
+        monkeypatch.setattr(excel_convert, "scan_pages", lambda path: scan)
+        _, merged_df, _ = excel_convert._extract_bca(
+            "statement.pdf", "bca", "excel", "basic", only_new, owner, True,
+        )
+        return merged_df, camelot.calls
+
+    return run
@@ -0,0 +1,196 @@
+import pytest
+from fastapi import HTTPException
+
+from app.utils.admission import PageCreditLimiter
+
+
+def limiter(**overrides):
+    options = dict(
+        workers=2, credits_per_worker=10, min_credits=5, max_credits=40, target_seconds=10,
+        fast_lane_pages=2, fast_lane_slots=1, memory_reserve_mb=0, mb_per_page=1,
+    )
+    options.update(overrides)
+    limiter = PageCreditLimiter(**options)
+    # Keep the tests independent of the machine's free memory
+    limiter._memory_capacity = lambda: None
+    return limiter
+
+
+def test_small_statements_use_the_fast_lane_first():
+    credits = limiter()
+    first = credits.try_acquire(1)
+    second = credits.try_acquire(1)
+    assert (first.lane, second.lane) == ("fast", "pages")
+    assert credits.pages_in_flight == 1
+
+
+def test_pages_are_admitted_up_to_capacity():
+    credits = limiter()
+    assert credits.capacity() == 20
+    ticket = credits.try_acquire(15)
+    assert ticket is not None
+    assert credits.try_acquire(6) is None
+    credits.release(ticket)
+    assert credits.pages_in_flight == 0
+
+
+def test_oversized_statement_runs_alone():
+    credits = limiter()
+    ticket = credits.try_acquire(500)
+    assert ticket is not None
+    assert credits.try_acquire(5) is None
+    credits.release(ticket)
+    assert credits.try_acquire(5) is not None
+
+
+def test_admit_rejects_with_retry_after():
+    credits = limiter()
+    with credits.admit(20):
+        with pytest.raises(HTTPException) as raised:
+            with credits.admit(10):
+                pass
+    assert raised.value.status_code == 503
+    assert int(raised.value.headers["Retry-After"]) >= 1
+    assert credits.pages_in_flight == 0
+
+
+def test_credits_follow_observed_seconds_per_page():
+    credits = limiter()
+    ticket = credits.try_acquire(10)
+    # 2 seconds per page against a 10 second target: 5 credits per worker
+    ticket.completed(seconds=20)
+    credits.release(ticket)
+    assert credits.seconds_per_page == 2
+    assert credits.credits_per_worker == 5
+    assert credits.capacity() == 10
+
+
+def test_memory_per_page_follows_measured_rss_growth():
+    credits = limiter()
+    ticket = credits.try_acquire(10)
+    ticket.completed(seconds=1, rss_growth_mb=60)
+    credits.release(ticket)
+    # Moves a fifth of the way from 1 MB towards the observed 6 MB per page
+    assert credits.mb_per_page == pytest.approx(2.0)
+
+    unmeasured = credits.try_acquire(10)
+    unmeasured.completed(seconds=1)
+    credits.release(unmeasured)
+    assert credits.mb_per_page == pytest.approx(2.0)
+
+
+class Upload:
+    content_type = "application/pdf"
+    filename = "statement.pdf"
+
+    def __init__(self, pages):
+        from io import BytesIO
+
+        from PyPDF2 import PdfWriter
+
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=595, height=842)
+        self.file = BytesIO()
+        writer.write(self.file)
+
+    async def seek(self, offset):
+        self.file.seek(offset)
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    """``_convert_file`` against a fresh limiter and a one-slot scheduler; conversions are faked per test."""
+    from concurrent.futures import Future
+    from types import SimpleNamespace
+
+    from app.api.v1.endpoints import convert_tool
+    from app.api.v1.endpoints.convert_tool import BankType, ExcelLayout
+    from app.utils.config import settings
+    from app.utils.rate_limit import FairScheduler
+
+    credits = limiter()
+    scheduler = FairScheduler(1)
+    monkeypatch.setenv("EXISTING_TOKEN", "100")
+    monkeypatch.setattr(settings, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(convert_tool, "get_limiter", lambda: credits)
+    monkeypatch.setattr(convert_tool, "get_scheduler", lambda: scheduler)
+
+    def record(*args, **kwargs):
+        persisted = Future()
+        persisted.set_result(True)
+        return "uid", persisted
+
+    monkeypatch.setattr(convert_tool, "_record_conversion", record)
+    monkeypatch.setattr(convert_tool, "bytes_response", lambda request, data, *args, **kwargs: data)
+
+    def convert(export_type, pages, user_id=1):
+        return convert_tool._convert_file(
+            None, Upload(pages), BankType.bca, export_type, ExcelLayout.basic, False, False, False, None,
+            SimpleNamespace(id=user_id),
+        )
+
+    return SimpleNamespace(credits=credits, scheduler=scheduler, convert=convert, module=convert_tool)
+
+
+def test_queued_conversions_hold_no_page_credits(endpoint, monkeypatch):
+    import asyncio
+    from io import BytesIO
+
+    from app.api.v1.endpoints.convert_tool import ExportType
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def run_conversion(func, *args, profile_mode=None):
+            await release.wait()
+            return BytesIO(b"xlsx"), None
+
+        monkeypatch.setattr(endpoint.module, "run_conversion", run_conversion)
+        first = asyncio.ensure_future(endpoint.convert(ExportType.excel, 3))
+        second = asyncio.ensure_future(endpoint.convert(ExportType.excel, 4, user_id=2))
+        while not endpoint.scheduler._queues:
+            await asyncio.sleep(0.01)
+        in_flight = endpoint.credits.pages_in_flight
+        release.set()
+        await asyncio.gather(first, second)
+        return in_flight
+
+    # The second statement waits for the only slot without holding its 4 pages
+    assert asyncio.run(scenario()) == 3
+    assert endpoint.credits.pages_in_flight == 0
+
+
+def test_only_uncached_excel_runs_move_the_seconds_per_page(endpoint, monkeypatch):
+    import asyncio
+    from io import BytesIO
+
+    from app.api.v1.endpoints.convert_tool import ExportType
+    from app.utils.metrics import capture_request_metrics, record_value
+
+    cached_pages = 0
+
+    async def run_conversion(func, *args, profile_mode=None):
+        record_value("pages_cached", cached_pages)
+        return BytesIO(b"xlsx"), None
+
+    async def csv_convert(*args, **kwargs):
+        return "a,b\n"
+
+    monkeypatch.setattr(endpoint.module, "run_conversion", run_conversion)
+    monkeypatch.setattr(endpoint.module.csv, "csv_convert", csv_convert)
+
+    def convert(export_type):
+        async def run():
+            with capture_request_metrics():
+                await endpoint.convert(export_type, 3)
+        asyncio.run(run())
+
+    convert(ExportType.csv)
+    assert endpoint.credits.seconds_per_page is None
+    cached_pages = 2
+    convert(ExportType.excel)
+    assert endpoint.credits.seconds_per_page is None
+    cached_pages = 0
+    convert(ExportType.excel)
+    assert endpoint.credits.seconds_per_page is not None
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from app.crud.conversion import bulk_create_conversions, get_conversion_by_uid, get_conversions_for_user
+from app.models.user import User
+
+
+def conversion(uid: str, user_id: int, created_at: datetime) -> dict:
+    return {
+        "uid": uid, "user_id": user_id, "bank": "bca", "export_type": "excel", "status": "completed",
+        "pages": 1, "duration_seconds": 0.5, "stages": {}, "created_at": created_at,
+    }
+
+
+def test_history_pages_newest_first_without_gaps(db):
+    db.add_all([User(id=1, username="alice", email="a@example.com"), User(id=2, username="bob", email="b@example.com")])
+    db.commit()
+    start = datetime(2024, 1, 1)
+    # Two conversions share a timestamp, so the id breaks the tie between pages
+    records = [conversion(f"{index:032x}", 1, start + timedelta(minutes=index // 2 * 2)) for index in range(5)]
+    bulk_create_conversions(db, records + [conversion("f" * 32, 2, start)])
+
+    pages, before = [], None
+    while True:
+        page = get_conversions_for_user(db, 1, limit=2, before=before)
+        if not page:
+            break
+        pages.append([row.uid for row in page])
+        before = (page[-1].created_at, page[-1].id)
+
+    uids = [uid for page in pages for uid in page]
+    assert uids == [f"{index:032x}" for index in reversed(range(5))]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert get_conversion_by_uid(db, "f" * 32).user_id == 2
+
+
+def test_history_date_filters(db):
+    db.add(User(id=1, username="alice", email="a@example.com"))
+    db.commit()
+    bulk_create_conversions(db, [
+        conversion("a" * 32, 1, datetime(2024, 1, 1)),
+        conversion("b" * 32, 1, datetime(2024, 2, 1)),
+        conversion("c" * 32, 1, datetime(2024, 3, 1)),
+    ])
+    rows = get_conversions_for_user(db, 1, limit=10, created_from=datetime(2024, 1, 15), created_to=datetime(2024, 3, 1))
+    assert [row.uid for row in rows] == ["b" * 32]
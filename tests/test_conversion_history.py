@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from app.services import conversion_history
+from app.services.conversion_history import ConversionRecorder, result_path
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def stored_rows(monkeypatch):
+    rows = []
+    monkeypatch.setattr(conversion_history, "SessionLocal", FakeSession)
+    monkeypatch.setattr(conversion_history, "bulk_create_conversions", lambda db, batch, commit: rows.extend(batch))
+    monkeypatch.setattr(conversion_history, "bulk_create_transactions", lambda db, transactions: None)
+    return rows
+
+
+def test_flushed_record_is_stored_before_its_future_resolves(stored_rows):
+    # A long interval: only the flush request can get the row written in time
+    recorder = ConversionRecorder(batch_size=100, flush_interval=60)
+    path = result_path("ab" * 16, "csv")
+    try:
+        persisted = recorder.record({"uid": "ab" * 16, "user_id": 1, "result_path": path}, b"a,b\n", flush=True)
+        assert persisted.result(timeout=5) is True
+        assert [row["uid"] for row in stored_rows] == ["ab" * 16]
+        with open(path, "rb") as file:
+            assert file.read() == b"a,b\n"
+    finally:
+        recorder.stop()
+        os.remove(path)
+
+
+def test_failed_commit_resolves_false(stored_rows, monkeypatch):
+    def fail(db, batch, commit):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(conversion_history, "bulk_create_conversions", fail)
+    recorder = ConversionRecorder(batch_size=100, flush_interval=60)
+    try:
+        persisted = recorder.record({"uid": "cd" * 16, "user_id": 1}, flush=True)
+        assert persisted.result(timeout=5) is False
+    finally:
+        recorder.stop()
+
+
+@pytest.fixture
+def stored_results(db, monkeypatch, tmp_path):
+    """Conversions of user 1 with result files under a fresh RESULT_DIR, aged ``days`` and ``size`` bytes each."""
+    from datetime import datetime, timedelta
+
+    from app.crud.conversion import bulk_create_conversions
+    from app.crud.transaction import bulk_create_transactions
+    from app.models.user import User
+    from app.utils.config import settings
+
+    monkeypatch.setattr(settings, "RESULT_DIR", str(tmp_path))
+    monkeypatch.setattr(conversion_history, "SessionLocal", lambda: db)
+    db.add(User(id=1, username="alice", email="a@example.com"))
+    db.commit()
+
+    def store(uid, days, size):
+        path = result_path(uid, "csv")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(b"x" * size)
+        created_at = datetime.now() - timedelta(days=days)
+        os.utime(path, (created_at.timestamp(), created_at.timestamp()))
+        bulk_create_conversions(db, [{
+            "uid": uid, "user_id": 1, "bank": "bca", "export_type": "csv", "status": "completed", "pages": 1,
+            "duration_seconds": 0.5, "stages": {}, "created_at": created_at, "result_path": path,
+        }], commit=False)
+        bulk_create_transactions(db, [{"conversion_uid": uid, "user_id": 1, "description": "BIAYA ADM"}])
+        db.commit()
+        return path
+
+    return store
+
+
+def _remaining(db):
+    from app.models.conversion import Conversion
+    from app.models.transaction import ExtractedTransaction
+
+    return sorted(uid for uid, in db.query(Conversion.uid)), db.query(ExtractedTransaction).count()
+
+
+def test_prune_results_deletes_expired_conversions_with_their_files(db, stored_results):
+    expired = stored_results("a" * 32, days=100, size=10)
+    kept = stored_results("b" * 32, days=1, size=10)
+
+    assert conversion_history.prune_results(max_age_days=90, max_mb=0) == 1
+    assert _remaining(db) == (["b" * 32], 1)
+    assert not os.path.exists(expired) and os.path.exists(kept)
+
+
+def test_prune_results_drops_the_oldest_conversions_beyond_the_size_cap(db, stored_results):
+    oldest = stored_results("a" * 32, days=3, size=400 * 1024)
+    stored_results("b" * 32, days=2, size=400 * 1024)
+    stored_results("c" * 32, days=1, size=400 * 1024)
+
+    assert conversion_history.prune_results(max_age_days=0, max_mb=1) == 1
+    assert _remaining(db) == (["b" * 32, "c" * 32], 2)
+    assert not os.path.exists(oldest)
+
+
+def test_deleting_a_user_removes_their_history_and_results(db, stored_results):
+    from app.crud.user import delete_user
+
+    path = stored_results("a" * 32, days=1, size=10)
+    delete_user(db, 1)
+    assert _remaining(db) == ([], 0)
+    assert not os.path.exists(path)
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.utils import csv_convert as csv
+from app.utils.llm_budget import InMemoryUsageStore, LLMBudget, LLMEstimate, set_budget
+from app.utils.llm_providers import StubProvider, set_provider
+
+STATEMENT = "\n".join([
+    "01/12 SETORAN TUNAI 100,000.00 1,100,000.00",
+    "02/12 BIAYA ADM DB 10,000.00 1,090,000.00",
+])
+
+
+class ThreadRecordingStore(InMemoryUsageStore):
+    """Records which threads touched the store, as a blocking Redis client would be."""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def add(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().add(*args, **kwargs)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    store = ThreadRecordingStore()
+    set_provider(StubProvider())
+    set_budget(LLMBudget(store, daily_tokens=0, daily_cost=0))
+    monkeypatch.setattr(csv, "extract_text_from_pdf", lambda path: STATEMENT)
+    monkeypatch.setattr(csv, "_batcher", csv.StatementBatcher(window=0, max_chars=10000, max_documents=1))
+    try:
+        yield store
+    finally:
+        set_provider(None)
+        set_budget(None)
+
+
+def test_dry_run_returns_the_estimate(stub):
+    estimate = asyncio.run(csv.csv_convert("statement.pdf", "bca", user_id=1, dry_run=True))
+    assert isinstance(estimate, LLMEstimate)
+    assert estimate.provider == "stub"
+    assert stub.threads == []
+
+
+def test_budget_is_settled_off_the_event_loop(stub):
+    async def convert():
+        return threading.get_ident(), await csv.csv_convert("statement.pdf", "bca", user_id=1)
+
+    loop_thread, text = asyncio.run(convert())
+    assert text.splitlines()[1:] == ["01/12,SETORAN TUNAI,,100000.00,,1100000.00", "02/12,BIAYA ADM,,,10000.00,1090000.00"]
+    # One reservation and one settlement, neither on the event loop thread
+    assert len(stub.threads) == 2
+    assert loop_thread not in stub.threads
+    # Settled down from the reserved upper bound to what the provider reported
+    (used_tokens, _), = stub._usage.values()
+    assert 0 < used_tokens < csv.estimate_conversion(StubProvider(), STATEMENT).total_tokens
@@ -0,0 +1,71 @@
+import gzip
+
+import pytest
+from starlette.requests import Request
+
+from app.utils.downloads import bytes_response, content_hash, parse_range
+
+DATA = b"date,amount\n" + b"01/12,100.00\n" * 200
+
+
+def request(**headers):
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-20", (80, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-9", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=50-10", "bytes=abc-", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 100)
+
+
+def test_etag_and_conditional_get():
+    response = bytes_response(request(), DATA, "text/csv", "result.csv")
+    etag = response.headers["etag"]
+    assert etag == f'"{content_hash(DATA)}"'
+    assert response.body == DATA
+
+    assert bytes_response(request(if_none_match=etag), DATA, "text/csv", "result.csv").status_code == 304
+
+
+def test_compressed_representation_has_its_own_etag():
+    response = bytes_response(request(accept_encoding="gzip"), DATA, "text/csv", "result.csv")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == f'"{content_hash(DATA)}-gzip"'
+    assert gzip.decompress(response.body) == DATA
+
+
+def test_range_is_served_from_the_uncompressed_body():
+    response = bytes_response(request(range="bytes=0-3", accept_encoding="gzip"), DATA, "text/csv", "result.csv")
+    assert response.status_code == 206
+    assert response.body == DATA[:4]
+    assert response.headers["content-range"] == f"bytes 0-3/{len(DATA)}"
+    assert "content-encoding" not in response.headers
+
+
+def test_stale_if_range_sends_the_whole_body():
+    response = bytes_response(request(range="bytes=0-3", if_range='"stale"'), DATA, "text/csv", "result.csv")
+    assert response.status_code == 200
+    assert response.body == DATA
+
+
+def test_unsatisfiable_range_answers_416():
+    response = bytes_response(request(range=f"bytes={len(DATA)}-"), DATA, "text/csv", "result.csv")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
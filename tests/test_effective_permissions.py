@@ -0,0 +1,50 @@
+from app.crud.effective_permissions import backfill_effective_permissions, has_permission
+from app.models.user import Permission, Role, User, user_effective_permissions
+
+
+def test_backfill_builds_permissions_of_an_upgraded_database(db):
+    # Rows written directly, as they were before user_effective_permissions existed
+    role = Role(name="admin", permissions=[Permission(name="view_user")])
+    db.add(User(username="alice", email="alice@example.com", roles=[role]))
+    db.commit()
+    user_id = db.query(User).one().id
+    assert not has_permission(db, user_id, "view_user")
+
+    assert backfill_effective_permissions(db) is True
+    assert has_permission(db, user_id, "view_user")
+    # Once built, later startups leave the table alone
+    assert backfill_effective_permissions(db) is False
+
+
+def test_backfill_skips_a_database_without_grants(db):
+    db.add(User(username="bob", email="bob@example.com"))
+    db.commit()
+    assert backfill_effective_permissions(db) is False
+    assert db.execute(user_effective_permissions.select()).first() is None
+
+
+def test_rbac_mutators_keep_effective_permissions_current(db):
+    from app.crud.effective_permissions import get_effective_permissions
+    from app.crud.role import add_permission_to_role, delete_permission, remove_permission_from_role
+    from app.crud.user import assign_role_to_user, remove_role_from_user
+
+    user = User(username="carol", email="carol@example.com")
+    role = Role(name="auditor")
+    view, export = Permission(name="view_user"), Permission(name="export")
+    db.add_all([user, role, view, export])
+    db.commit()
+
+    assign_role_to_user(db, user, role)
+    assert get_effective_permissions(db, user.id) == []
+    add_permission_to_role(db, role, view)
+    add_permission_to_role(db, role, export)
+    assert sorted(get_effective_permissions(db, user.id)) == ["export", "view_user"]
+
+    remove_permission_from_role(db, role, view)
+    assert get_effective_permissions(db, user.id) == ["export"]
+    delete_permission(db, export.id)
+    assert get_effective_permissions(db, user.id) == []
+
+    add_permission_to_role(db, role, view)
+    remove_role_from_user(db, user, role)
+    assert not has_permission(db, user.id, "view_user")
@@ -0,0 +1,89 @@
+import pandas as pd
+
+from app.utils.excel_convert import PAGE_COLUMN, TransactionRowMerger, string_dtype
+
+COLUMNS = ['Tanggal Transaksi', 'Keterangan Utama', 'Keterangan Tambahan', 'CBG', 'Mutasi', 'Type', 'Saldo']
+
+
+def table(rows, page=1):
+    df = pd.DataFrame(rows, columns=COLUMNS).astype(string_dtype())
+    df[PAGE_COLUMN] = pd.Series(page, index=df.index, dtype='int32')
+    return df
+
+
+def merge(*tables):
+    merger = TransactionRowMerger()
+    parts = [merger.feed(df) for df in tables] + [merger.flush()]
+    return pd.concat(parts, ignore_index=True), merger
+
+
+def test_continuation_rows_join_the_description():
+    merged, merger = merge(table([
+        ['01/12', 'TRSF E-BANKING', '0112/FTSCY/WS95011', None, '50,000.00', 'DB', '950,000.00'],
+        [None, None, 'JULEHA', None, None, None, None],
+        ['02/12', 'SETORAN TUNAI', None, None, '10,000.00', None, '960,000.00'],
+    ]))
+    assert len(merged) == 2
+    assert merged.loc[0, 'Keterangan Tambahan'] == '0112/FTSCY/WS95011 JULEHA'
+    assert merger.continuation_rows == 1
+
+
+def test_transaction_split_across_pages_is_merged():
+    merged, _ = merge(
+        table([['01/12', 'TRSF E-BANKING', 'WS1', None, '5.00', 'DB', '95.00']], page=1),
+        table([[None, None, 'BUDI', None, None, None, None],
+               ['02/12', 'BIAYA ADM', None, None, '1.00', 'DB', '94.00']], page=2),
+    )
+    assert merged.loc[0, 'Keterangan Tambahan'] == 'WS1 BUDI'
+    assert list(merged[PAGE_COLUMN]) == [1, 2]
+    assert list(merged['Tanggal Transaksi']) == ['01/12', '02/12']
+
+
+def test_amount_on_continuation_row_is_carried_up():
+    merged, _ = merge(table([
+        ['03/12', 'KARTU DEBIT', 'INDOMARET', None, None, None, None],
+        [None, None, None, None, '25,000.00', 'DB', '75,000.00'],
+    ]))
+    assert merged.loc[0, 'Mutasi'] == '25,000.00'
+    assert merged.loc[0, 'Saldo'] == '75,000.00'
+
+
+def test_identical_same_day_transactions_are_kept():
+    debit = ['05/12', 'BIAYA ADM', None, None, '10,000.00', 'DB', '90,000.00']
+    merged, _ = merge(table([debit, debit]))
+    assert len(merged) == 2
+    assert list(merged['Mutasi']) == ['10,000.00', '10,000.00']
+
+
+def test_summary_and_records_tolerate_missing_columns():
+    from app.utils.excel_convert import summarise_transactions, transaction_records
+
+    merged, _ = merge(table([
+        ['01/12', 'SETORAN', None, None, '100.00', None, '1,100.00'],
+        ['01/12', 'BIAYA ADM', None, None, '10.00', 'DB', '1,090.00'],
+    ]))
+    totals, daily, monthly = summarise_transactions(merged.drop(columns=['Type', 'Saldo']))
+    # Without the Type column every amount counts as a credit
+    assert totals['Total in'] == 110.0
+    assert totals['Closing balance'] is None
+    assert list(daily.index) == ['01/12']
+
+    records = transaction_records(merged.drop(columns=['Mutasi']), (2023, 12))
+    assert [record['amount'] for record in records] == [None, None]
+
+
+def test_only_new_keeps_repeats_of_an_identical_transaction(extract_statement):
+    from fake_camelot import statement, transaction
+
+    fee = transaction(1, 1000)
+    merged_df, _ = extract_statement(statement([fee, transaction(2, 5000)]), owner=1, only_new=True)
+    assert len(merged_df) == 2
+
+    # The same fee charged again on the same day is a new transaction, not a re-upload of the first
+    merged_df, _ = extract_statement(statement([fee, fee, transaction(2, 5000), transaction(3, 7000)]),
+                                     owner=1, only_new=True)
+    assert merged_df["Mutasi"].tolist() == ["1,000.00", "7,000.00"]
+
+    merged_df, _ = extract_statement(statement([fee, fee, transaction(2, 5000), transaction(3, 7000)]),
+                                     owner=1, only_new=True)
+    assert merged_df.empty
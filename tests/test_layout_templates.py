@@ -0,0 +1,30 @@
+from app.utils.excel_convert import _covers_pages
+from app.utils.layout_templates import load_template, template_key
+from fake_camelot import LAYOUT, FakeTable, statement
+
+
+def test_template_is_relearned_when_a_longer_statement_overflows_its_area(extract_statement):
+    key = template_key("bca", LAYOUT)
+    merged_df, calls = extract_statement(statement(5))
+    assert calls == ["detect"] and len(merged_df) == 5
+    learned = load_template(key)
+    assert learned is not None
+
+    # Rows below the learned area would be cut off; the shortfall sends the page back to detection
+    merged_df, calls = extract_statement(statement(30))
+    assert calls == ["template", "detect"]
+    assert len(merged_df) == 30
+    assert load_template(key).area[3] < learned.area[3]
+
+    # The relearned template covers the longer table
+    merged_df, calls = extract_statement(statement(30))
+    assert calls == ["template"]
+    assert len(merged_df) == 30
+
+
+def test_covers_pages_counts_dated_rows_per_page():
+    table = FakeTable(1, statement(3)[1])
+    assert _covers_pages([table], [1], {1: 3})
+    assert not _covers_pages([table], [1], {1: 4})
+    assert not _covers_pages([table], [1, 2], {1: 3, 2: 1})
+    assert _covers_pages([table], [1])
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.utils import csv_convert as csv
+from app.utils.llm_providers import StubProvider, join_documents, set_provider, split_documents
+
+
+@pytest.fixture
+def provider():
+    class CountingProvider(StubProvider):
+        requests = 0
+
+        def _complete(self, *args):
+            CountingProvider.requests += 1
+            return super()._complete(*args)
+
+    stub = CountingProvider()
+    set_provider(stub)
+    try:
+        yield stub
+    finally:
+        set_provider(None)
+
+
+def statement(day: int) -> str:
+    return f"{day:02d}/12 BIAYA ADM DB {day},000.00 1,000,000.00"
+
+
+def test_split_documents_round_trips_join_documents():
+    texts = ["first statement", "second\nstatement", "third"]
+    joined = join_documents(texts)
+    assert joined.startswith("### DOCUMENT 1\n")
+    assert split_documents(joined) == {1: texts[0], 2: texts[1], 3: texts[2]}
+    assert split_documents("no markers here") == {}
+
+
+def test_batcher_coalesces_statements_and_answers_each_its_own(provider):
+    async def convert_all():
+        batcher = csv.StatementBatcher(window=0.05, max_chars=10000, max_documents=3)
+        return await asyncio.gather(*(batcher.convert(statement(day)) for day in range(1, 6)))
+
+    results = asyncio.run(convert_all())
+    # Five statements with at most three per request: a batch of three and one of two
+    assert provider.requests == 2
+    assert [size for _, size in results] == [3, 3, 3, 2, 2]
+    for day, (response, _) in enumerate(results, start=1):
+        rows = response.text.splitlines()
+        assert rows[0] == StubProvider.HEADER
+        assert rows[1] == f"{day:02d}/12,BIAYA ADM,,,{day}000.00,1000000.00"
+        assert response.prompt_tokens > 0 and response.completion_tokens > 0
+
+
+def test_batcher_never_mixes_users_in_one_request(provider, monkeypatch):
+    batches = []
+    convert_batch = csv.convert_batch
+
+    def recording_convert_batch(provider, texts):
+        batches.append(texts)
+        return convert_batch(provider, texts)
+
+    monkeypatch.setattr(csv, "convert_batch", recording_convert_batch)
+
+    async def convert_all():
+        batcher = csv.StatementBatcher(window=0.05, max_chars=10000, max_documents=3)
+        return await asyncio.gather(*(batcher.convert(statement(day), key=day % 2) for day in range(1, 6)))
+
+    results = asyncio.run(convert_all())
+    # Days 1, 3 and 5 belong to one user and days 2 and 4 to the other
+    assert sorted(batches) == sorted([[statement(1), statement(3), statement(5)], [statement(2), statement(4)]])
+    assert [size for _, size in results] == [3, 2, 3, 2, 3]
+    for day, (response, _) in enumerate(results, start=1):
+        assert response.text.splitlines()[1].startswith(f"{day:02d}/12,")
+
+
+def test_batcher_without_window_sends_each_statement_alone(provider):
+    async def convert_all():
+        batcher = csv.StatementBatcher(window=0, max_chars=10000, max_documents=3)
+        return await asyncio.gather(*(batcher.convert(statement(day)) for day in range(1, 3)))
+
+    results = asyncio.run(convert_all())
+    assert provider.requests == 2
+    assert [size for _, size in results] == [1, 1]
+
+
+def test_batch_answer_missing_a_statement_converts_it_alone(provider, monkeypatch):
+    split = split_documents
+    # Drop the second document from every batched answer
+    monkeypatch.setattr(csv, "split_documents", lambda text: {k: v for k, v in split(text).items() if k != 2})
+    responses = csv.convert_batch(provider, [statement(1), statement(2)])
+    assert provider.requests == 2
+    assert responses[1].text.splitlines()[1].startswith("02/12,")
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.llm_budget import (
+    InMemoryUsageStore, LLMBudget, LLMEstimate, _day_key, _seconds_until_reset, check_request_budget,
+)
+
+
+def estimate(tokens: int, cost: float) -> LLMEstimate:
+    return LLMEstimate("stub", prompt_tokens=tokens // 2, max_completion_tokens=tokens - tokens // 2, cost=cost,
+                       input_chars=tokens * 4, truncated=False)
+
+
+def test_request_limits_answer_413(monkeypatch):
+    from app.utils.config import settings
+
+    monkeypatch.setattr(settings, "LLM_MAX_TOKENS_PER_REQUEST", 1000)
+    monkeypatch.setattr(settings, "LLM_MAX_COST_PER_REQUEST_USD", 0)
+    check_request_budget(estimate(1000, 5.0))
+    with pytest.raises(HTTPException) as raised:
+        check_request_budget(estimate(1001, 0.01))
+    assert raised.value.status_code == 413
+
+
+def test_daily_budget_reserves_settles_and_rejects():
+    budget = LLMBudget(InMemoryUsageStore(), daily_tokens=1000, daily_cost=0)
+    reservation = budget.reserve(1, estimate(800, 0.1))
+    # The reservation holds the upper bound until the actual usage is known
+    with pytest.raises(HTTPException) as raised:
+        budget.reserve(1, estimate(300, 0.1))
+    assert raised.value.status_code == 429
+    assert int(raised.value.headers["Retry-After"]) >= 1
+
+    reservation.settle(200, 0.02)
+    assert budget.status(1)["daily_tokens_used"] == 200
+    budget.reserve(1, estimate(300, 0.1)).release()
+    assert budget.status(1, estimate(800, 0.1))["within_daily_budget"] is True
+    assert budget.status(1, estimate(801, 0.1))["within_daily_budget"] is False
+    # Other users have their own budget
+    assert budget.status(2)["daily_tokens_used"] == 0
+
+
+def test_usage_from_earlier_days_is_dropped():
+    store = InMemoryUsageStore()
+    yesterday = _day_key(1, datetime(2024, 1, 1, 23, 0, tzinfo=timezone.utc))
+    today = _day_key(1, datetime(2024, 1, 2, 1, 0, tzinfo=timezone.utc))
+    store.add(yesterday, 500, 1.0)
+    store.add(today, 100, 0.1)
+    assert store.get(yesterday) == (0.0, 0.0)
+    assert store.get(today) == (100, 0.1)
+
+
+def test_retry_after_points_at_utc_midnight():
+    assert _seconds_until_reset(datetime(2024, 1, 1, 23, 59, 0, tzinfo=timezone.utc)) == 60
@@ -0,0 +1,21 @@
+import logging
+import logging.handlers
+
+from app.utils.logging_config import configure_logging, stop_logging
+
+
+def test_stop_logging_restores_a_direct_handler(capsys):
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    try:
+        configure_logging(force=True)
+        assert any(isinstance(handler, logging.handlers.QueueHandler) for handler in root.handlers)
+
+        stop_logging()
+        assert not any(isinstance(handler, logging.handlers.QueueHandler) for handler in root.handlers)
+        logging.getLogger("app.test").warning("logged after shutdown")
+        assert "logged after shutdown" in capsys.readouterr().err
+    finally:
+        stop_logging()
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
@@ -0,0 +1,20 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.endpoints.convert_tool import BankType, ExcelLayout, ExportType, _convert_file
+from app.utils.profiling import ProfileMode
+
+
+def test_csv_export_rejects_profiling():
+    upload = SimpleNamespace(content_type="application/pdf", filename="statement.pdf")
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(_convert_file(
+            None, upload, BankType.bca, ExportType.csv, ExcelLayout.basic, only_new=False,
+            store_transactions=False, dry_run=False, profile_mode=ProfileMode.sample,
+            current_user=SimpleNamespace(id=1),
+        ))
+    assert raised.value.status_code == 400
+    assert "X-Profile" in raised.value.detail
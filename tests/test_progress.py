@@ -0,0 +1,104 @@
+import asyncio
+
+from app.utils.progress import ProgressHub, ProgressReporter, page_batches, reporting_progress
+
+
+def test_page_batches_single_call_without_subscribers():
+    reporter = ProgressReporter(ProgressHub(), "job")
+    with reporting_progress(reporter):
+        assert page_batches(list(range(1, 30))) == [list(range(1, 30))]
+    assert page_batches([1, 2, 3]) == [[1, 2, 3]]
+
+
+def test_page_batches_split_while_subscribed(monkeypatch):
+    from app.utils.config import settings
+
+    monkeypatch.setattr(settings, "PROGRESS_PAGE_BATCH", 2)
+    hub = ProgressHub()
+    reporter = ProgressReporter(hub, "job")
+
+    async def batches():
+        with hub.subscribe("job"), reporting_progress(reporter):
+            return page_batches([1, 2, 3, 4, 5]), page_batches(None)
+
+    assert asyncio.run(batches()) == ([[1, 2], [3, 4], [5]], [None])
+
+
+def test_publish_without_subscribers_is_dropped():
+    hub = ProgressHub()
+    hub.publish("job", {"event": "page"})
+    assert not hub.has_subscribers("job")
+
+
+def test_subscriber_receives_events_from_other_threads():
+    import threading
+
+    hub = ProgressHub()
+
+    async def receive():
+        with hub.subscribe("job") as queue:
+            assert hub.has_subscribers("job")
+            reporter = ProgressReporter(hub, "job")
+            reporter.set_total(2)
+            thread = threading.Thread(target=lambda: (reporter.stage("table_extraction"),
+                                                      reporter.pages_parsed([1], rows=5),
+                                                      reporter.emit("done")))
+            thread.start()
+            events = [await asyncio.wait_for(queue.get(), 1) for _ in range(3)]
+            thread.join()
+        return events
+
+    events = asyncio.run(receive())
+    assert [event["event"] for event in events] == ["stage", "page", "done"]
+    assert events[1]["pages_done"] == 1 and events[1]["pages_total"] == 2 and events[1]["rows"] == 5
+    assert not hub.has_subscribers("job")
+
+
+def test_slow_subscriber_keeps_the_terminal_event():
+    hub = ProgressHub(queue_size=2)
+
+    async def receive():
+        with hub.subscribe("job") as queue:
+            for page in range(5):
+                hub.publish("job", {"event": "page", "pages": [page]})
+            hub.publish("job", {"event": "done"})
+            await asyncio.sleep(0)
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    events = asyncio.run(receive())
+    assert len(events) == 2
+    assert events[-1] == {"event": "done"}
+
+
+def _report_batches(pages):
+    # Runs in a pool worker, which has no hub of its own
+    from app.utils.progress import current_progress
+
+    reporter = current_progress()
+    reporter.set_total(len(pages))
+    batches = page_batches(pages)
+    for batch in batches:
+        reporter.pages_parsed(batch, rows=2)
+    return len(batches)
+
+
+def test_pool_workers_relay_progress_to_subscribers():
+    from app.utils import conversion_workers
+
+    hub = ProgressHub()
+    reporter = ProgressReporter(hub, "job")
+
+    async def convert():
+        with hub.subscribe("job") as queue, reporting_progress(reporter):
+            batches, _ = await conversion_workers.run_conversion(_report_batches, [1, 2, 3])
+            await asyncio.sleep(0)
+            return batches, [queue.get_nowait() for _ in range(queue.qsize())]
+
+    conversion_workers.start_workers(1)
+    try:
+        batches, events = asyncio.run(convert())
+    finally:
+        conversion_workers.shutdown_workers()
+    assert batches == 3
+    assert [event["pages"] for event in events] == [[1], [2], [3]]
+    assert events[-1]["pages_done"] == 3 and events[-1]["rows"] == 6
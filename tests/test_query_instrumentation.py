@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.db.session import RepeatedQueryError, install_query_instrumentation
+from app.utils.metrics import capture_request_metrics
+
+
+@pytest.fixture
+def engine():
+    # A private in-memory database stands in for the application's engine
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+def test_failed_statement_leaves_no_timer_behind(engine):
+    install_query_instrumentation(engine, threshold_ms=0)
+    with engine.connect() as conn, capture_request_metrics() as request_metrics:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        conn.execute(text("SELECT 1"))
+        assert "query_start" not in conn.info
+    # Only the statement that completed was counted
+    assert list(request_metrics.queries) == ["SELECT 1"]
+    assert request_metrics.queries["SELECT 1"][0] == 1
+
+
+def test_slow_queries_are_logged(engine, caplog):
+    install_query_instrumentation(engine, threshold_ms=0.000001)
+    with engine.connect() as conn, caplog.at_level("WARNING", logger="app.db.session"):
+        conn.execute(text("SELECT 1"))
+    assert any("Slow query" in record.getMessage() for record in caplog.records)
+
+
+def test_strict_mode_raises_on_repeated_statements(engine):
+    install_query_instrumentation(engine, threshold_ms=0, repeat_threshold=3, strict=True)
+    with engine.connect() as conn, capture_request_metrics():
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 1"))
+        with pytest.raises(RepeatedQueryError):
+            conn.execute(text("SELECT 1"))
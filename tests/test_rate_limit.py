@@ -0,0 +1,68 @@
+import asyncio
+
+from app.utils.rate_limit import FairScheduler, InMemoryBucketStore, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("10/60") == (10, 60.0)
+    assert parse_rate("5") == (5, 60.0)
+
+
+def test_token_bucket_allows_a_burst_then_waits_for_refill():
+    store = InMemoryBucketStore()
+    # 2 requests per 10 seconds: one token every 5 seconds
+    assert store.take("user:1", 2, 10, now=0) == 0
+    assert store.take("user:1", 2, 10, now=0) == 0
+    assert store.take("user:1", 2, 10, now=0) == 5
+    assert store.take("user:1", 2, 10, now=2.5) == 2.5
+    assert store.take("user:1", 2, 10, now=5) == 0
+    # Buckets are per key
+    assert store.take("user:2", 2, 10, now=5) == 0
+
+
+def test_token_bucket_never_exceeds_capacity():
+    store = InMemoryBucketStore()
+    store.take("user:1", 2, 10, now=0)
+    assert store.take("user:1", 2, 10, now=1000) == 0
+    assert store.take("user:1", 2, 10, now=1000) == 0
+    assert store.take("user:1", 2, 10, now=1000) > 0
+
+
+def test_fair_scheduler_alternates_between_users():
+    async def run():
+        scheduler = FairScheduler(slots=1)
+        order = []
+        await scheduler.acquire("busy")
+
+        async def convert(user, index):
+            async with scheduler.slot(user):
+                order.append(f"{user}{index}")
+
+        # The busy user queues three conversions before the other user queues one
+        tasks = [asyncio.create_task(convert("a", index)) for index in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(convert("b", 0)))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order, scheduler.running
+
+    order, running = asyncio.run(run())
+    assert order == ["a0", "b0", "a1", "a2"]
+    assert running == 0
+
+
+def test_fair_scheduler_cancelled_waiter_gives_up_its_place():
+    async def run():
+        scheduler = FairScheduler(slots=1)
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        return scheduler.running, scheduler._queues
+
+    running, queues = asyncio.run(run())
+    assert running == 0
+    assert not queues
@@ -0,0 +1,72 @@
+from datetime import date, datetime
+
+from app.crud.conversion import bulk_create_conversions
+from app.crud.transaction import bulk_create_transactions, search_transactions
+from app.models.user import User
+
+
+def seed(db):
+    db.add_all([User(id=1, username="alice", email="a@example.com"), User(id=2, username="bob", email="b@example.com")])
+    db.commit()
+    bulk_create_conversions(db, [
+        {"uid": uid, "user_id": user_id, "bank": "bca", "export_type": "excel", "pages": 1,
+         "duration_seconds": 1.0, "stages": {}, "created_at": datetime(2024, 1, 1)}
+        for uid, user_id in (("a" * 32, 1), ("b" * 32, 2))
+    ], commit=False)
+    rows = [
+        ("a" * 32, 1, date(2023, 12, 1), "TRSF E-BANKING JULEHA", 50000, "DB"),
+        ("a" * 32, 1, date(2023, 12, 2), "SETORAN TUNAI", 100000, "CR"),
+        ("a" * 32, 1, date(2023, 12, 3), "KARTU DEBIT INDOMARET 100%", 25000, "DB"),
+        ("b" * 32, 2, date(2023, 12, 1), "TRSF E-BANKING JULEHA", 50000, "DB"),
+    ]
+    bulk_create_transactions(db, [
+        {"conversion_uid": uid, "user_id": user_id, "posted_on": posted_on, "description": description,
+         "amount": amount, "direction": direction, "page": 1}
+        for uid, user_id, posted_on, description, amount, direction in rows
+    ])
+    db.commit()
+
+
+def descriptions(transactions):
+    return [transaction.description for transaction in transactions]
+
+
+def test_search_is_scoped_to_the_user(db):
+    seed(db)
+    assert descriptions(search_transactions(db, 2)) == ["TRSF E-BANKING JULEHA"]
+    assert len(search_transactions(db, 1)) == 3
+
+
+def test_search_matches_description_substrings(db):
+    seed(db)
+    # Three characters and more go through the FTS5 trigram index, shorter ones through LIKE
+    assert descriptions(search_transactions(db, 1, q="juleha")) == ["TRSF E-BANKING JULEHA"]
+    assert descriptions(search_transactions(db, 1, q="%")) == ["KARTU DEBIT INDOMARET 100%"]
+
+
+def test_search_filters_amount_date_and_direction(db):
+    seed(db)
+    assert descriptions(search_transactions(db, 1, amount_min=30000, amount_max=60000)) == ["TRSF E-BANKING JULEHA"]
+    assert descriptions(search_transactions(db, 1, date_from=date(2023, 12, 2))) == [
+        "KARTU DEBIT INDOMARET 100%", "SETORAN TUNAI",
+    ]
+    assert descriptions(search_transactions(db, 1, direction="CR")) == ["SETORAN TUNAI"]
+
+
+def test_csv_export_rejects_store_transactions():
+    import asyncio
+    from types import SimpleNamespace
+
+    import pytest
+    from fastapi import HTTPException
+
+    from app.api.v1.endpoints.convert_tool import BankType, ExcelLayout, ExportType, _convert_file
+
+    upload = SimpleNamespace(content_type="application/pdf", filename="statement.pdf")
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(_convert_file(
+            None, upload, BankType.bca, ExportType.csv, ExcelLayout.basic, only_new=False,
+            store_transactions=True, dry_run=False, profile_mode=None, current_user=SimpleNamespace(id=1),
+        ))
+    assert raised.value.status_code == 400
+    assert "store_transactions" in raised.value.detail